@@ -7,3 +7,5 @@ class BarbershopConfig(AppConfig):
     
     def ready(self):
         import barbershop.signals
+        from barbershop.cache import warn_if_not_shared
+        warn_if_not_shared()
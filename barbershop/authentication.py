@@ -0,0 +1,124 @@
+"""
+Stateless JWT authentication.
+
+Tokens issued by ``issue_tokens`` carry the username, the profile id and the
+role, so a request can be authenticated and role-checked without loading
+the User and UserProfile rows. Tokens issued without those claims still work
+through the regular database lookup.
+
+Claims go stale when a role or an account changes. ``revoke_tokens`` records
+the time of such a change in a TokenRevocation row, and tokens issued before
+it are rejected, so the user has to log in again to get a token with the new
+role. Each process caches what it read for REVOCATION_CACHE_SECONDS, so with
+a per-process cache another worker can accept a revoked token for at most
+that long; with a shared cache the revocation is seen at once.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenRevocation, UserProfile
+
+
+REVOKED_KEY = 'auth:revoked:{}'
+
+
+def issue_tokens(user, profile=None):
+    """
+    Refresh token (and, through it, access token) with the role claims
+    """
+    profile = profile or getattr(user, 'profile', None)
+    refresh = RefreshToken.for_user(user)
+    if profile is None:
+        # No role to embed; these tokens use the database lookup
+        return refresh
+    refresh['username'] = user.username
+    refresh['profile_id'] = profile.id
+    refresh['role'] = profile.role
+    refresh['profile_active'] = profile.active
+    return refresh
+
+
+def _cache_timeout():
+    return getattr(settings, 'REVOCATION_CACHE_SECONDS', 30)
+
+
+def revoke_tokens(user_id):
+    """
+    Reject every token of ``user_id`` issued before the current second.
+    The row is written in the caller's transaction and the cache updated
+    once it commits, so a rolled back change revokes nothing.
+    """
+    now = timezone.now()
+    TokenRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_at': now})
+    transaction.on_commit(
+        lambda: cache.set(REVOKED_KEY.format(user_id), int(now.timestamp()), timeout=_cache_timeout())
+    )
+
+
+def revoked_at(user_id):
+    """
+    Second of the last revocation of ``user_id``'s tokens, 0 if none.
+    Tokens carry ``iat`` in whole seconds, so one issued in the second of a
+    revocation, like the token returned with a password change, is kept.
+    """
+    key = REVOKED_KEY.format(user_id)
+    moment = cache.get(key)
+    if moment is None:
+        revocation = TokenRevocation.objects.filter(user_id=user_id).values_list('revoked_at', flat=True).first()
+        moment = int(revocation.timestamp()) if revocation else 0
+        cache.set(key, moment, timeout=_cache_timeout())
+    return moment
+
+
+def _loaded(instance):
+    # Look like a row loaded from the database, so relations and equality work
+    instance._state.adding = False
+    instance._state.db = DEFAULT_DB_ALIAS
+    return instance
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError("Users built from token claims can't be saved; load the user from the database")
+
+
+def token_user(token):
+    """
+    An unsaved User with its profile, built from the token's claims
+    """
+    user = _loaded(User(
+        id=token[api_settings.USER_ID_CLAIM],
+        username=token['username'],
+        is_active=True
+    ))
+    user.save = _read_only
+    user.profile = _loaded(UserProfile(
+        id=token['profile_id'],
+        user=user,
+        role=token['role'],
+        active=token.get('profile_active', True)
+    ))
+    user.profile.save = _read_only
+    return user
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the role claims instead of querying
+    User and UserProfile on every request
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if validated_token.get('iat', 0) < revoked_at(user_id):
+            raise AuthenticationFailed("Token was revoked, please log in again", code="token_revoked")
+
+        if 'role' not in validated_token or 'profile_id' not in validated_token:
+            return super().get_user(validated_token)
+        return token_user(validated_token)
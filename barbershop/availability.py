@@ -0,0 +1,220 @@
+"""
+Availability engine for barber time slots.
+
+Free time is computed by subtracting a barber's booked intervals from their
+schedule windows in one sorted sweep, so the cost of answering a request
+depends on the bookings of that day only, not on the barber's whole history.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from . import schedule_cache
+from .models import Appointment, UserProfile
+
+
+def merge_intervals(intervals):
+    """
+    Sort (start, end) pairs and merge the ones that touch or overlap
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(windows, busy):
+    """
+    Return the parts of ``windows`` that are not covered by ``busy``.
+
+    Both arguments are iterables of (start, end) pairs in any order. The
+    result is sorted and never contains empty intervals.
+    """
+    busy = merge_intervals(busy)
+    free = []
+    first = 0
+
+    for start, end in merge_intervals(windows):
+        # Busy intervals ending before this window can't affect later ones either
+        while first < len(busy) and busy[first][1] <= start:
+            first += 1
+
+        cursor = start
+        index = first
+        while index < len(busy) and busy[index][0] < end:
+            busy_start, busy_end = busy[index]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            index += 1
+
+        if cursor < end:
+            free.append((cursor, end))
+
+    return free
+
+
+def slot_starts(free, duration, step):
+    """
+    List every start time inside ``free`` where ``duration`` fits.
+
+    Candidates begin at the start of each free interval and advance by ``step``.
+    """
+    starts = []
+    for start, end in free:
+        slot = start
+        while slot + duration <= end:
+            starts.append(slot)
+            slot += step
+    return starts
+
+
+def day_bounds(day):
+    """Aware datetimes for the start of ``day`` and of the following day"""
+    start = datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+    return start, start + timedelta(days=1)
+
+
+def schedule_windows(rows, day):
+    """
+    Turn (start_time, end_time) schedule rows into aware windows on ``day``
+    """
+    tz = timezone.get_current_timezone()
+    return [
+        (
+            datetime.combine(day, start_time, tzinfo=tz),
+            datetime.combine(day, end_time, tzinfo=tz),
+        )
+        for start_time, end_time in rows
+    ]
+
+
+def booked_intervals(barber_id, start, end):
+    """
+    Load the (start, end) intervals of a barber's bookings that overlap
+    the range ``start``-``end`` in a single query
+    """
+    return list(
+        Appointment.objects.filter(barber_id=barber_id)
+        .booked()
+        .overlapping(start, end)
+        .values_list('appointment_datetime', 'ends_at')
+    )
+
+
+def find_conflict(barber_id, start, end, exclude_id=None):
+    """
+    Start time of the earliest booking that overlaps [start, end), or None.
+
+    A single LIMIT 1 probe on the (barber, status, active, appointment_datetime)
+    index; the end of each existing booking is computed in the database.
+    """
+    conflicts = Appointment.objects.filter(barber_id=barber_id).booked().overlapping(start, end)
+    if exclude_id is not None:
+        conflicts = conflicts.exclude(id=exclude_id)
+    return conflicts.order_by('appointment_datetime').values_list(
+        'appointment_datetime', flat=True
+    ).first()
+
+
+def available_slots(barber_id, day, duration_minutes, step_minutes=15, now=None):
+    """
+    Every free start time for a barber on ``day``.
+
+    Runs one query, for the bookings of that day; the schedule windows come
+    from the per-process schedule cache. Slots in the past are dropped.
+    """
+    windows = schedule_windows(schedule_cache.week(barber_id).get(day.isoweekday(), []), day)
+    if not windows:
+        return []
+
+    day_start, day_end = day_bounds(day)
+    free = subtract_intervals(windows, booked_intervals(barber_id, day_start, day_end))
+
+    now = now or timezone.now()
+    return [
+        slot for slot in slot_starts(
+            free,
+            timedelta(minutes=duration_minutes),
+            timedelta(minutes=step_minutes),
+        )
+        if slot >= now
+    ]
+
+
+def search_slots(duration_minutes, start_date, end_date, barber_ids=None,
+                 step_minutes=15, limit=20, per_barber=None, now=None):
+    """
+    Earliest free slots across several barbers and days.
+
+    Loads the active barbers and every booking in the range with one query
+    each, takes their weeks from the schedule cache and sweeps each barber
+    once, so the number of queries doesn't grow with barbers or days.
+
+    Returns up to ``limit`` dicts with barber_id, barber_name, start and end,
+    ordered by start time. ``per_barber`` caps the slots kept for each barber.
+    """
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+
+    barbers = UserProfile.objects.filter(role=UserProfile.Roles.BARBER, active=True)
+    if barber_ids is not None:
+        barbers = barbers.filter(user_id__in=barber_ids)
+    names = dict(barbers.values_list('user_id', 'user__username'))
+
+    weekdays = {day.isoweekday() for day in days}
+    weeks = {
+        barber_id: week
+        for barber_id, week in schedule_cache.weeks(names).items()
+        if weekdays & set(week)
+    }
+    if not weeks:
+        return []
+
+    range_start = day_bounds(days[0])[0]
+    range_end = day_bounds(days[-1])[1]
+    busy = defaultdict(list)
+    for barber_id, booked_start, booked_end in (
+        Appointment.objects.filter(barber_id__in=list(weeks))
+        .booked()
+        .overlapping(range_start, range_end)
+        .values_list('barber_id', 'appointment_datetime', 'ends_at')
+    ):
+        busy[barber_id].append((booked_start, booked_end))
+
+    now = now or timezone.now()
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes)
+
+    def barber_slots(barber_id):
+        windows = []
+        for day in days:
+            windows.extend(schedule_windows(weeks[barber_id].get(day.isoweekday(), []), day))
+        free = subtract_intervals(windows, busy[barber_id])
+        slots = (
+            (slot, barber_id)
+            for slot in slot_starts(free, duration, step)
+            if slot >= now
+        )
+        return islice(slots, per_barber)
+
+    # Each barber's slots are already sorted, so a k-way merge ranks them
+    ranked = heapq.merge(*(barber_slots(barber_id) for barber_id in sorted(weeks)))
+    return [
+        {
+            "barber_id": barber_id,
+            "barber_name": names[barber_id],
+            "start": slot,
+            "end": slot + duration,
+        }
+        for slot, barber_id in islice(ranked, limit)
+    ]
@@ -0,0 +1,130 @@
+"""
+Transactional booking.
+
+Bookings for the same barber are serialized by locking the barber's profile
+row before the overlap check, so two requests for the same slot can't both
+pass the check and insert. On PostgreSQL the optional exclusion constraint
+installed by ``manage.py booking_constraint`` backs this up in the schema.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .availability import find_conflict
+from .models import Appointment, UserProfile
+
+
+EXCLUSION_CONSTRAINT = 'appointment_no_overlap'
+
+
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Time slot conflicts with existing appointment"
+    default_code = 'slot_unavailable'
+
+
+def lock_barber(barber_id):
+    """
+    Hold the barber's lock row until the surrounding transaction ends
+    """
+    lock_barbers([barber_id])
+
+
+def lock_barbers(barber_ids):
+    """
+    Hold the lock rows of several barbers, taken in id order so concurrent
+    callers can't deadlock
+    """
+    profiles = UserProfile.objects.filter(user_id__in=barber_ids)
+    if connection.features.has_select_for_update:
+        list(profiles.order_by('id').select_for_update().values_list('id', flat=True))
+    else:
+        # SQLite has no row locks; any write takes the database write lock,
+        # which serializes writers just the same.
+        profiles.update(active=F('active'))
+
+
+def _ensure_free(barber_id, start, minutes, exclude_id=None):
+    conflict_time = find_conflict(
+        barber_id, start, start + timedelta(minutes=minutes), exclude_id=exclude_id
+    )
+    if conflict_time is not None:
+        raise SlotUnavailable({
+            "error": "Time slot conflicts with existing appointment",
+            "conflict_time": conflict_time.isoformat()
+        })
+
+
+def _save(save):
+    try:
+        # Savepoint, so a constraint violation leaves the transaction usable
+        with transaction.atomic():
+            return save()
+    except IntegrityError as exc:
+        if EXCLUSION_CONSTRAINT in str(exc):
+            raise SlotUnavailable()
+        raise
+
+
+def book(serializer, **save_kwargs):
+    """
+    Save a validated AppointmentDetailSerializer unless the slot is taken.
+
+    Raises SlotUnavailable (409) when another booking overlaps.
+    """
+    data = {**serializer.validated_data, **save_kwargs}
+
+    with transaction.atomic():
+        if data.get('status', Appointment.Status.BOOKED) == Appointment.Status.BOOKED \
+                and data.get('active', True):
+            lock_barber(data['barber'].id)
+            _ensure_free(data['barber'].id, data['appointment_datetime'], data['duration_minutes'])
+        return _save(lambda: serializer.save(**save_kwargs))
+
+
+def update(serializer):
+    """
+    Save a validated update of an appointment. When its time, barber or
+    length changes (or it becomes booked again), the new slot is checked
+    under the barber's lock like a reschedule, ignoring the appointment's
+    own old slot.
+
+    Raises SlotUnavailable when another booking overlaps.
+    """
+    appointment = serializer.instance
+    data = serializer.validated_data
+    barber_id = data['barber'].id if 'barber' in data else appointment.barber_id
+    start = data.get('appointment_datetime', appointment.appointment_datetime)
+    minutes = data.get('duration_minutes', appointment.duration_minutes)
+
+    was_booked = appointment.status == Appointment.Status.BOOKED and appointment.active
+    booked = data.get('status', appointment.status) == Appointment.Status.BOOKED \
+        and data.get('active', appointment.active)
+    moved = (barber_id, start, minutes) != (
+        appointment.barber_id, appointment.appointment_datetime, appointment.duration_minutes
+    )
+
+    with transaction.atomic():
+        if booked and (moved or not was_booked):
+            lock_barber(barber_id)
+            _ensure_free(barber_id, start, minutes, exclude_id=appointment.id)
+        return _save(serializer.save)
+
+
+def reschedule(appointment, new_datetime, note):
+    """
+    Move a booked appointment unless the new slot is taken by another booking
+    """
+    with transaction.atomic():
+        lock_barber(appointment.barber_id)
+        _ensure_free(
+            appointment.barber_id, new_datetime, appointment.duration_minutes,
+            exclude_id=appointment.id
+        )
+        appointment.appointment_datetime = new_datetime
+        appointment.notes = f"{appointment.notes}\n{note}".strip()
+        _save(appointment.save)
+    return appointment
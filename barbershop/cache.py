@@ -0,0 +1,140 @@
+"""
+Versioned cache of rendered API responses.
+
+Responses are stored as rendered bytes under a key that includes the
+namespace's current version, the requester's role and the full URL.
+Changing the underlying data bumps the namespace version (see signals.py),
+so stale entries are never read again and simply expire. Any Django cache
+backend works, but the version has to live in a cache shared by every
+process (see CACHES): when it doesn't (``is_shared``), responses aren't
+cached at all.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .conditional import not_modified
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'response-cache:version:{}'
+RESPONSE_KEY = 'response-cache:{}:{}:{}:{}'
+
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+SERVICES = 'services'
+BARBERS = 'barbers'
+
+
+def is_shared():
+    """
+    False when the default cache lives in each process's memory while
+    several workers (WEB_CONCURRENCY) serve requests: a version bumped in
+    one of them is never seen by the others
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    return not (backend.endswith('.LocMemCache') and getattr(settings, 'WEB_CONCURRENCY', 1) > 1)
+
+
+def warn_if_not_shared():
+    if not is_shared():
+        logger.warning(
+            "The default cache is local memory but WEB_CONCURRENCY is %s: schedule "
+            "versions are not shared and responses are not cached; set REDIS_URL",
+            settings.WEB_CONCURRENCY,
+        )
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60)
+
+
+def _fresh_version():
+    # Time based, so a version lost with a cache eviction isn't reused
+    return time.time_ns()
+
+
+def version(namespace):
+    return cache.get_or_set(VERSION_KEY.format(namespace), _fresh_version, timeout=None)
+
+
+def versions(namespaces):
+    """{namespace: version} for several namespaces in one cache round trip"""
+    keys = {namespace: VERSION_KEY.format(namespace) for namespace in namespaces}
+    found = cache.get_many(keys.values())
+    return {
+        namespace: found[key] if key in found else version(namespace)
+        for namespace, key in keys.items()
+    }
+
+
+def bump(*namespaces):
+    """
+    Invalidate every cached response of ``namespaces``
+    """
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+
+
+def variant(request):
+    """The part of the requester that changes what a response contains"""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    return user.profile.role if hasattr(user, 'profile') else 'none'
+
+
+def response_key(namespace, request):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    renderer = getattr(request, 'accepted_renderer', None)
+    variant_key = f'{variant(request)}.{renderer.format if renderer else ""}'
+    return RESPONSE_KEY.format(namespace, version(namespace), variant_key, url)
+
+
+def cached_response(namespace):
+    """
+    Serve a viewset action from the cache; successful responses are
+    rendered once and stored as bytes. Without a shared cache the action
+    always runs, since other workers' bumps would never reach this one.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not is_shared():
+                return method(view, request, *args, **kwargs)
+            key = response_key(namespace, request)
+            hit = cache.get(key)
+            if hit is not None:
+                content, headers = hit
+                # Revalidation is answered from the stored validators too
+                if 'ETag' in headers:
+                    response = not_modified(request, headers['ETag'])
+                    if response is not None:
+                        return response
+                response = HttpResponse(content)
+                for name, value in headers.items():
+                    response[name] = value
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = view.get_renderer_context()
+            response.render()
+            headers = {name: response[name] for name in STORED_HEADERS if name in response}
+            cache.set(key, (response.content, headers), _timeout())
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,313 @@
+"""
+Google Calendar sync queue.
+
+Requests only enqueue a CalendarSyncTask per appointment. The
+``sync_calendar`` command claims due tasks, groups them per barber and sends
+each group as Calendar batch HTTP requests (up to 50 calls each), inserting,
+updating or deleting events to match the appointment's current state.
+Transient errors are retried with exponential backoff.
+
+Tasks are claimed in one short transaction that marks them RUNNING with a
+lease, the HTTP calls go out with no transaction open, and the results are
+saved in another. A task still RUNNING after its lease (the worker died) is
+claimed again. No task is claimed while another one of the same
+appointment holds a lease, and the tasks of one appointment claimed
+together share one call, so an event is never synced by two calls at once.
+Tasks run with the appointment's current barber's calendar.
+"""
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from .google_calendar_utils import calendar_credentials, calendar_service, event_body
+from .models import Appointment, CalendarCredential, CalendarEvent, CalendarSyncTask
+
+
+logger = logging.getLogger(__name__)
+
+PROVIDER = 'google_calendar'
+BATCH_LIMIT = 50
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+# How long a claimed task has to finish before another worker claims it
+LEASE = timedelta(minutes=10)
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+def backoff(attempts):
+    """Delay before the next try after ``attempts`` failed syncs"""
+    return min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def enqueue(appointment):
+    """
+    Queue a sync of ``appointment`` unless one is already pending.
+
+    The task holds no payload; the worker reads the appointment when it runs,
+    so several changes before a sync collapse into one API call.
+    """
+    task, _ = CalendarSyncTask.objects.get_or_create(
+        appointment=appointment,
+        status=CalendarSyncTask.Status.PENDING,
+        defaults={'barber_id': appointment.barber_id}
+    )
+    return task
+
+
+def appointment_saved(appointment, created):
+    """
+    Queue a sync when a new booking belongs to a barber who connected their
+    calendar, or when an already synced appointment changes.
+    """
+    if created:
+        needed = CalendarCredential.objects.filter(barber_id=appointment.barber_id).exists()
+    else:
+        needed = CalendarEvent.objects.filter(appointment=appointment, provider=PROVIDER).exists()
+    if needed:
+        enqueue(appointment)
+
+
+def appointments_changed(appointment_ids):
+    """
+    Batch form of ``appointment_saved`` for changes made with update() or
+    bulk_update(), which send no post_save: queue one sync for each synced
+    appointment that has none pending, in two queries
+    """
+    changed = Appointment.objects.filter(
+        pk__in=appointment_ids, calendar_events__provider=PROVIDER
+    ).exclude(
+        calendar_sync_tasks__status=CalendarSyncTask.Status.PENDING
+    ).values_list('id', 'barber_id').distinct()
+    return CalendarSyncTask.objects.bulk_create(
+        CalendarSyncTask(appointment_id=appointment_id, barber_id=barber_id)
+        for appointment_id, barber_id in changed
+    )
+
+
+def is_transient(exc):
+    """True for errors worth retrying: timeouts, 5xx, 429 and 403 rate limits"""
+    if not isinstance(exc, HttpError):
+        # Transport errors (connection reset, timeout, ...)
+        return True
+    if exc.resp.status in TRANSIENT_STATUSES:
+        return True
+    if exc.resp.status == 403:
+        try:
+            errors = json.loads(exc.content)['error']['errors']
+        except (ValueError, KeyError, TypeError):
+            return False
+        return any(error.get('reason') in RATE_LIMIT_REASONS for error in errors)
+    return False
+
+
+def _claim(batch_size, now):
+    """
+    Due tasks, marked RUNNING until ``now + LEASE``. One task per
+    appointment is returned; the others of that appointment are in its
+    ``merged`` list and share its outcome.
+    """
+    running = CalendarSyncTask.objects.filter(
+        appointment_id=OuterRef('appointment_id'),
+        status=CalendarSyncTask.Status.RUNNING,
+        next_attempt_at__gt=now,
+    )
+    with transaction.atomic():
+        due = CalendarSyncTask.objects.filter(
+            status__in=[CalendarSyncTask.Status.PENDING, CalendarSyncTask.Status.RUNNING],
+            next_attempt_at__lte=now,
+        ).exclude(Exists(running)).select_related(
+            'appointment__client', 'appointment__service'
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True, of=('self',))
+        claimed = list(due[:batch_size])
+        tasks = {}
+        for task in claimed:
+            task.status = CalendarSyncTask.Status.RUNNING
+            task.attempts += 1
+            task.next_attempt_at = now + LEASE
+            task.merged = []
+            if task.appointment_id in tasks:
+                # One call brings the event up to date for both
+                tasks[task.appointment_id].merged.append(task)
+            else:
+                tasks[task.appointment_id] = task
+        CalendarSyncTask.objects.bulk_update(claimed, ['status', 'attempts', 'next_attempt_at'])
+    return list(tasks.values())
+
+
+def _wants_event(appointment):
+    return appointment.active and appointment.status != Appointment.Status.CANCELED
+
+
+def _operation(service, task, event):
+    """The API call that brings the calendar in line with the appointment"""
+    appointment = task.appointment
+    events = service.events()
+    if not _wants_event(appointment):
+        if event is None:
+            return None
+        return events.delete(calendarId='primary', eventId=event.external_event_id)
+    if event is None:
+        return events.insert(calendarId='primary', body=event_body(appointment))
+    return events.update(calendarId='primary', eventId=event.external_event_id, body=event_body(appointment))
+
+
+class _Outcome:
+    """Collects per-task results of a run and writes them back in bulk"""
+
+    def __init__(self, now):
+        self.now = now
+        self.tasks = []
+        self.created = []
+        self.synced = []
+        self.deleted = []
+        self.result = {"synced": 0, "retry": 0, "failed": 0}
+
+    def _finish(self, task, key):
+        """Record ``task`` and the tasks merged into it under ``key``"""
+        for other in task.merged:
+            other.status = task.status
+            other.next_attempt_at = task.next_attempt_at
+            other.last_error = task.last_error
+            other.finished_at = task.finished_at
+        self.tasks += [task, *task.merged]
+        self.result[key] += 1 + len(task.merged)
+
+    def done(self, task):
+        task.status = CalendarSyncTask.Status.DONE
+        task.finished_at = timezone.now()
+        task.last_error = ""
+        self._finish(task, "synced")
+
+    def retry(self, task, at):
+        task.status = CalendarSyncTask.Status.PENDING
+        task.next_attempt_at = at
+        self._finish(task, "retry")
+
+    def error(self, task, exc, transient=True):
+        task.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+        if transient and task.attempts < MAX_ATTEMPTS:
+            self.retry(task, self.now + backoff(task.attempts))
+        else:
+            task.status = CalendarSyncTask.Status.FAILED
+            task.finished_at = timezone.now()
+            self._finish(task, "failed")
+
+    @transaction.atomic
+    def save(self):
+        CalendarEvent.objects.bulk_create(self.created)
+        if self.synced:
+            CalendarEvent.objects.filter(id__in=self.synced).update(synced_at=timezone.now())
+        if self.deleted:
+            CalendarEvent.objects.filter(id__in=self.deleted).delete()
+        CalendarSyncTask.objects.bulk_update(
+            self.tasks, ['status', 'attempts', 'next_attempt_at', 'last_error', 'finished_at']
+        )
+
+
+def _sync_barber(tasks, credential, events, outcome):
+    try:
+        service = calendar_service(
+            calendar_credentials(credential.access_token, credential.refresh_token)
+        )
+    except Exception as exc:
+        for task in tasks:
+            outcome.error(task, exc)
+        return
+
+    pending = {}
+    for task in tasks:
+        event = events.get(task.appointment_id)
+        request = _operation(service, task, event)
+        if request is None:
+            outcome.done(task)
+        else:
+            pending[str(task.id)] = (task, event, request)
+
+    def callback(request_id, response, exception):
+        task, event, _ = pending.pop(request_id)
+        if exception is None:
+            if event is None:
+                outcome.created.append(CalendarEvent(
+                    appointment=task.appointment,
+                    external_event_id=response['id'],
+                    provider=PROVIDER,
+                    synced_at=timezone.now()
+                ))
+            elif not _wants_event(task.appointment):
+                outcome.deleted.append(event.id)
+            else:
+                outcome.synced.append(event.id)
+            outcome.done(task)
+        elif event is not None and exception.resp.status in (404, 410):
+            # The event was removed on Google's side: forget it, and recreate
+            # it on the next run if the appointment still needs one.
+            outcome.deleted.append(event.id)
+            if not _wants_event(task.appointment):
+                outcome.done(task)
+            else:
+                outcome.retry(task, outcome.now)
+        else:
+            outcome.error(task, exception, transient=is_transient(exception))
+
+    ids = list(pending)
+    for start in range(0, len(ids), BATCH_LIMIT):
+        chunk = ids[start:start + BATCH_LIMIT]
+        batch = service.new_batch_http_request(callback=callback)
+        for request_id in chunk:
+            batch.add(pending[request_id][2], request_id=request_id)
+        try:
+            service.execute(batch)
+        except Exception as exc:
+            logger.warning("Calendar batch for barber %s failed: %s", credential.barber_id, exc)
+            for request_id in chunk:
+                if request_id in pending:
+                    outcome.error(pending.pop(request_id)[0], exc, transient=is_transient(exc))
+
+
+def run_pending(batch_size=200, now=None):
+    """
+    Process one round of due sync tasks.
+
+    Returns a dict with the number of tasks synced, rescheduled and given up.
+    """
+    now = now or timezone.now()
+    outcome = _Outcome(now)
+
+    tasks = _claim(batch_size, now)
+    if not tasks:
+        return outcome.result
+
+    by_barber = defaultdict(list)
+    for task in tasks:
+        # The appointment may have moved to another barber since it was queued
+        by_barber[task.appointment.barber_id].append(task)
+
+    credentials = CalendarCredential.objects.in_bulk(list(by_barber))
+    events = {
+        event.appointment_id: event
+        for event in CalendarEvent.objects.filter(
+            appointment_id__in=[task.appointment_id for task in tasks], provider=PROVIDER
+        )
+    }
+
+    for barber_id, barber_tasks in by_barber.items():
+        credential = credentials.get(barber_id)
+        if credential is None:
+            missing = LookupError("Barber has no Google Calendar credentials")
+            for task in barber_tasks:
+                outcome.error(task, missing)
+            continue
+        _sync_barber(barber_tasks, credential, events, outcome)
+
+    outcome.save()
+    return outcome.result
@@ -0,0 +1,79 @@
+"""
+Conditional GET for list endpoints.
+
+Before serializing, the filtered queryset is reduced to a validator of
+(newest ``updated_at``, row count). Any save bumps ``updated_at`` and
+any insert or delete changes the count. When the client's
+``If-None-Match`` matches, a bodiless 304 is returned and the rows are
+never loaded or serialized.
+
+``Last-Modified`` is sent for information only. A hard delete doesn't
+move it, so ``If-Modified-Since`` alone never produces a 304.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def validators(request, queryset):
+    """(ETag, last modified datetime or None) of ``queryset`` for this request"""
+    state = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    renderer = getattr(request, 'accepted_renderer', None)
+    seed = '|'.join(str(part) for part in (
+        request.get_full_path(),
+        request.user.pk,
+        renderer.format if renderer else '',
+        state['last_modified'].isoformat() if state['last_modified'] else '',
+        state['count'],
+    ))
+    return quote_etag(hashlib.md5(seed.encode()).hexdigest()), state['last_modified']
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    A 304 carrying the validators when the client's copy is current (or a
+    412 for a failed If-Match), else None
+    """
+    response = get_conditional_response(request, etag=etag)
+    if isinstance(response, HttpResponseNotModified):
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``list`` with 304 Not Modified when the client's ETag is current
+    (unless ``conditional_list`` is off). Other actions call
+    ``conditional()`` with the queryset they render.
+    """
+    conditional_list = True
+
+    def conditional(self, queryset, render):
+        """
+        ``render()`` the response unless the client's copy of ``queryset`` is
+        current; either way the response carries ETag and Last-Modified
+        """
+        etag, last_modified = validators(self.request, queryset)
+        response = not_modified(self.request, etag, last_modified)
+        if response is not None:
+            return response
+        response = render()
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        render = lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        if not self.conditional_list:
+            return render()
+        return self.conditional(self.filter_queryset(self.get_queryset()), render)
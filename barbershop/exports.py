@@ -0,0 +1,101 @@
+"""
+Streaming exports of appointments, payments and ratings.
+
+Rows are read with ``values_list()`` over a server-side cursor
+(``iterator(chunk_size=...)``) and encoded one at a time, so memory use
+doesn't grow with the number of rows exported. Both the API endpoints and
+``manage.py export_data`` use these generators.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer
+
+from .models import Appointment, Payment, Rating
+from .scoping import filter_appointments, filter_payments, filter_ratings
+
+
+CHUNK_SIZE = 2000
+
+
+class CSVRenderer(BaseRenderer):
+    """Selected by ?format=csv; the export views stream the body themselves"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Errors (e.g. 401) are rendered as a single JSON line
+        return json.dumps(data).encode() if data is not None else b''
+
+
+class NDJSONRenderer(CSVRenderer):
+    """Selected by ?format=ndjson"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+# name -> (model, scoping function, exported columns)
+EXPORTS = {
+    'appointments': (Appointment, filter_appointments, [
+        'id', 'client_id', 'client__username', 'barber_id', 'barber__username',
+        'service_id', 'service__name', 'appointment_datetime', 'duration_minutes',
+        'status', 'notes', 'created_at',
+    ]),
+    'payments': (Payment, filter_payments, [
+        'id', 'appointment_id', 'appointment__client_id', 'appointment__barber_id',
+        'amount', 'currency', 'status', 'paid_at', 'provider', 'created_at',
+    ]),
+    'ratings': (Rating, filter_ratings, [
+        'id', 'appointment_id', 'appointment__barber_id', 'user_id', 'score',
+        'comment', 'created_at',
+    ]),
+}
+
+FORMATS = ('csv', 'ndjson')
+
+
+def export_rows(name, user=None, params=None):
+    """
+    (columns, row tuples) for an export, scoped to ``user`` and filtered by
+    the same query parameters as the list endpoints
+    """
+    model, scope, columns = EXPORTS[name]
+    queryset = scope(model.objects.all(), user, params or {}).order_by('pk')
+    return columns, queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose write() hands back what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_json_value(value) for value in row])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_json_value, row)))) + '\n'
+
+
+def stream(name, fmt, user=None, params=None):
+    """Encoded lines of an export in ``fmt`` ('csv' or 'ndjson')"""
+    columns, rows = export_rows(name, user, params)
+    lines = csv_lines if fmt == 'csv' else ndjson_lines
+    return lines(columns, rows)
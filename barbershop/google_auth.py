@@ -0,0 +1,149 @@
+"""
+Google ID-token verification with a process-wide signing-key cache.
+
+Google rotates its signing keys rarely and says how long to keep them in
+the Cache-Control header of the certificate endpoint. The verifier keeps the
+keys in memory for that long, fetches them over a pooled HTTP session, and
+checks token signatures and claims locally, so a login normally makes no
+outgoing request at all.
+"""
+import base64
+import functools
+import json
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from google.auth import jwt
+from requests.adapters import HTTPAdapter
+
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Used when the key endpoint sends no max-age
+DEFAULT_MAX_AGE = 300
+# An unknown key id forces a refetch at most this often (seconds), so forged
+# tokens can't be used to hammer the key endpoint
+MIN_REFETCH_INTERVAL = 60
+CLOCK_SKEW_SECONDS = 10
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class KeyFetchError(Exception):
+    """Google's signing keys could not be loaded"""
+
+
+def _max_age(response):
+    match = MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+    if not match:
+        return DEFAULT_MAX_AGE
+    age = response.headers.get('Age', '0')
+    return max(int(match.group(1)) - (int(age) if age.isdigit() else 0), 0)
+
+
+def _key_id(token):
+    try:
+        header = token.split('.', 1)[0]
+        header = json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4)))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Malformed token header")
+    if not isinstance(header, dict):
+        raise ValueError("Malformed token header")
+    return header.get('kid')
+
+
+class GoogleIdTokenVerifier:
+    """
+    Verifies Google ID tokens against cached signing keys.
+
+    ``clock`` is a monotonic time source, swappable in tests.
+    """
+
+    def __init__(self, certs_url=GOOGLE_CERTS_URL, session=None, clock=time.monotonic, timeout=5):
+        self.certs_url = certs_url
+        self.timeout = timeout
+        self.clock = clock
+        self.session = session or self._session()
+        self.fetches = 0
+        self._certs = {}
+        self._expires_at = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=2)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _fetch(self):
+        try:
+            response = self.session.get(self.certs_url, timeout=self.timeout)
+            response.raise_for_status()
+            certs = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise KeyFetchError(f"Could not fetch Google signing keys: {exc}")
+        now = self.clock()
+        self.fetches += 1
+        self._certs = certs
+        self._fetched_at = now
+        self._expires_at = now + _max_age(response)
+
+    def certs(self, kid=None):
+        """
+        Current signing keys by key id, fetched again once they expire or
+        when ``kid`` is missing from them.
+        """
+        with self._lock:
+            now = self.clock()
+            expired = self._expires_at is None or now >= self._expires_at
+            unknown = (
+                not expired and kid is not None and kid not in self._certs
+                and now - self._fetched_at >= MIN_REFETCH_INTERVAL
+            )
+            if expired or unknown:
+                try:
+                    self._fetch()
+                except KeyFetchError:
+                    # Keep serving the keys we have rather than failing every
+                    # login, and don't retry on every request while Google is down
+                    if not self._certs:
+                        raise
+                    self._fetched_at = now
+                    self._expires_at = max(self._expires_at, now + MIN_REFETCH_INTERVAL)
+            return self._certs
+
+    def verify(self, token, audience):
+        """
+        Return the claims of a valid ID token issued by Google for ``audience``.
+
+        Raises ValueError for invalid tokens and KeyFetchError when the keys
+        can't be loaded.
+        """
+        certs = self.certs(_key_id(token))
+        claims = jwt.decode(
+            token, certs=certs, audience=audience, clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+        )
+        if claims.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+
+
+@functools.lru_cache(maxsize=None)
+def _verifier(certs_url):
+    return GoogleIdTokenVerifier(certs_url)
+
+
+def get_verifier():
+    """The process-wide verifier for GOOGLE_CERTS_URL"""
+    return _verifier(getattr(settings, 'GOOGLE_CERTS_URL', GOOGLE_CERTS_URL))
+
+
+def verify_id_token(token, audience):
+    return get_verifier().verify(token, audience)
@@ -1,27 +1,116 @@
-from googleapiclient.discovery import build
+import functools
+
+from django.conf import settings
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
 from google.oauth2.credentials import Credentials
 from datetime import datetime
 from datetime import timedelta
 
-def create_google_calendar_event(access_token, appointment):
+TOKEN_URI = 'https://oauth2.googleapis.com/token'
+
+
+def calendar_credentials(access_token, refresh_token=None):
     """
-    Create a Google Calendar event using the user's access_token (barber or admin)
+    OAuth credentials for the Calendar API. With a refresh token they renew
+    themselves when the access token expires.
+    """
+    if not refresh_token:
+        return Credentials(token=access_token)
+    return Credentials(
+        token=access_token,
+        refresh_token=refresh_token,
+        token_uri=TOKEN_URI,
+        client_id=settings.GOOGLE_CLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET
+    )
+
+
+class _NoTransport:
+    """Transport of the shared resources; every call must pass its own http"""
+
+    def request(self, *args, **kwargs):
+        raise RuntimeError("Calendar requests must be executed through a CalendarClient")
+
+
+@functools.lru_cache(maxsize=None)
+def _calendar_resources(discovery_url=None):
+    """
+    Parse the Calendar discovery document once per process and build the
+    resources from it. ``events()`` creates a new resource on every call,
+    so it is built here once as well.
+    """
+    if discovery_url:
+        response, content = build_http().request(discovery_url)
+        if response.status >= 300:
+            raise RuntimeError(f"Could not load {discovery_url}: HTTP {response.status}")
+        document = content.decode('utf-8')
+    else:
+        document = get_static_doc('calendar', 'v3')
+    root = build_from_document(document, http=_NoTransport())
+    return root, root.events()
+
+
+class CalendarClient:
+    """
+    Calendar v3 API for one set of credentials.
+
+    The parsed resources are shared process-wide; only the authorized
+    transport belongs to the client, so requests are sent with ``execute``.
     """
-    creds = Credentials(token=access_token)
-    service = build('calendar', 'v3', credentials=creds)
 
-    event_body = {
+    def __init__(self, creds):
+        discovery_url = getattr(settings, 'GOOGLE_CALENDAR_DISCOVERY_URL', None)
+        self._root, self._events = _calendar_resources(discovery_url)
+        self.http = AuthorizedHttp(creds, http=build_http())
+
+    def events(self):
+        return self._events
+
+    def new_batch_http_request(self, callback=None):
+        return self._root.new_batch_http_request(callback=callback)
+
+    def execute(self, request):
+        """Send a request or batch built from this client's resources"""
+        return request.execute(http=self.http)
+
+
+def calendar_service(creds):
+    """
+    Calendar v3 client. Uses GOOGLE_CALENDAR_DISCOVERY_URL when set,
+    otherwise the discovery document bundled with the client library.
+    """
+    return CalendarClient(creds)
+
+
+def event_body(appointment):
+    """
+    Google Calendar event for an appointment
+    """
+    start_time = appointment.appointment_datetime
+    end_time = start_time + timedelta(minutes=appointment.duration_minutes)
+    return {
         'summary': f'Cita con {appointment.client.username}',
-        'description': f'Servicio: {appointment.service.name}\nNotas: {appointment.notes}',
-        'start': {
-            'dateTime': appointment.appointment_datetime.isoformat(),
-            'timeZone': 'America/Mexico_City'
-        },
-        'end': {
-            'dateTime': (appointment.appointment_datetime + timedelta(minutes=appointment.duration_minutes)).isoformat(),
-            'timeZone': 'America/Mexico_City'
+        'description': (
+            f'Servicio: {appointment.service.name}\n'
+            f'Cliente: {appointment.client.username}\n'
+            f'Notas: {appointment.notes or "Sin notas"}'
+        ),
+        'start': {'dateTime': start_time.isoformat(), 'timeZone': 'America/Mexico_City'},
+        'end': {'dateTime': end_time.isoformat(), 'timeZone': 'America/Mexico_City'},
+        'reminders': {
+            'useDefault': False,
+            'overrides': [{'method': 'popup', 'minutes': 30}]
         }
     }
 
-    event = service.events().insert(calendarId='primary', body=event_body).execute()
+
+def create_google_calendar_event(access_token, appointment):
+    """
+    Create a Google Calendar event using the user's access_token (barber or admin)
+    """
+    service = calendar_service(calendar_credentials(access_token))
+    event = service.execute(service.events().insert(calendarId='primary', body=event_body(appointment)))
     return event['id']
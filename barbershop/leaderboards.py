@@ -0,0 +1,244 @@
+"""
+Leaderboards of popular services and top-rated barbers.
+
+Signals record every booking (service, day booked) and rating (barber, day
+rated) in a LeaderboardDay bucket and add it to the LeaderboardEntry of
+each window (7, 30 and 365 days, and all time) covering that day. Reading a
+board first takes the days that have left each window since the last read
+out of its entries, then reads the top k entries from the rank index.
+
+Barbers are ordered by a Bayesian average, (m * C + total) / (C + count):
+every barber starts with C ratings of m (LEADERBOARD_PRIOR_RATINGS and
+LEADERBOARD_PRIOR_MEAN), so a single 5-star rating doesn't top the board.
+
+Bulk writes that skip signals (bulk_create, update()) aren't recorded;
+``rebuild()`` (``manage.py rebuild_leaderboards``) recomputes everything
+from the Appointment and Rating tables. Boards are first built at deploy
+(``rebuild_leaderboards --missing`` in start.sh); a read that still finds
+one unbuilt builds it with ``build_missing``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+from .models import Appointment, LeaderboardDay, LeaderboardEntry, LeaderboardWindow, Rating
+
+
+SERVICES = LeaderboardDay.Boards.SERVICES
+BARBERS = LeaderboardDay.Boards.BARBERS
+BOARDS = (SERVICES, BARBERS)
+
+ALL_TIME = 0
+WINDOWS = (7, 30, 365, ALL_TIME)
+# Buckets are kept as long as the longest window needs them
+KEPT_DAYS = max(WINDOWS)
+
+
+def _prior():
+    return (
+        getattr(settings, 'LEADERBOARD_PRIOR_RATINGS', 10),
+        float(getattr(settings, 'LEADERBOARD_PRIOR_MEAN', 3.0)),
+    )
+
+
+def score(board, count, total):
+    """Ranking score of a subject's totals"""
+    if board == SERVICES:
+        return float(count)
+    weight, mean = _prior()
+    return (weight * mean + total) / (weight + count)
+
+
+def _score_after(board, count, total):
+    """Score expression for an UPDATE adding ``count`` and ``total``"""
+    if board == SERVICES:
+        return Cast(F('count') + count, FloatField())
+    weight, mean = _prior()
+    return (
+        Value(weight * mean) + Cast(F('total') + total, FloatField())
+    ) / Cast(F('count') + (weight + count), FloatField())
+
+
+def _cutoff(days, today):
+    return today - timedelta(days=days) if days != ALL_TIME else None
+
+
+def _covers(cutoff, day):
+    return cutoff is None or day > cutoff
+
+
+def _add(board, subject_id, days, count, total):
+    entries = LeaderboardEntry.objects.filter(board=board, days__in=days, subject_id=subject_id)
+    return entries.update(
+        count=F('count') + count,
+        total=F('total') + total,
+        score=_score_after(board, count, total),
+    )
+
+
+def record(board, subject_id, moment, count, total=0):
+    """
+    Add ``count`` items (and ``total`` rating points) made at ``moment`` to
+    a board; negative values take them out again
+    """
+    day = timezone.localdate(moment)
+    with transaction.atomic():
+        windows = LeaderboardWindow.objects.filter(board=board)
+        if day < timezone.localdate():
+            # A past day may be expiring from a window right now
+            windows = windows.select_for_update()
+        cutoffs = dict(windows.values_list('days', 'cutoff'))
+        if not cutoffs:
+            # Not built yet; building reads the source tables
+            return
+
+        if day > _cutoff(KEPT_DAYS, timezone.localdate()):
+            LeaderboardDay.objects.bulk_create(
+                [LeaderboardDay(board=board, subject_id=subject_id, date=day)], ignore_conflicts=True
+            )
+            LeaderboardDay.objects.filter(board=board, subject_id=subject_id, date=day).update(
+                count=F('count') + count, total=F('total') + total
+            )
+
+        covering = [days for days, cutoff in cutoffs.items() if _covers(cutoff, day)]
+        LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(board=board, days=days, subject_id=subject_id, score=score(board, 0, 0))
+             for days in covering],
+            ignore_conflicts=True
+        )
+        _add(board, subject_id, covering, count, total)
+
+
+def booked(service_id, moment, count):
+    record(SERVICES, service_id, moment, count)
+
+
+def rated(barber_id, rating_score, moment, count):
+    record(BARBERS, barber_id, moment, count, count * rating_score)
+
+
+def _expire(board, windows, today):
+    """Take the days that have left ``windows`` out of their entries"""
+    with transaction.atomic():
+        for window in LeaderboardWindow.objects.select_for_update().filter(board=board, days__in=windows):
+            cutoff = _cutoff(window.days, today)
+            if window.cutoff >= cutoff:
+                continue
+            expired = LeaderboardDay.objects.filter(
+                board=board, date__gt=window.cutoff, date__lte=cutoff
+            ).values('subject_id').annotate(count=Sum('count'), total=Sum('total')).order_by()
+            for row in expired:
+                _add(board, row['subject_id'], [window.days], -row['count'], -row['total'])
+            window.cutoff = cutoff
+            window.save(update_fields=['cutoff'])
+        LeaderboardDay.objects.filter(board=board, date__lte=_cutoff(KEPT_DAYS, today)).delete()
+
+
+def _source(board):
+    """Per subject and day totals straight from the source table"""
+    if board == SERVICES:
+        rows = Appointment.objects.values(subject_id=F('service_id'))
+        totals = {'count': Count('id'), 'total': Value(0)}
+    else:
+        rows = Rating.objects.values(subject_id=F('appointment__barber_id'))
+        totals = {'count': Count('id'), 'total': Sum('score')}
+    return rows.annotate(date=TruncDate('created_at')).values('subject_id', 'date').annotate(**totals).order_by()
+
+
+def compute(board, today=None):
+    """
+    The board as recomputed from scratch: buckets and
+    {(days, subject id): (count, total)}
+    """
+    today = today or timezone.localdate()
+    kept = _cutoff(KEPT_DAYS, today)
+    buckets = []
+    totals = defaultdict(lambda: [0, 0])
+    for row in _source(board):
+        if row['date'] > kept:
+            buckets.append(row)
+        for days in WINDOWS:
+            if _covers(_cutoff(days, today), row['date']):
+                entry = totals[days, row['subject_id']]
+                entry[0] += row['count']
+                entry[1] += row['total']
+    return buckets, {key: tuple(value) for key, value in totals.items()}
+
+
+def rebuild(boards=BOARDS):
+    """Recompute the buckets and entries of ``boards`` from the source tables"""
+    today = timezone.localdate()
+    for board in boards:
+        with transaction.atomic():
+            list(LeaderboardWindow.objects.select_for_update().filter(board=board))
+            buckets, totals = compute(board, today)
+            LeaderboardDay.objects.filter(board=board).delete()
+            LeaderboardEntry.objects.filter(board=board).delete()
+            LeaderboardWindow.objects.filter(board=board).delete()
+            LeaderboardDay.objects.bulk_create(
+                [LeaderboardDay(board=board, **row) for row in buckets], batch_size=1000
+            )
+            LeaderboardEntry.objects.bulk_create(
+                [
+                    LeaderboardEntry(
+                        board=board, days=days, subject_id=subject_id,
+                        count=count, total=total, score=score(board, count, total)
+                    )
+                    for (days, subject_id), (count, total) in totals.items()
+                ],
+                batch_size=1000
+            )
+            LeaderboardWindow.objects.bulk_create(
+                [LeaderboardWindow(board=board, days=days, cutoff=_cutoff(days, today)) for days in WINDOWS]
+            )
+
+
+def build_missing(boards=BOARDS):
+    """
+    Build the ``boards`` that were never built. Returns the boards built;
+    one built meanwhile by another process is left as that process built it.
+    """
+    built = set(LeaderboardWindow.objects.filter(board__in=boards).values_list('board', flat=True))
+    missing = []
+    for board in boards:
+        if board in built:
+            continue
+        try:
+            rebuild([board])
+        except IntegrityError:
+            # A concurrent build committed the same windows and entries first
+            continue
+        missing.append(board)
+    return missing
+
+
+def top(board, subjects, days=ALL_TIME, limit=10, field_name='pk'):
+    """
+    The ``limit`` highest ranked of ``subjects`` (a queryset whose
+    ``field_name`` is the subject id) over the last ``days`` days, as
+    (subject, entry) pairs
+    """
+    today = timezone.localdate()
+    cutoffs = dict(LeaderboardWindow.objects.filter(board=board).values_list('days', 'cutoff'))
+    if not cutoffs:
+        build_missing([board])
+    else:
+        stale = [
+            window for window, cutoff in cutoffs.items()
+            if window != ALL_TIME and cutoff < _cutoff(window, today)
+        ]
+        if stale:
+            _expire(board, stale, today)
+
+    entries = list(
+        LeaderboardEntry.objects.filter(
+            board=board, days=days, count__gt=0, subject_id__in=subjects.values(field_name)
+        ).order_by('-score', '-count', 'subject_id')[:limit]
+    )
+    found = subjects.in_bulk([entry.subject_id for entry in entries], field_name=field_name)
+    return [(found[entry.subject_id], entry) for entry in entries if entry.subject_id in found]
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from barbershop.booking import EXCLUSION_CONSTRAINT
+from barbershop.models import Appointment
+
+
+SPAN_FUNCTION = 'barbershop_appointment_span'
+
+
+class Command(BaseCommand):
+    help = (
+        "Install (or drop with --drop) a PostgreSQL exclusion constraint that "
+        "rejects overlapping booked appointments for the same barber."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true', help="Remove the constraint")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Exclusion constraints need PostgreSQL; row locking alone is used elsewhere.")
+
+        table = connection.ops.quote_name(Appointment._meta.db_table)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options['drop']:
+                cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}")
+                cursor.execute(f"DROP FUNCTION IF EXISTS {SPAN_FUNCTION}(timestamptz, integer)")
+                self.stdout.write(self.style.SUCCESS(f"Dropped {EXCLUSION_CONSTRAINT}"))
+                return
+
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            # timestamptz + interval is only STABLE; a span measured in minutes
+            # doesn't depend on the session time zone, so the wrapper is IMMUTABLE.
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION {SPAN_FUNCTION}(starts timestamptz, minutes integer)
+                RETURNS tstzrange LANGUAGE sql IMMUTABLE PARALLEL SAFE AS
+                $$ SELECT tstzrange(starts, starts + make_interval(mins => minutes), '[)') $$
+            """)
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}")
+            try:
+                with transaction.atomic():
+                    cursor.execute(f"""
+                        ALTER TABLE {table} ADD CONSTRAINT {EXCLUSION_CONSTRAINT}
+                        EXCLUDE USING gist (
+                            barber_id WITH =,
+                            {SPAN_FUNCTION}(appointment_datetime, duration_minutes) WITH &&
+                        ) WHERE (status = %s AND active)
+                    """, [Appointment.Status.BOOKED])
+            except Exception as exc:
+                raise CommandError(
+                    f"Could not add {EXCLUSION_CONSTRAINT}; cancel or move the overlapping "
+                    f"bookings first. ({exc})"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Installed {EXCLUSION_CONSTRAINT}"))
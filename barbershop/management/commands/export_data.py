@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from barbershop import exports
+
+
+class Command(BaseCommand):
+    help = "Stream appointments, payments or ratings as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(exports.EXPORTS))
+        parser.add_argument("--format", choices=exports.FORMATS, default="csv")
+        parser.add_argument("--output", help="File to write to (default: stdout)")
+        parser.add_argument("--start-date", help="Only rows on or after this date")
+        parser.add_argument("--end-date", help="Only rows on or before this date")
+
+    def handle(self, *args, **options):
+        params = {"start_date": options["start_date"], "end_date": options["end_date"]}
+        lines = exports.stream(options["kind"], options["format"], params=params)
+
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        count = -1 if options["format"] == "csv" else 0  # CSV header
+        with open(options["output"], "w", newline="", encoding="utf-8") as fh:
+            for line in lines:
+                fh.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} {options['kind']} to {options['output']}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from barbershop.leaderboards import build_missing, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the popular-service and top-barber leaderboards from the Appointment and Rating tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help="Only build boards that were never built")
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            built = build_missing()
+            self.stdout.write(self.style.SUCCESS(f"Built {len(built)} missing leaderboards"))
+            return
+        rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt leaderboards"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from barbershop.models import BarberRatingSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every BarberRatingSummary row from the Rating table."
+
+    def handle(self, *args, **options):
+        count = BarberRatingSummary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {count} barbers"))
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from barbershop.rollups import refresh
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the DailyBarberStats rollup for the days touched since the last run. "
+        "The first run, or --full, rebuilds it from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every day")
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between refreshes with --loop")
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            # Drop connections a database restart or timeout left broken
+            close_old_connections()
+            try:
+                refreshed = refresh(full=full)
+            except Exception:
+                if not options['loop']:
+                    raise
+                # A worker that dies leaves the stats to the reads; log and try again
+                logger.exception("Refreshing daily stats failed")
+                time.sleep(options['interval'])
+                continue
+            if refreshed is None:
+                self.stdout.write(self.style.SUCCESS("Rebuilt daily stats"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} barber-days"))
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['interval'])
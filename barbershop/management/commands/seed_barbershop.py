@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barbershop.seeding import load
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with synthetic barbers, clients, services, schedules and appointment "
+        "histories with ratings, payments and calendar events. The same --seed gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--barbers', type=int, default=200)
+        parser.add_argument('--clients', type=int, help="Default: ten per barber")
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=730, help="Days of history")
+        parser.add_argument('--future-days', type=int, default=30, help="Days of upcoming bookings")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, help="Generator processes (default: one per CPU)")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT")
+        parser.add_argument('--password', default="1234", help="Every user's password")
+        parser.add_argument(
+            '--password-hashes', type=int, default=32, help="Distinct salted hashes shared by the users"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            created = load(
+                barbers=options['barbers'], clients=options['clients'], appointments=options['appointments'],
+                days=options['days'], future_days=options['future_days'], seed=options['seed'],
+                workers=options['workers'], batch_size=options['batch_size'], password=options['password'],
+                password_hashes=options['password_hashes'], log=self.stdout.write,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        summary = ", ".join(f"{count} {kind.replace('_', ' ')}" for kind, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,49 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from barbershop.notifications import deliver_pending
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued email notifications in batches over one SMTP connection. "
+        "Runs until the outbox is drained, or forever with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new notifications")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        totals = {"sent": 0, "retry": 0, "failed": 0}
+        while True:
+            # Drop connections a database restart or timeout left broken
+            close_old_connections()
+            try:
+                result = deliver_pending(batch_size=options['batch_size'])
+            except Exception:
+                if not options['loop']:
+                    raise
+                # A worker that dies stops all email; log and try again
+                logger.exception("Delivering notifications failed")
+                time.sleep(options['interval'])
+                continue
+            for key, value in result.items():
+                totals[key] += value
+
+            if sum(result.values()) == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals['sent']}, retrying {totals['retry']}, failed {totals['failed']}"
+        ))
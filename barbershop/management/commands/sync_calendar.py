@@ -0,0 +1,49 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from barbershop.calendar_sync import run_pending
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Push queued appointment changes to Google Calendar in per-barber batch "
+        "requests. Runs until the queue is drained, or forever with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new tasks")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        totals = {"synced": 0, "retry": 0, "failed": 0}
+        while True:
+            # Drop connections a database restart or timeout left broken
+            close_old_connections()
+            try:
+                result = run_pending(batch_size=options['batch_size'])
+            except Exception:
+                if not options['loop']:
+                    raise
+                # A worker that dies stops all calendar sync; log and try again
+                logger.exception("Calendar sync failed")
+                time.sleep(options['interval'])
+                continue
+            for key, value in result.items():
+                totals[key] += value
+
+            if sum(result.values()) == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {totals['synced']}, retrying {totals['retry']}, failed {totals['failed']}"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbershop', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barber', 'status', 'active', 'appointment_datetime'], name='appt_barber_status_dt_idx'),
+        ),
+    ]
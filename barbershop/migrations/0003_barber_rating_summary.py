@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def populate_summaries(apps, schema_editor):
+    Rating = apps.get_model('barbershop', 'Rating')
+    BarberRatingSummary = apps.get_model('barbershop', 'BarberRatingSummary')
+    rows = Rating.objects.values(barber_id=F('appointment__barber_id')).annotate(
+        count=Count('id'),
+        total=Sum('score'),
+        **{f'star_{score}': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+    ).order_by()
+    BarberRatingSummary.objects.bulk_create(
+        [BarberRatingSummary(**row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('barbershop', '0002_appointment_conflict_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarberRatingSummary',
+            fields=[
+                ('barber', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
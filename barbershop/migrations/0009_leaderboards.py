@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-17 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbershop', '0008_daily_barber_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('services', 'Popular services'), ('barbers', 'Top-rated barbers')], max_length=10)),
+                ('subject_id', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', 'date'], name='leaderboard_day_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'subject_id', 'date'), name='leaderboard_day_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('services', 'Popular services'), ('barbers', 'Top-rated barbers')], max_length=10)),
+                ('days', models.PositiveSmallIntegerField()),
+                ('subject_id', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', 'days', '-score'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'days', 'subject_id'), name='leaderboard_entry_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('services', 'Popular services'), ('barbers', 'Top-rated barbers')], max_length=10)),
+                ('days', models.PositiveSmallIntegerField()),
+                ('cutoff', models.DateField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('board', 'days'), name='leaderboard_window_key')],
+            },
+        ),
+    ]
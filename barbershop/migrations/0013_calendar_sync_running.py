@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbershop', '0012_notification_sending'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calendarsynctask',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
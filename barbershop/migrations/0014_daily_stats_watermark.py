@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def start_empty_rollup(apps, schema_editor):
+    # With no appointments yet the empty rollup is complete; databases with
+    # history get theirs built by refresh_stats at deploy
+    Appointment = apps.get_model('barbershop', 'Appointment')
+    RollupWatermark = apps.get_model('barbershop', 'RollupWatermark')
+    if not Appointment.objects.exists():
+        RollupWatermark.objects.get_or_create(name='daily_barber_stats', defaults={'value': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barbershop', '0013_calendar_sync_running'),
+    ]
+
+    operations = [
+        migrations.RunPython(start_empty_rollup, migrations.RunPython.noop),
+    ]
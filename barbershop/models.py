@@ -1,6 +1,16 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, DateTimeField, DurationField, ExpressionWrapper, F, Func, Q, Sum, Value
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from .cache import BARBERS, bump
+
+
+# Longest appointment allowed (services are capped at 8 hours as well)
+MAX_APPOINTMENT_MINUTES = 480
 
 
 class UserProfile(models.Model):
@@ -14,18 +24,32 @@ class UserProfile(models.Model):
     phone_number = models.CharField(max_length=20, blank=True)
     google_id = models.CharField(max_length=128, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
 
     def __str__(self):
         return f"{self.user.username} ({self.role})"
 
 
+class TokenRevocation(models.Model):
+    """
+    When a user's tokens were last revoked (barbershop.authentication):
+    tokens issued before ``revoked_at`` are rejected
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="token_revocation")
+    revoked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Tokens of {self.user_id} revoked at {self.revoked_at}"
+
+
 class Service(models.Model):
     name = models.CharField(max_length=120)
     duration_minutes = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True)
     active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -39,10 +63,55 @@ class BarberSchedule(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self): 
         return f"{self.barber.username} - Day {self.day_of_week} {self.start_time}-{self.end_time}"
 
+class Minutes(Func):
+    """
+    An integer number of minutes as a duration, so it can be added to a datetime
+    """
+    output_field = DurationField()
+    # Backends without an interval type store durations as microseconds
+    template = '(%(expressions)s * 60000000)'
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='make_interval(mins => %(expressions)s)',
+            **extra_context
+        )
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def booked(self):
+        """Appointments that still hold their barber's time"""
+        # Compare ``active`` against a literal: Django emits a bare boolean
+        # column for ``active=True``, which SQLite can't match to an index key.
+        return self.filter(status=Appointment.Status.BOOKED, active=Value(True))
+
+    def with_end(self):
+        """Annotate ``ends_at`` = appointment_datetime + duration_minutes"""
+        return self.annotate(ends_at=ExpressionWrapper(
+            F('appointment_datetime') + Minutes('duration_minutes'),
+            output_field=DateTimeField()
+        ))
+
+    def overlapping(self, start, end):
+        """
+        Appointments whose time span overlaps the half-open range [start, end).
+
+        The lower bound on appointment_datetime is implied by the maximum
+        duration; it lets the database answer with an index range scan.
+        """
+        return self.with_end().filter(
+            appointment_datetime__lt=end,
+            appointment_datetime__gt=start - timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+            ends_at__gt=start,
+        )
+
+
 class Appointment(models.Model):
     class Status(models.TextChoices):
         BOOKED = "booked", "Booked"
@@ -58,9 +127,26 @@ class Appointment(models.Model):
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.BOOKED)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
     service = models.ForeignKey(Service, on_delete=models.PROTECT, related_name="appointments")
 
+    objects = AppointmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Conflict checks: barber + booked + active, then a datetime range
+            models.Index(
+                fields=['barber', 'status', 'active', 'appointment_datetime'],
+                name='appt_barber_status_dt_idx'
+            ),
+            # Keyset pagination on (appointment_datetime, id), per role scope
+            models.Index(fields=['barber', 'appointment_datetime', 'id'], name='appt_barber_dt_id_idx'),
+            models.Index(fields=['client', 'appointment_datetime', 'id'], name='appt_client_dt_id_idx'),
+            models.Index(fields=['appointment_datetime', 'id'], name='appt_dt_id_idx'),
+            # Rows changed since the stats rollup's watermark (rollups.py)
+            models.Index(fields=['updated_at'], name='appt_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Appt #{self.id} {self.status} - {self.appointment_datetime}"
@@ -74,11 +160,79 @@ class Rating(models.Model):
     )
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='rating_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='rating_user_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Rating {self.score} for appt {self.appointment_id}"
 
 
+class BarberRatingSummary(models.Model):
+    """
+    Running rating totals per barber, kept in step with Rating by signals
+    so stats can be read with a primary-key lookup
+    """
+    barber = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="rating_summary")
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.barber_id}: {self.count} ratings"
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else 0
+
+    @property
+    def distribution(self):
+        return {str(score): getattr(self, f"star_{score}") for score in range(5, 0, -1)}
+
+    @classmethod
+    def adjust(cls, barber_id, score, delta):
+        """Add (delta=1) or remove (delta=-1) one rating with ``score``"""
+        changes = {
+            'count': F('count') + delta,
+            'total': F('total') + delta * score,
+            f'star_{score}': F(f'star_{score}') + delta,
+        }
+        updated = cls.objects.filter(barber_id=barber_id).update(**changes)
+        # A missing row on removal means the barber is being deleted as well
+        if not updated and delta > 0:
+            cls.objects.get_or_create(barber_id=barber_id)
+            cls.objects.filter(barber_id=barber_id).update(**changes)
+
+    @classmethod
+    def summarize(cls, ratings):
+        """Aggregate a Rating queryset into per-barber summary rows"""
+        return ratings.values(barber_id=F('appointment__barber_id')).annotate(
+            count=Count('id'),
+            total=Sum('score'),
+            **{f'star_{score}': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+        ).order_by()
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every summary from the Rating table"""
+        rows = [cls(**row) for row in cls.summarize(Rating.objects.all())]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+            # Cached barber responses embed the summaries
+            transaction.on_commit(lambda: bump(BARBERS))
+        return len(rows)
+
+
 class Payment(models.Model):
     class Status(models.TextChoices):
         PENDING = "pending", "Pending"
@@ -91,11 +245,136 @@ class Payment(models.Model):
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
     paid_at = models.DateTimeField(null=True, blank=True)
     provider = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='payment_created_id_idx'),
+            models.Index(fields=['updated_at'], name='payment_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.provider} {self.amount} {self.currency}"
 
 
+class DailyBarberStats(models.Model):
+    """
+    Appointments and payments of active appointments rolled up per barber,
+    service, day (in TIME_ZONE) and appointment status. Refreshed by
+    ``manage.py refresh_stats``; see barbershop/rollups.py.
+    """
+    barber = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_stats")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=Appointment.Status.choices)
+    appointments = models.PositiveIntegerField(default=0)
+    payments = models.PositiveIntegerField(default=0)
+    payments_pending = models.PositiveIntegerField(default=0)
+    payments_completed = models.PositiveIntegerField(default=0)
+    payments_refunded = models.PositiveIntegerField(default=0)
+    # Every payment, and completed payments only
+    payment_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['barber', 'service', 'date', 'status'], name='daily_stats_key'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='daily_stats_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.barber_id} {self.date} {self.status}: {self.appointments}"
+
+
+class StatsDirtyDay(models.Model):
+    """
+    A (barber, day) whose rollup must be recomputed although no row dated
+    that day changed, e.g. after a reschedule or delete moved rows away
+    """
+    barber = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['barber', 'date'], name='stats_dirty_day_key'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """How far (by updated_at) a rollup has been refreshed"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class LeaderboardDay(models.Model):
+    """
+    One day of a leaderboard subject: bookings of a service, or ratings of
+    a barber, by the day (in TIME_ZONE) they were made. Days older than the
+    longest window are dropped; see barbershop/leaderboards.py.
+    """
+    class Boards(models.TextChoices):
+        SERVICES = "services", "Popular services"
+        BARBERS = "barbers", "Top-rated barbers"
+
+    board = models.CharField(max_length=10, choices=Boards.choices)
+    # Service id or barber (User) id
+    subject_id = models.PositiveIntegerField()
+    date = models.DateField()
+    count = models.IntegerField(default=0)
+    # Sum of rating scores (barbers only)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'subject_id', 'date'], name='leaderboard_day_key'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'date'], name='leaderboard_day_date_idx'),
+        ]
+
+
+class LeaderboardEntry(models.Model):
+    """A subject's totals over the last ``days`` days (0: all time)"""
+    board = models.CharField(max_length=10, choices=LeaderboardDay.Boards.choices)
+    days = models.PositiveSmallIntegerField()
+    subject_id = models.PositiveIntegerField()
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # What the board is ordered by: the count, or a Bayesian-average rating
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'days', 'subject_id'], name='leaderboard_entry_key'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'days', '-score'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.board}/{self.days} {self.subject_id}: {self.score}"
+
+
+class LeaderboardWindow(models.Model):
+    """Days up to ``cutoff`` have been taken out of a window's entries"""
+    board = models.CharField(max_length=10, choices=LeaderboardDay.Boards.choices)
+    days = models.PositiveSmallIntegerField()
+    # None for the all-time window
+    cutoff = models.DateField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'days'], name='leaderboard_window_key'),
+        ]
+
+
 class CalendarEvent(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name="calendar_events")
     external_event_id = models.CharField(max_length=128)
@@ -103,4 +382,76 @@ class CalendarEvent(models.Model):
     synced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return f"{self.provider}:{self.external_event_id}"
\ No newline at end of file
+        return f"{self.provider}:{self.external_event_id}"
+
+class Notification(models.Model):
+    """
+    Outbox row for an email. Written in the transaction that triggered it and
+    delivered later by ``manage.py send_notifications``.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENDING = "sending", "Sending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications"
+    )
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="notification_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+class CalendarCredential(models.Model):
+    """Google OAuth tokens used by the calendar sync worker for a barber's calendar"""
+    barber = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="calendar_credential")
+    access_token = models.TextField()
+    refresh_token = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Calendar credential for {self.barber.username}"
+
+
+class CalendarSyncTask(models.Model):
+    """
+    Queued request to bring an appointment's Google Calendar event up to date.
+    The worker decides at run time whether that means insert, update or delete.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name="calendar_sync_tasks")
+    barber = models.ForeignKey(User, on_delete=models.CASCADE, related_name="calendar_sync_tasks")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="calendar_sync_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Sync appointment {self.appointment_id} ({self.status})"
@@ -0,0 +1,148 @@
+"""
+Email outbox.
+
+Requests only insert Notification rows, inside their own transaction, so a
+slow or unreachable SMTP server can't delay or fail a booking. The
+``send_notifications`` command drains the outbox in batches over a single
+SMTP connection and retries failed messages with exponential backoff.
+
+A batch is claimed in one short transaction that marks it SENDING with a
+lease, sent with no transaction open, and its results saved in another, so
+no row lock is held while waiting on SMTP. Rows whose lease ran out (the
+worker died mid-batch) are claimed again; their email may go out twice.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = timedelta(minutes=1)
+MAX_BACKOFF = timedelta(hours=6)
+# How long a claimed batch has to be sent before another worker claims it
+LEASE = timedelta(minutes=10)
+
+
+def backoff(attempts):
+    """Delay before the next try after ``attempts`` failed deliveries"""
+    return min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def new_appointment_message(appointment):
+    """Subject and body of the email sent to a barber for a new booking"""
+    time = appointment.appointment_datetime.strftime("%d/%m/%Y %H:%M")
+    subject = "New Appointment Scheduled"
+    body = (
+        f"Hello {appointment.barber.username},\n\n"
+        f"You have a new appointment:\n\n"
+        f"- Client: {appointment.client.username}\n"
+        f"- Service: {appointment.service.name}\n"
+        f"- Time: {time}\n\n"
+        f"Please check your dashboard or Google Calendar for details.\n\n"
+        f"Best,\nBarbershop System"
+    )
+    return subject, body
+
+
+def queue_new_appointment(appointment):
+    """
+    Add the barber's new-appointment email to the outbox.
+
+    Runs inside the caller's transaction, so a rolled back booking leaves
+    no notification behind.
+    """
+    recipient = appointment.barber.email
+    if not recipient:
+        return None
+    subject, body = new_appointment_message(appointment)
+    return Notification.objects.create(
+        appointment=appointment, recipient=recipient, subject=subject, body=body
+    )
+
+
+def _claim(batch_size, now):
+    """Due notifications, marked SENDING until ``now + LEASE``"""
+    with transaction.atomic():
+        due = Notification.objects.filter(
+            status__in=[Notification.Status.PENDING, Notification.Status.SENDING], next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if db_connection.features.has_select_for_update_skip_locked:
+            # Concurrent workers skip rows another worker is claiming
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        for notification in batch:
+            notification.status = Notification.Status.SENDING
+            notification.attempts += 1
+            notification.next_attempt_at = now + LEASE
+        Notification.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+    return batch
+
+
+def deliver_pending(batch_size=100, now=None, connection=None):
+    """
+    Send one batch of due notifications over a single mail connection.
+
+    Returns a dict with the number of messages sent, rescheduled and given up.
+    """
+    now = now or timezone.now()
+    result = {"sent": 0, "retry": 0, "failed": 0}
+
+    batch = _claim(batch_size, now)
+    if not batch:
+        return result
+
+    mail = connection or get_connection(fail_silently=False)
+    opened = False
+    try:
+        mail.open()
+        opened = True
+    except Exception as exc:
+        logger.warning("Could not open mail connection: %s", exc)
+        error = exc
+
+    for notification in batch:
+        if opened:
+            message = EmailMessage(
+                notification.subject,
+                notification.body,
+                settings.DEFAULT_FROM_EMAIL,
+                [notification.recipient],
+                connection=mail,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                error = exc
+            else:
+                notification.status = Notification.Status.SENT
+                notification.sent_at = timezone.now()
+                notification.last_error = ""
+                result["sent"] += 1
+                continue
+
+        notification.last_error = f"{type(error).__name__}: {error}"
+        if notification.attempts >= MAX_ATTEMPTS:
+            notification.status = Notification.Status.FAILED
+            result["failed"] += 1
+        else:
+            notification.status = Notification.Status.PENDING
+            notification.next_attempt_at = now + backoff(notification.attempts)
+            result["retry"] += 1
+
+    if opened:
+        try:
+            mail.close()
+        except Exception:
+            pass
+
+    # bulk_update saves the whole batch in one transaction
+    Notification.objects.bulk_update(batch, ['status', 'next_attempt_at', 'last_error', 'sent_at'])
+    return result
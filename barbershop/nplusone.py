@@ -0,0 +1,137 @@
+"""
+N+1 query detection for development and tests.
+
+A Detector groups the SELECTs run while it is active by their SQL with
+every literal and parameter taken out. A template repeated NPLUSONE_THRESHOLD
+times (3 by default) is reported, with the serializer field that was
+being rendered when it ran, e.g.
+``PaymentSerializer.appointment_details > AppointmentListSerializer.service_name``.
+
+NPlusOneMiddleware checks every request when NPLUSONE_DETECT is on (it is
+dropped from the stack otherwise). Problems are logged and issued as
+NPlusOneWarning, or raised as NPlusOneError with NPLUSONE_RAISE, which the
+test suite turns on (tests/conftest.py).
+"""
+import logging
+import re
+import sys
+import warnings
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework.serializers import Serializer
+
+
+logger = logging.getLogger(__name__)
+
+_TO_REPRESENTATION = Serializer.to_representation.__code__
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%s|\?')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def _threshold():
+    return getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+
+
+def template(sql):
+    """``sql`` with literals, parameters and IN lists replaced by ?"""
+    sql = _STRINGS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def serializer_fields():
+    """The serializer fields being rendered, outermost first"""
+    chain = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is _TO_REPRESENTATION:
+            field = frame.f_locals.get('field')
+            if field is not None:
+                chain.append(f'{type(field.parent).__name__}.{field.field_name}')
+        frame = frame.f_back
+    return ' > '.join(reversed(chain))
+
+
+class Detector:
+    """
+    connection.execute_wrapper counting SELECT templates; use as a
+    context manager and read ``problems()`` afterwards
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or _threshold()
+        self.counts = Counter()
+        self.sources = defaultdict(Counter)
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            key = template(sql)
+            self.counts[key] += 1
+            self.sources[key][serializer_fields()] += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def problems(self):
+        """
+        (template, count, sources) of every repeated SELECT, most repeated
+        first; sources names the serializer fields that ran it
+        """
+        return [
+            (key, count, ', '.join(
+                source or 'no serializer field' for source, _ in self.sources[key].most_common()
+            ))
+            for key, count in self.counts.most_common()
+            if count >= self.threshold
+        ]
+
+    def report(self, label):
+        return '\n'.join(
+            [f"N+1 queries in {label}:"] + [
+                f"  {count} x {key}\n    from {source}" for key, count, source in self.problems()
+            ]
+        )
+
+
+class NPlusOneMiddleware:
+    """Check each request for repeated SELECTs (NPLUSONE_DETECT)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'NPLUSONE_DETECT', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with Detector() as detector:
+            response = self.get_response(request)
+        if detector.problems():
+            message = detector.report(f"{request.method} {request.get_full_path()}")
+            if getattr(settings, 'NPLUSONE_RAISE', False):
+                raise NPlusOneError(message)
+            logger.warning(message)
+            warnings.warn(message, NPlusOneWarning)
+        return response
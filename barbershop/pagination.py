@@ -0,0 +1,171 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are read with ``WHERE (field, id) < (last field, last id) ORDER BY
+field DESC, id DESC LIMIT n`` instead of OFFSET, so page 5,000 costs the same
+index range scan as page 1. The total count is one extra COUNT(*) per page;
+clients that don't need it can pass ``?count=false``.
+
+Requests using ``?page=`` or an ordering the keyset can't follow fall back
+to regular page-number pagination.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (``ordering_field``, id).
+
+    Subclasses set ``ordering_field``; the view's ordering decides the
+    direction (``-field`` is newest first).
+    """
+    ordering_field = None
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    fallback_class = PageNumberPagination
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        direction = self._direction(ordering)
+
+        if direction is None or self.fallback_class.page_query_param in request.query_params:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.descending = direction == '-'
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no'):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = False
+        if cursor is not None:
+            value, pk, reverse = cursor
+            queryset = queryset.filter(self._after(value, pk, self.descending != reverse))
+
+        # Walking backwards reads the rows in the opposite order, then flips them
+        descending = self.descending != reverse
+        sign = '-' if descending else ''
+        rows = list(queryset.order_by(f'{sign}{self.ordering_field}', f'{sign}pk')[:self.page_size + 1])
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return self.fallback_class().get_paginated_response_schema(schema)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _direction(self, ordering):
+        """'-' or '' when the ordering starts with the keyset field, else None"""
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        first = ordering[0]
+        sign, name = ('-', first[1:]) if first.startswith('-') else ('', first)
+        return sign if name == self.ordering_field else None
+
+    def _after(self, value, pk, descending):
+        """
+        Rows strictly after (value, pk). The leading bound on the field alone
+        lets the database use it as an index range.
+        """
+        field = self.ordering_field
+        if descending:
+            return Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(pk__lt=pk))
+        return Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(pk__gt=pk))
+
+    def _encode_value(self, value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def _decode_value(self, value, model):
+        """The ordering field's value from a cursor; ValidationError if it isn't one"""
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            raise ValidationError("Not a scalar")
+        return model._meta.get_field(self.ordering_field).to_python(value)
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'v': self._encode_value(getattr(row, self.ordering_field)),
+            'id': row.pk,
+        }
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        # A tampered token may decode to any JSON; check every part before it reaches a filter
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            value = self._decode_value(payload['v'], model)
+            pk = payload['id']
+            if value is None or not isinstance(pk, int) or isinstance(pk, bool):
+                raise ValidationError("Missing value or id")
+            return value, pk, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, AttributeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class AppointmentKeysetPagination(KeysetPagination):
+    ordering_field = 'appointment_datetime'
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    ordering_field = 'created_at'
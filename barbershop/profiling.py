@@ -0,0 +1,263 @@
+"""
+Opt-in profiling of single requests.
+
+ProfilingMiddleware runs cProfile around the view of a request when
+- it carries an ``X-Profile`` header signed with SECRET_KEY (copy one from
+  the captures page; it is valid for PROFILING_HEADER_MAX_AGE seconds), or
+- an admin adds ``?_profile=1``; the session or JWT is checked before the
+  profiler starts, so nobody else can make a request pay for it, or
+- its URL name is sampled, e.g. PROFILING_SAMPLE_RATES = {"payment-list": 0.01}.
+A ``memory`` header or ``?_profile=memory`` (or PROFILING_TRACEMALLOC for
+samples) also tracks the tracemalloc peak and the top allocation sites.
+
+Each capture is a ``.prof`` file (load it with pstats or snakeviz) and a
+``.txt`` summary in PROFILING_DIR, which keeps the newest
+PROFILING_MAX_CAPTURES. Staff list and download them at /admin/profiles/.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import RoleJWTAuthentication
+from .models import UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+QUERY_FLAG = '_profile'
+SALT = 'barbershop.profiling'
+
+CPU = 'cpu'
+MEMORY = 'memory'
+
+CAPTURE_NAME = re.compile(r'^[\w.-]+\.(prof|txt)$')
+STATS_LINES = 40
+ALLOCATION_SITES = 15
+
+
+def profiles_dir():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'barbershop-profiles')
+
+
+def _max_captures():
+    return getattr(settings, 'PROFILING_MAX_CAPTURES', 100)
+
+
+def sign(mode=CPU):
+    """A value for the X-Profile header"""
+    return signing.TimestampSigner(salt=SALT).sign(mode)
+
+
+def _signed_mode(value):
+    try:
+        mode = signing.TimestampSigner(salt=SALT).unsign(
+            value, max_age=getattr(settings, 'PROFILING_HEADER_MAX_AGE', 60 * 60)
+        )
+    except signing.BadSignature:
+        return None
+    return mode if mode in (CPU, MEMORY) else None
+
+
+def _is_admin(user):
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_staff or (hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN)
+
+
+def _user(request):
+    """The session user, or else the JWT's, which DRF only sets in the view"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        authenticated = RoleJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+def _requested(request):
+    """(mode, trigger) for a request to profile, or None"""
+    header = request.headers.get(HEADER)
+    if header:
+        mode = _signed_mode(header)
+        if mode:
+            return mode, 'header'
+
+    flag = request.GET.get(QUERY_FLAG)
+    if flag and _is_admin(_user(request)):
+        return (MEMORY if flag == MEMORY else CPU), 'admin'
+
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATES', {}).get(request.resolver_match.view_name)
+    if rate and random.random() < rate:
+        return (MEMORY if getattr(settings, 'PROFILING_TRACEMALLOC', False) else CPU), 'sample'
+    return None
+
+
+class _Session:
+    def __init__(self, mode, trigger):
+        self.mode = mode
+        self.trigger = trigger
+        self.profiler = cProfile.Profile()
+        self.traced_before = tracemalloc.is_tracing()
+        self.memory = None
+
+    def start(self):
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Another profiler is running in this thread
+            return False
+        if self.mode == MEMORY:
+            if self.traced_before:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+        self.started = time.perf_counter()
+        return True
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.profiler.disable()
+        if self.mode == MEMORY:
+            peak = tracemalloc.get_traced_memory()[1]
+            sites = tracemalloc.take_snapshot().statistics('lineno')[:ALLOCATION_SITES]
+            if not self.traced_before:
+                tracemalloc.stop()
+            self.memory = (peak, sites)
+
+
+def _trim(directory):
+    """Keep the newest captures"""
+    captures = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in captures[:-_max_captures()]:
+        stem = name[:-len('.prof')]
+        for suffix in ('.prof', '.txt'):
+            try:
+                os.remove(os.path.join(directory, stem + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def _save(request, response, session):
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    view = request.resolver_match.view_name
+    # Timestamp first: names sort oldest to newest
+    stem = '{}-{}-{}-{}'.format(
+        time.strftime('%Y%m%dT%H%M%S'), re.sub(r'[^\w.-]', '_', view), request.method, uuid.uuid4().hex[:8]
+    )
+
+    session.profiler.dump_stats(os.path.join(directory, f'{stem}.prof'))
+    summary = io.StringIO()
+    summary.write(
+        f"{request.method} {request.get_full_path()}\n"
+        f"view: {view}\nstatus: {response.status_code}\n"
+        f"elapsed: {session.elapsed * 1000:.1f} ms\ntrigger: {session.trigger}\n"
+    )
+    if session.memory:
+        peak, sites = session.memory
+        summary.write(f"tracemalloc peak: {peak / 1024:.1f} KiB\n\nTop allocation sites:\n")
+        for site in sites:
+            summary.write(f"{site}\n")
+    summary.write("\n")
+    pstats.Stats(session.profiler, stream=summary).sort_stats('cumulative').print_stats(STATS_LINES)
+    with open(os.path.join(directory, f'{stem}.txt'), 'w') as stream:
+        stream.write(summary.getvalue())
+    _trim(directory)
+    return stem
+
+
+class ProfilingMiddleware:
+    """
+    Profile the views of requests asking for it (see the module docstring).
+    Goes last in MIDDLEWARE, so the profile covers the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, '_profiling', None)
+        if session is not None:
+            session.stop()
+            try:
+                _save(request, response, session)
+            except OSError as exc:
+                # A full or read-only disk must not fail the profiled request
+                logger.warning("Could not save profile to %s: %s", profiles_dir(), exc)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        requested = _requested(request)
+        if requested:
+            session = _Session(*requested)
+            if session.start():
+                request._profiling = session
+        return None
+
+
+def captures():
+    """Saved captures, newest first, as dicts for the captures page"""
+    directory = profiles_dir()
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.prof')), reverse=True)
+    except FileNotFoundError:
+        return []
+    rows = []
+    for name in names:
+        stem = name[:-len('.prof')]
+        try:
+            size = os.path.getsize(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Trimmed by another worker meanwhile
+            continue
+        rows.append({"stem": stem, "size": size})
+    return rows
+
+
+@staff_member_required
+def captures_view(request):
+    """
+    List profiling captures (staff only)
+    GET /admin/profiles/
+    """
+    return render(request, 'admin/profiling/captures.html', {
+        "title": "Request profiles",
+        "captures": captures(),
+        "header": HEADER,
+        "cpu_header": sign(CPU),
+        "memory_header": sign(MEMORY),
+        "max_captures": _max_captures(),
+    })
+
+
+@staff_member_required
+def capture_download(request, name):
+    """
+    Download a capture's .prof file or view its .txt summary (staff only)
+    GET /admin/profiles/<name>
+    """
+    path = os.path.join(profiles_dir(), name)
+    if not CAPTURE_NAME.match(name) or not os.path.isfile(path):
+        raise Http404("No such capture")
+    if name.endswith('.txt'):
+        return FileResponse(open(path, 'rb'), content_type='text/plain; charset=utf-8')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -0,0 +1,274 @@
+"""
+Daily rollups for appointment and revenue analytics.
+
+DailyBarberStats holds one row per (barber, service, day, status) with the
+appointment count and payment totals of that group, so the stats endpoints
+read a few hundred rows per barber-year instead of the raw tables.
+
+``refresh()`` (``manage.py refresh_stats``) recomputes only the
+(barber, day) pairs touched since the last run:
+- appointments and payments whose ``updated_at`` is past the watermark
+- StatsDirtyDay rows, left by signals for days that rows moved away from
+  (reschedules, deletes)
+Each run rereads a short overlap before the watermark, so rows committed
+late by a long transaction aren't missed.
+
+start.sh runs it once at deploy, which builds the rollup the first time,
+and the refresh_stats worker every minute after that. ``stats_rows`` also
+catches up on the days changed past the watermark unless a refresh is
+already running, so the endpoints don't serve days the worker hasn't
+reached yet. Reads never rebuild the rollup from scratch.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import OperationalError, transaction
+from django.db.models import Count, DateField, DecimalField, Exists, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+
+from .availability import day_bounds
+from .models import (
+    Appointment, DailyBarberStats, Payment, RollupWatermark, StatsDirtyDay
+)
+
+
+WATERMARK = 'daily_barber_stats'
+OVERLAP = timedelta(minutes=5)
+BATCH_SIZE = 1000
+# (barber, span) clauses per recompute query
+CLAUSES_PER_QUERY = 200
+
+INTERVALS = ('day', 'week', 'month')
+
+
+def mark_dirty(days):
+    """Queue (barber id, aware datetime) pairs for the next refresh"""
+    keys = {(barber_id, timezone.localdate(moment)) for barber_id, moment in days}
+    StatsDirtyDay.objects.bulk_create(
+        [StatsDirtyDay(barber_id=barber_id, date=day) for barber_id, day in keys],
+        ignore_conflicts=True
+    )
+
+
+def _money(expression):
+    return Coalesce(expression, Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _aggregate(appointments):
+    """Rollup rows (as dicts) of an Appointment queryset"""
+    paid = Payment.Status
+    return appointments.filter(active=True).annotate(
+        day=TruncDate('appointment_datetime')
+    ).values('barber_id', 'service_id', 'day', 'status').annotate(
+        appointment_count=Count('id', distinct=True),
+        payment_count=Count('payments'),
+        pending=Count('payments', filter=Q(payments__status=paid.PENDING)),
+        completed=Count('payments', filter=Q(payments__status=paid.COMPLETED)),
+        refunded=Count('payments', filter=Q(payments__status=paid.REFUNDED)),
+        amount=_money(Sum('payments__amount')),
+        completed_amount=_money(Sum('payments__amount', filter=Q(payments__status=paid.COMPLETED))),
+    ).order_by()
+
+
+def _row(group):
+    return DailyBarberStats(
+        barber_id=group['barber_id'],
+        service_id=group['service_id'],
+        date=group['day'],
+        status=group['status'],
+        appointments=group['appointment_count'],
+        payments=group['payment_count'],
+        payments_pending=group['pending'],
+        payments_completed=group['completed'],
+        payments_refunded=group['refunded'],
+        payment_amount=group['amount'],
+        revenue=group['completed_amount'],
+    )
+
+
+def _insert(groups):
+    rows = []
+    count = 0
+    for group in groups:
+        rows.append(_row(group))
+        if len(rows) == BATCH_SIZE:
+            count += len(DailyBarberStats.objects.bulk_create(rows))
+            rows = []
+    return count + len(DailyBarberStats.objects.bulk_create(rows))
+
+
+def _spans(dates):
+    """Runs of consecutive dates as (first, last) pairs"""
+    spans = []
+    for day in sorted(dates):
+        if spans and day == spans[-1][1] + timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return spans
+
+
+def _touched(since):
+    days = defaultdict(set)
+    appointments = Appointment.objects.filter(updated_at__gte=since).annotate(
+        day=TruncDate('appointment_datetime')
+    ).values_list('barber_id', 'day').distinct()
+    payments = Payment.objects.filter(updated_at__gte=since).annotate(
+        day=TruncDate('appointment__appointment_datetime')
+    ).values_list('appointment__barber_id', 'day').distinct()
+    for barber_id, day in [*appointments, *payments]:
+        days[barber_id].add(day)
+    return days
+
+
+def _recompute(days):
+    """Replace the rollup rows of {barber id: dates}"""
+    clauses = [
+        (barber_id, first, last)
+        for barber_id, dates in days.items()
+        for first, last in _spans(dates)
+    ]
+    for offset in range(0, len(clauses), CLAUSES_PER_QUERY):
+        chunk = clauses[offset:offset + CLAUSES_PER_QUERY]
+        stats = Q()
+        appointments = Q()
+        for barber_id, first, last in chunk:
+            stats |= Q(barber_id=barber_id, date__range=(first, last))
+            appointments |= Q(
+                barber_id=barber_id,
+                appointment_datetime__gte=day_bounds(first)[0],
+                appointment_datetime__lt=day_bounds(last)[1],
+            )
+        DailyBarberStats.objects.filter(stats).delete()
+        _insert(_aggregate(Appointment.objects.filter(appointments)).iterator())
+
+
+def _refresh(watermark, full):
+    started = timezone.now()
+    dirty = list(StatsDirtyDay.objects.values_list('id', 'barber_id', 'date'))
+
+    if full or watermark is None:
+        DailyBarberStats.objects.all().delete()
+        _insert(_aggregate(Appointment.objects.all()).iterator())
+        refreshed = None
+    else:
+        days = _touched(watermark.value - OVERLAP)
+        for _, barber_id, day in dirty:
+            days[barber_id].add(day)
+        _recompute(days)
+        refreshed = sum(len(dates) for dates in days.values())
+
+    StatsDirtyDay.objects.filter(id__in=[row[0] for row in dirty]).delete()
+    RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': started})
+    return refreshed
+
+
+def refresh(full=False):
+    """
+    Bring DailyBarberStats up to date; the first run (or ``full``) rebuilds
+    it from scratch. Returns the number of (barber, day) pairs refreshed, or
+    None for a full rebuild.
+    """
+    with transaction.atomic():
+        # Locking the watermark keeps concurrent refreshes from interleaving
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+        return _refresh(watermark, full)
+
+
+def catch_up():
+    """
+    Refresh the days changed since the last refresh, for a read. Does
+    nothing when the rollup is fresh, was never built (refresh_stats builds
+    it) or another refresh holds the watermark: the read then serves the
+    rows as they are. Returns the number of (barber, day) pairs refreshed.
+    """
+    if not is_stale():
+        return 0
+    try:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update(nowait=True).filter(name=WATERMARK).first()
+            if watermark is None:
+                return 0
+            return _refresh(watermark, full=False)
+    except OperationalError:
+        # The lock is taken: that refresh brings the rows up to date
+        return 0
+
+
+def is_stale():
+    """
+    Whether appointments or payments changed, or days were marked dirty,
+    since the last refresh (one query)
+    """
+    since = OuterRef('value')
+    stale = RollupWatermark.objects.filter(name=WATERMARK).annotate(
+        appointments=Exists(Appointment.objects.filter(updated_at__gte=since)),
+        payments=Exists(Payment.objects.filter(updated_at__gte=since)),
+        dirty=Exists(StatsDirtyDay.objects.all()),
+    ).values_list('appointments', 'payments', 'dirty').first()
+    return stale is None or any(stale)
+
+
+def _between(rows, field, start_date=None, end_date=None):
+    if start_date:
+        rows = rows.filter(**{f'{field}__gte': start_date})
+    if end_date:
+        rows = rows.filter(**{f'{field}__lte': end_date})
+    return rows
+
+
+def stats_rows(barber_id=None, start_date=None, end_date=None):
+    """
+    Rollup rows of one barber (or every barber), within dates, after
+    catching up on the days changed since the last refresh
+    """
+    catch_up()
+    rows = DailyBarberStats.objects.all()
+    if barber_id is not None:
+        rows = rows.filter(barber_id=barber_id)
+    return _between(rows, 'date', start_date, end_date)
+
+
+def summarize(rows, aggregates, interval=None, date_field='date'):
+    """
+    Totals of ``aggregates`` over ``rows``, plus a time series per
+    ``interval`` ('day', 'week' or 'month') when one is given
+    """
+    totals = rows.aggregate(**aggregates)
+    if not interval:
+        return totals
+    series = rows.annotate(
+        period=Trunc(date_field, interval, output_field=DateField())
+    ).values('period').annotate(**aggregates).order_by('period')
+    return {**totals, "series": list(series)}
+
+
+def _count(field, **filters):
+    return Coalesce(Sum(field, filter=Q(**filters) if filters else None), 0)
+
+
+APPOINTMENT_AGGREGATES = {
+    'total': _count('appointments'),
+    'booked': _count('appointments', status=Appointment.Status.BOOKED),
+    'completed': _count('appointments', status=Appointment.Status.COMPLETED),
+    'canceled': _count('appointments', status=Appointment.Status.CANCELED),
+}
+
+PAYMENT_AGGREGATES = {
+    'total_amount': Sum('payment_amount'),
+    'total_payments': _count('payments'),
+    'pending': _count('payments_pending'),
+    'completed': _count('payments_completed'),
+    'refunded': _count('payments_refunded'),
+}
+
+
+def top_services(rows):
+    """Appointments per service, most booked first"""
+    return list(
+        rows.values('service__name').annotate(
+            total=Sum('appointments')
+        ).order_by('-total')
+    )
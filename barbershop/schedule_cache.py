@@ -0,0 +1,92 @@
+"""
+Per-process cache of barbers' weekly schedules.
+
+Every availability check reads a barber's schedule, which changes maybe
+once a month. Each worker keeps the active windows of a barber's week in
+memory as sorted (start_time, end_time) lists per ISO weekday, tagged with
+the barber's version from the shared Django cache. Schedule changes bump
+that version (signals.py, schedules.bulk_create), so every worker started
+by start.sh reloads the week on its next lookup; an unchanged barber costs
+one cache read and no query. The versions are only seen by other workers
+through a shared cache (Redis, see CACHES); as a safety net each week is
+also reloaded once it is SCHEDULE_CACHE_TTL seconds old.
+"""
+import time as clock
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump, versions
+from .models import BarberSchedule
+
+
+_weeks = {}
+
+
+def _namespace(barber_id):
+    return f'schedules:{barber_id}'
+
+
+def invalidate(barber_ids):
+    """Drop the cached weeks of ``barber_ids`` in every process, once committed"""
+    namespaces = [_namespace(barber_id) for barber_id in set(barber_ids)]
+    transaction.on_commit(lambda: bump(*namespaces))
+
+
+def _ttl():
+    return getattr(settings, 'SCHEDULE_CACHE_TTL', 60)
+
+
+def clear():
+    """Forget every week cached by this process"""
+    _weeks.clear()
+
+
+def weeks(barber_ids):
+    """{barber id: {day_of_week: sorted [(start_time, end_time)]}}"""
+    barber_ids = set(barber_ids)
+    # Read the versions before the rows: a change committed in between only
+    # makes the next lookup reload
+    current = versions(_namespace(barber_id) for barber_id in barber_ids)
+    now, ttl = clock.monotonic(), _ttl()
+    found = {}
+    stale = set()
+    for barber_id in barber_ids:
+        cached = _weeks.get(barber_id)
+        if cached is not None and cached[0] == current[_namespace(barber_id)] and now - cached[2] < ttl:
+            found[barber_id] = cached[1]
+        else:
+            stale.add(barber_id)
+
+    if stale:
+        loaded = defaultdict(lambda: defaultdict(list))
+        for barber_id, day, start_time, end_time in BarberSchedule.objects.filter(
+            barber_id__in=stale, active=True
+        ).values_list('barber_id', 'day_of_week', 'start_time', 'end_time'):
+            loaded[barber_id][day].append((start_time, end_time))
+        for barber_id in stale:
+            week = {day: sorted(windows) for day, windows in loaded[barber_id].items()}
+            _weeks[barber_id] = (current[_namespace(barber_id)], week, now)
+            found[barber_id] = week
+    return found
+
+
+def week(barber_id):
+    return weeks([barber_id])[barber_id]
+
+
+def window_at(barber_id, moment):
+    """
+    The (start_time, end_time) window of the barber's schedule containing
+    the weekday and wall-clock time of ``moment``, or None
+    """
+    windows = week(barber_id).get(moment.isoweekday(), [])
+    at = moment.time()
+    # Windows are sorted by start; check the ones starting at or before ``at``
+    for start_time, end_time in reversed(windows[:bisect_right(windows, (at, time.max))]):
+        if end_time >= at:
+            return start_time, end_time
+    return None
@@ -0,0 +1,127 @@
+"""
+Bulk schedule creation.
+
+A batch is validated without per-row queries. Barber roles are resolved in
+one query. Overlaps, within the batch and against existing active windows,
+are found per (barber, day) by sorting the windows by start time and
+sweeping. The accepted rows are inserted with one ``bulk_create`` in a
+single transaction.
+
+``atomic`` mode creates nothing if any row is rejected; ``best_effort``
+creates the valid rows and reports the others.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework import serializers
+
+from . import schedule_cache
+from .booking import lock_barbers
+from .models import BarberSchedule, UserProfile
+
+
+ATOMIC = 'atomic'
+BEST_EFFORT = 'best_effort'
+MODES = (ATOMIC, BEST_EFFORT)
+
+
+class ScheduleRowSerializer(serializers.Serializer):
+    """One schedule window; the barber is checked for the whole batch at once"""
+    barber = serializers.IntegerField()
+    day_of_week = serializers.IntegerField(min_value=1, max_value=7)
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    active = serializers.BooleanField(default=True)
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError("End time must be after start time")
+        return attrs
+
+
+def _barbers(barber_ids):
+    """Users with the barber role among ``barber_ids``, by id"""
+    return User.objects.filter(
+        pk__in=barber_ids, profile__role=UserProfile.Roles.BARBER
+    ).in_bulk()
+
+
+def _sweep(windows):
+    """
+    Indexes of the new windows that overlap an earlier accepted window.
+
+    ``windows`` are (start, end, index) for one barber and day; existing
+    rows have index None and are always kept.
+    """
+    rejected = {}
+    end = None
+    # Existing windows sort first on equal starts, so they win ties
+    for start, stop, index in sorted(windows, key=lambda w: (w[0], w[2] is not None, w[2] or 0)):
+        if end is not None and start < end:
+            if index is not None:
+                rejected[index] = "Overlaps another schedule window for this barber and day"
+                continue
+        end = stop if end is None else max(end, stop)
+    return rejected
+
+
+def bulk_create(rows, mode=ATOMIC):
+    """
+    Validate and insert schedule ``rows``.
+
+    Returns (created BarberSchedule objects, errors as [{"index", "errors"}]).
+    """
+    errors = {}
+    valid = {}
+    for index, row in enumerate(rows):
+        serializer = ScheduleRowSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+
+    barbers = _barbers({data['barber'] for data in valid.values()})
+    for index, data in list(valid.items()):
+        if data['barber'] not in barbers:
+            errors[index] = {"barber": ["User must have barber role"]}
+            del valid[index]
+
+    with transaction.atomic():
+        lock_barbers(sorted(barbers))
+
+        windows = defaultdict(list)
+        existing = BarberSchedule.objects.filter(
+            barber_id__in=barbers, active=True
+        ).values_list('barber_id', 'day_of_week', 'start_time', 'end_time')
+        for barber_id, day, start, end in existing:
+            windows[barber_id, day].append((start, end, None))
+        for index, data in valid.items():
+            # Inactive windows don't take up time
+            if data['active']:
+                windows[data['barber'], data['day_of_week']].append(
+                    (data['start_time'], data['end_time'], index)
+                )
+        for group in windows.values():
+            for index, message in _sweep(group).items():
+                errors[index] = {"non_field_errors": [message]}
+                del valid[index]
+
+        errors = [{"index": index, "errors": errors[index]} for index in sorted(errors)]
+        if errors and mode == ATOMIC:
+            return [], errors
+
+        schedules = [
+            BarberSchedule(
+                barber=barbers[data['barber']],
+                day_of_week=data['day_of_week'],
+                start_time=data['start_time'],
+                end_time=data['end_time'],
+                active=data['active'],
+            )
+            for index, data in sorted(valid.items())
+        ]
+        created = BarberSchedule.objects.bulk_create(schedules)
+        # bulk_create sends no post_save
+        schedule_cache.invalidate(schedule.barber_id for schedule in created)
+        return created, errors
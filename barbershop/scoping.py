@@ -0,0 +1,83 @@
+"""
+Role scoping shared by the list endpoints and the exports.
+
+Admins see everything, barbers see what they work on and clients see their
+own records. ``user=None`` means an unscoped (management command) caller.
+"""
+from django.db.models import Q
+
+from .models import UserProfile
+
+
+def role_of(user):
+    if user is None:
+        return UserProfile.Roles.ADMIN
+    return user.profile.role if hasattr(user, 'profile') else None
+
+
+def filter_appointments(queryset, user, params):
+    """
+    Scope appointments to ``user`` and apply the status, barber_id,
+    start_date and end_date query parameters
+    """
+    role = role_of(user)
+
+    # Admin sees all
+    if role == UserProfile.Roles.ADMIN:
+        pass
+    # Barbers see their appointments
+    elif role == UserProfile.Roles.BARBER:
+        queryset = queryset.filter(barber=user)
+    # Clients see their own appointments
+    else:
+        queryset = queryset.filter(client=user)
+
+    # Filter by status
+    status_param = params.get('status')
+    if status_param:
+        queryset = queryset.filter(status=status_param)
+
+    # Filter by barber
+    barber_id = params.get('barber_id')
+    if barber_id:
+        queryset = queryset.filter(barber_id=barber_id)
+
+    # Filter by date range
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+
+    if start_date:
+        queryset = queryset.filter(appointment_datetime__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(appointment_datetime__lte=end_date)
+
+    return queryset.filter(active=True)
+
+
+def filter_payments(queryset, user, params):
+    """Payments of the user's appointments, optionally within created_at dates"""
+    if role_of(user) != UserProfile.Roles.ADMIN:
+        queryset = queryset.filter(Q(appointment__client=user) | Q(appointment__barber=user))
+    return _created_between(queryset, params)
+
+
+def filter_ratings(queryset, user, params):
+    """Ratings of a barber's appointments, or written by a client"""
+    role = role_of(user)
+    if role == UserProfile.Roles.BARBER:
+        queryset = queryset.filter(appointment__barber=user)
+    elif role != UserProfile.Roles.ADMIN:
+        queryset = queryset.filter(user=user)
+
+    barber_id = params.get('barber_id')
+    if barber_id:
+        queryset = queryset.filter(appointment__barber_id=barber_id)
+    return _created_between(queryset, params)
+
+
+def _created_between(queryset, params):
+    if params.get('start_date'):
+        queryset = queryset.filter(created_at__gte=params['start_date'])
+    if params.get('end_date'):
+        queryset = queryset.filter(created_at__lte=params['end_date'])
+    return queryset
@@ -0,0 +1,216 @@
+"""
+Synthetic shop data at scale (``seed_barbershop``).
+
+``load`` creates barbers, clients and an admin with profiles, the service
+catalog and weekly schedules, then each barber's appointment history over
+``days`` past and ``future_days`` coming days, with ratings, payments and
+calendar events. Worker processes hash the passwords and generate the rows
+(synthetic.py); this process inserts them in chunks, one transaction per
+barber, with the INSERTs bulk_create would run but none of its per-value
+preparation, which would otherwise dominate. Appointment ids are assigned up front so
+the workers can link ratings, payments and events without a round trip.
+
+bulk_create sends no signals, so the derived tables (rating summaries,
+daily stats, leaderboards) are rebuilt at the end and the cached schedules
+and barber list invalidated. The same seed on the same empty database
+gives the same rows.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import leaderboards, rollups, schedule_cache, synthetic
+from .cache import BARBERS, SERVICES, bump
+from .models import (
+    Appointment, BarberRatingSummary, BarberSchedule, CalendarEvent, Payment, Rating, Service, UserProfile,
+)
+
+
+def _names(prefix, count):
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+class _Inline:
+    """Stands in for the pool with workers=1"""
+
+    def __init__(self, context):
+        synthetic.use_context(context)
+
+    def map(self, func, items):
+        return map(func, items)
+
+
+def _pool(workers, context):
+    if workers <= 1:
+        return nullcontext(_Inline(context))
+    # Spawned, not forked: children must not share this process's connections
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=synthetic.init_worker, initargs=(context,),
+    )
+
+
+def _create_users(rng, usernames, role, hashes, batch_size):
+    people = [synthetic.person(rng) for _ in usernames]
+    users = User.objects.bulk_create(
+        (
+            User(
+                username=username, password=hashes[i % len(hashes)], first_name=first, last_name=last,
+                email=f"{username}@example.com", is_staff=role == UserProfile.Roles.ADMIN,
+            )
+            for i, (username, (first, last, _)) in enumerate(zip(usernames, people))
+        ),
+        batch_size=batch_size,
+    )
+    UserProfile.objects.bulk_create(
+        (UserProfile(user=user, role=role, phone_number=phone) for user, (_, _, phone) in zip(users, people)),
+        batch_size=batch_size,
+    )
+    return [user.id for user in users]
+
+
+# Columns of the rows from synthetic.prepared_rows, then the ones every row shares
+COLUMNS = {
+    "appointments": (
+        Appointment,
+        ("id", "client", "barber", "service", "appointment_datetime", "duration_minutes", "status"),
+        ("notes", "active", "created_at", "updated_at"),
+    ),
+    "ratings": (Rating, ("appointment", "user", "score", "comment"), ("created_at", "updated_at")),
+    "payments": (
+        Payment, ("appointment", "amount", "status", "paid_at", "provider"), ("currency", "created_at", "updated_at"),
+    ),
+    "calendar_events": (CalendarEvent, ("appointment", "external_event_id", "synced_at"), ("provider",)),
+}
+
+
+def _shared_values(now):
+    moment = connection.ops.adapt_datetimefield_value(now)
+    return {
+        "notes": "", "active": True, "currency": "MXN", "provider": "google_calendar",
+        "created_at": moment, "updated_at": moment,
+    }
+
+
+def _insert(rows, shared, batch_size):
+    """
+    One barber's prepared rows, in chunks of ``batch_size``: bulk_create's
+    INSERT without its per-value preparation
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for kind, (model, fields, shared_fields) in COLUMNS.items():
+            columns = [model._meta.get_field(name).column for name in fields + shared_fields]
+            sql = "INSERT INTO {} ({}) VALUES ({})".format(
+                quote(model._meta.db_table), ", ".join(quote(column) for column in columns),
+                ", ".join(["%s"] * len(columns)),
+            )
+            tail = tuple(shared[name] for name in shared_fields)
+            kind_rows = rows[kind]
+            for start in range(0, len(kind_rows), batch_size):
+                cursor.executemany(sql, [row + tail for row in kind_rows[start:start + batch_size]])
+
+
+def load(barbers=200, clients=None, appointments=100000, days=730, future_days=30, seed=0,
+         workers=None, batch_size=5000, password="1234", password_hashes=32, log=None):
+    """
+    Seed the database; ``clients`` defaults to ten per barber and
+    ``workers`` to the CPU count. Users share ``password_hashes`` distinct
+    salted hashes of ``password``, since hashing is deliberately slow.
+    Returns {model name: rows created}. Raises ValueError when the seed
+    users already exist or the appointments don't fit the schedules.
+    """
+    clients = barbers * 10 if clients is None else clients
+    workers = workers or os.cpu_count() or 1
+    log = log or (lambda message: None)
+    if barbers < 1 or clients < 1:
+        raise ValueError("At least one barber and one client are needed")
+
+    barber_names, client_names = _names("barber", barbers), _names("client", clients)
+    if User.objects.filter(username__in=[barber_names[0], client_names[0], "admin"]).exists():
+        raise ValueError("The database already holds seeded users; seed an empty database")
+
+    rng = synthetic.rng_for(seed, "shop")
+    shifts = [rng.choice(synthetic.SHIFTS) for _ in range(barbers)]
+    today = timezone.localdate()
+    first_day, last_day = today - timedelta(days=days), today + timedelta(days=future_days)
+    per_barber, extra = divmod(appointments, barbers)
+    for shift in set(shifts):
+        working = len(synthetic.working_days(shift, first_day, last_day))
+        if per_barber + bool(extra) > working * synthetic.max_per_day(shift):
+            raise ValueError(f"{appointments} appointments don't fit {barbers} barbers' schedules over {days} days")
+
+    context = {
+        "seed": seed, "now": timezone.now(), "tz": timezone.get_current_timezone(),
+        "first_day": first_day, "last_day": last_day,
+    }
+    with _pool(workers, context) as pool:
+        hashes = list(pool.map(synthetic.hash_password, [password] * max(1, min(password_hashes, barbers + clients))))
+
+    barber_ids = _create_users(rng, barber_names, UserProfile.Roles.BARBER, hashes, batch_size)
+    client_ids = _create_users(rng, client_names, UserProfile.Roles.CLIENT, hashes, batch_size)
+    _create_users(rng, ["admin"], UserProfile.Roles.ADMIN, hashes, batch_size)
+    services = Service.objects.bulk_create(
+        Service(name=name, duration_minutes=minutes, price=Decimal(price))
+        for name, minutes, price, _ in synthetic.SERVICES
+    )
+    BarberSchedule.objects.bulk_create(
+        (
+            BarberSchedule(barber_id=barber_id, day_of_week=day, start_time=time(start), end_time=time(end))
+            for barber_id, (weekdays, start, end) in zip(barber_ids, shifts)
+            for day in weekdays
+        ),
+        batch_size=batch_size,
+    )
+    log(f"Created {barbers} barbers, {clients} clients and {len(services)} services")
+    # The row workers start with the ids of what was just created
+    context.update(
+        client_ids=client_ids,
+        services=[(service.id, service.duration_minutes, service.price, weight)
+                  for service, (*_, weight) in zip(services, synthetic.SERVICES)],
+    )
+
+    next_id = (Appointment.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    tasks = []
+    for position, (barber_id, shift) in enumerate(zip(barber_ids, shifts)):
+        count = per_barber + (position < extra)
+        tasks.append((position, barber_id, next_id, count, shift))
+        next_id += count
+
+    shared = _shared_values(context["now"])
+    created = {"appointments": 0, "ratings": 0, "payments": 0, "calendar_events": 0}
+    with _pool(workers, context) as pool:
+        # A few barbers per round keeps the generated rows bounded in memory
+        step = workers * 2
+        for start in range(0, len(tasks), step):
+            for rows in pool.map(synthetic.prepared_rows, tasks[start:start + step]):
+                _insert(rows, shared, batch_size)
+                for kind, kind_rows in rows.items():
+                    created[kind] += len(kind_rows)
+            log(f"Loaded {created['appointments']} of {appointments} appointments")
+
+    # Appointment ids were given explicitly; move the sequence past them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Appointment]):
+            cursor.execute(sql)
+
+    BarberRatingSummary.rebuild()
+    rollups.refresh(full=True)
+    leaderboards.rebuild()
+    schedule_cache.invalidate(barber_ids)
+    transaction.on_commit(lambda: bump(BARBERS, SERVICES))
+    log("Rebuilt rating summaries, daily stats and leaderboards")
+
+    return {
+        "users": barbers + clients + 1, "services": len(services),
+        "schedules": sum(len(shift[0]) for shift in shifts), **created,
+    }
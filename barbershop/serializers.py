@@ -1,8 +1,10 @@
+from datetime import timedelta
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     UserProfile, Service, BarberSchedule, 
-    Appointment, Rating, Payment, CalendarEvent
+    Appointment, Rating, Payment, CalendarEvent,
+    MAX_APPOINTMENT_MINUTES
 )
 
 
@@ -29,6 +31,26 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class BarberProfileSerializer(UserProfileSerializer):
+    """Barber profile with rating stats (select_related user__rating_summary)"""
+    average_rating = serializers.SerializerMethodField()
+    total_ratings = serializers.SerializerMethodField()
+
+    class Meta(UserProfileSerializer.Meta):
+        fields = UserProfileSerializer.Meta.fields + ['average_rating', 'total_ratings']
+
+    def _summary(self, obj):
+        return getattr(obj.user, 'rating_summary', None)
+
+    def get_average_rating(self, obj):
+        summary = self._summary(obj)
+        return summary.average if summary else 0
+
+    def get_total_ratings(self, obj):
+        summary = self._summary(obj)
+        return summary.count if summary else 0
+
+
 class ServiceSerializer(serializers.ModelSerializer):
     """Service serializer with validation"""
     
@@ -132,6 +154,14 @@ class AppointmentDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at']
     
+    def validate_duration_minutes(self, value):
+        # Conflict checks rely on this upper bound (see AppointmentQuerySet.overlapping)
+        if value < 1 or value > MAX_APPOINTMENT_MINUTES:
+            raise serializers.ValidationError(
+                f"Duration must be between 1 and {MAX_APPOINTMENT_MINUTES} minutes"
+            )
+        return value
+    
     def validate(self, attrs):
         """Validate appointment business logic"""
         # Check if barber has barber role
@@ -212,11 +242,73 @@ class BarberAvailabilitySerializer(serializers.Serializer):
     """Serializer for checking barber availability"""
     barber_id = serializers.IntegerField()
     date = serializers.DateField()
+    service_id = serializers.PrimaryKeyRelatedField(
+        queryset=Service.objects.filter(active=True),
+        source='service',
+        write_only=True,
+        required=False
+    )
+    duration_minutes = serializers.IntegerField(min_value=5, max_value=MAX_APPOINTMENT_MINUTES, required=False)
+    step_minutes = serializers.IntegerField(min_value=5, max_value=240, default=15)
     available_slots = serializers.ListField(
         child=serializers.TimeField(),
         read_only=True
     )
 
+    def validate_barber_id(self, value):
+        """Ensure the user is a barber"""
+        if not UserProfile.objects.filter(user_id=value, role=UserProfile.Roles.BARBER).exists():
+            raise serializers.ValidationError("Selected user is not a barber")
+        return value
+
+    def validate(self, attrs):
+        service = attrs.get('service')
+        if service is not None:
+            attrs['duration_minutes'] = service.duration_minutes
+        elif 'duration_minutes' not in attrs:
+            raise serializers.ValidationError(
+                "Either service_id or duration_minutes is required"
+            )
+        return attrs
+
+
+class AvailableSlotSerializer(serializers.Serializer):
+    """A free slot found by the availability search"""
+    barber_id = serializers.IntegerField()
+    barber_name = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    """Serializer for searching free slots across barbers and days"""
+    MAX_RANGE_DAYS = 31
+
+    service_id = serializers.PrimaryKeyRelatedField(
+        queryset=Service.objects.filter(active=True),
+        source='service'
+    )
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(required=False)
+    barber_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False
+    )
+    step_minutes = serializers.IntegerField(min_value=5, max_value=240, default=15)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=20)
+    per_barber = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('end_date', attrs['start_date'] + timedelta(days=6))
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError("end_date must not be before start_date")
+        if (attrs['end_date'] - attrs['start_date']).days >= self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError(
+                f"Date range cannot exceed {self.MAX_RANGE_DAYS} days"
+            )
+        return attrs
+
 
 class AppointmentCancelSerializer(serializers.Serializer):
     """Serializer for canceling appointments"""
@@ -232,4 +324,38 @@ class AppointmentCancelSerializer(serializers.Serializer):
             raise serializers.ValidationError("Appointment is already canceled")
         if status == Appointment.Status.COMPLETED:
             raise serializers.ValidationError("Cannot cancel completed appointment")
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+BULK_LIMIT = 1000
+
+
+class BulkAppointmentIdsSerializer(serializers.Serializer):
+    """Appointment ids for a bulk complete or cancel"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=BULK_LIMIT
+    )
+    reason = serializers.CharField(required=False, allow_blank=True, default='No reason provided')
+
+
+class BulkRescheduleItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    appointment_datetime = serializers.DateTimeField()
+
+
+class BulkRescheduleSerializer(serializers.Serializer):
+    """New start times for a bulk reschedule"""
+    appointments = BulkRescheduleItemSerializer(many=True, allow_empty=False, max_length=BULK_LIMIT)
+
+
+class StatsQuerySerializer(serializers.Serializer):
+    """Date range and optional time series for the stats endpoints"""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    series = serializers.ChoiceField(choices=['day', 'week', 'month'], required=False)
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """Window (all time when left out) and size of a leaderboard"""
+    days = serializers.ChoiceField(choices=[7, 30, 365], required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, required=False)
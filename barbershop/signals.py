@@ -1,35 +1,188 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Appointment
+from django.contrib.auth.models import User
+from .models import Appointment, BarberSchedule, Payment, Rating, BarberRatingSummary, Service, UserProfile
+from .authentication import revoke_tokens
+from .notifications import queue_new_appointment
+from . import calendar_sync, leaderboards, rollups, schedule_cache
+from .cache import bump, BARBERS, SERVICES
 
 @receiver(post_save, sender=Appointment)
 def notify_barber_new_appointment(sender, instance, created, **kwargs):
     """
-    Send an email notification to the barber whenever a new appointment is created.
+    Queue an email notification to the barber whenever a new appointment is created.
+    The outbox row is saved in the booking's transaction and sent by
+    `manage.py send_notifications`, so SMTP never slows down the request.
     """
     if created:
-        barber_email = instance.barber.email
-        client_name = instance.client.username
-        service_name = instance.service.name
-        time = instance.appointment_datetime.strftime("%d/%m/%Y %H:%M")
-
-        subject = "New Appointment Scheduled"
-        message = (
-            f"Hello {instance.barber.username},\n\n"
-            f"You have a new appointment:\n\n"
-            f"- Client: {client_name}\n"
-            f"- Service: {service_name}\n"
-            f"- Time: {time}\n\n"
-            f"Please check your dashboard or Google Calendar for details.\n\n"
-            f"Best,\nBarbershop System"
-        )
-
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [barber_email],
-            fail_silently=False,
-        )
+        queue_new_appointment(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def queue_calendar_sync(sender, instance, created, **kwargs):
+    """
+    Keep Google Calendar in step with bookings, reschedules and cancellations
+    through the sync queue (`manage.py sync_calendar`).
+    """
+    calendar_sync.appointment_saved(instance, created)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_before_save(sender, instance, update_fields=None, **kwargs):
+    """
+    A reschedule or barber change takes the appointment out of its old
+    rollup day, which the updated_at watermark can't see; queue that day.
+    Keep the stored service so a service change can move the booking
+    between leaderboard entries.
+    """
+    instance._leaderboard_service_id = None
+    if instance.pk is None or (
+        update_fields is not None
+        and not {'barber', 'barber_id', 'appointment_datetime', 'service', 'service_id'} & set(update_fields)
+    ):
+        return
+    previous = Appointment.objects.filter(pk=instance.pk).values_list(
+        'barber_id', 'appointment_datetime', 'service_id'
+    ).first()
+    if previous is None:
+        return
+    if previous[:2] != (instance.barber_id, instance.appointment_datetime):
+        rollups.mark_dirty([previous[:2]])
+    instance._leaderboard_service_id = previous[2]
+
+
+@receiver(post_save, sender=Appointment)
+def update_service_leaderboard(sender, instance, created, **kwargs):
+    if created:
+        leaderboards.booked(instance.service_id, instance.created_at, 1)
+        return
+    previous = getattr(instance, '_leaderboard_service_id', None)
+    if previous is not None and previous != instance.service_id:
+        with transaction.atomic():
+            leaderboards.booked(previous, instance.created_at, -1)
+            leaderboards.booked(instance.service_id, instance.created_at, 1)
+
+
+@receiver(pre_delete, sender=Appointment)
+def remove_deleted_appointment(sender, instance, **kwargs):
+    rollups.mark_dirty([(instance.barber_id, instance.appointment_datetime)])
+    leaderboards.booked(instance.service_id, instance.created_at, -1)
+
+
+@receiver(pre_delete, sender=Payment)
+def mark_stats_day_of_deleted_payment(sender, instance, **kwargs):
+    rollups.mark_dirty(
+        Appointment.objects.filter(pk=instance.appointment_id).values_list('barber_id', 'appointment_datetime')
+    )
+
+
+@receiver(pre_save, sender=Rating)
+def remember_rating_before_save(sender, instance, **kwargs):
+    """
+    Keep the stored (barber, score) of a rating so the summary can be
+    corrected after it is updated.
+    """
+    instance._summary_previous = Rating.objects.filter(pk=instance.pk).values_list(
+        'appointment__barber_id', 'score'
+    ).first() if instance.pk else None
+
+
+@receiver(pre_delete, sender=Rating)
+def remember_rating_before_delete(sender, instance, **kwargs):
+    # The appointment may be deleted in the same cascade, so read it now
+    instance._summary_previous = (instance.appointment.barber_id, instance.score)
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_summary(sender, instance, created, **kwargs):
+    """
+    Move the rating between per-barber summaries with F() increments
+    """
+    previous = getattr(instance, '_summary_previous', None)
+    current = (instance.appointment.barber_id, instance.score)
+    if previous == current:
+        return
+
+    with transaction.atomic():
+        if previous:
+            BarberRatingSummary.adjust(*previous, -1)
+            leaderboards.rated(*previous, instance.created_at, -1)
+        BarberRatingSummary.adjust(*current, 1)
+        leaderboards.rated(*current, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_from_rating_summary(sender, instance, **kwargs):
+    previous = getattr(instance, '_summary_previous', None)
+    if previous:
+        BarberRatingSummary.adjust(*previous, -1)
+        leaderboards.rated(*previous, instance.created_at, -1)
+
+
+@receiver(pre_save, sender=BarberSchedule)
+def remember_schedule_barber(sender, instance, **kwargs):
+    # A window moved to another barber changes the old barber's week too
+    instance._previous_barber_id = BarberSchedule.objects.filter(pk=instance.pk).values_list(
+        'barber_id', flat=True
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=BarberSchedule)
+@receiver(post_delete, sender=BarberSchedule)
+def invalidate_cached_schedule(sender, instance, **kwargs):
+    """
+    Make every worker reload the barber's week from the database
+    """
+    previous = getattr(instance, '_previous_barber_id', None)
+    schedule_cache.invalidate({instance.barber_id, previous} - {None})
+
+
+# Fields whose change makes the claims in already issued tokens wrong
+TOKEN_FIELDS = {
+    User: ('is_active', 'password'),
+    UserProfile: ('role', 'active'),
+}
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=UserProfile)
+def revoke_tokens_on_account_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Revoke a user's tokens when their role, activity or password changes
+    """
+    fields = TOKEN_FIELDS[sender]
+    if instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    if previous is not None and previous != tuple(getattr(instance, field) for field in fields):
+        revoke_tokens(instance.pk if sender is User else instance.user_id)
+
+
+# Cached responses each model appears in
+CACHED_IN = {
+    Service: (SERVICES,),
+    UserProfile: (BARBERS,),
+    User: (BARBERS,),
+    Rating: (BARBERS,),
+}
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Rating)
+def invalidate_cached_responses(sender, instance, update_fields=None, **kwargs):
+    """
+    Bump the version of the cached responses showing the changed row, once
+    the change is committed so a concurrent request can't cache the old data
+    """
+    if sender is User and update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Logins don't change anything shown in the barber directory
+        return
+    namespaces = CACHED_IN[sender]
+    transaction.on_commit(lambda: bump(*namespaces))
@@ -0,0 +1,195 @@
+"""
+Deterministic synthetic rows for ``seed_barbershop``.
+
+These functions run in worker processes (see seeding.py) and only return
+plain tuples, so this module imports no models: a spawned worker unpickles
+its tasks before Django's apps are loaded. ``prepared_rows`` also puts the
+values in the database's format. Every barber draws from its own
+``random.Random`` seeded with the run's seed and the barber's position,
+so the output doesn't depend on the number of workers or their order.
+"""
+import random
+from datetime import datetime, timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+
+# name, minutes, price, relative popularity
+SERVICES = [
+    ("Corte", 30, 150, 30),
+    ("Corte degradado", 45, 200, 15),
+    ("Corte y barba", 60, 250, 20),
+    ("Barba", 30, 120, 15),
+    ("Afeitado clásico", 45, 180, 8),
+    ("Corte infantil", 30, 120, 10),
+    ("Diseño de cejas", 15, 60, 5),
+    ("Tinte", 90, 450, 4),
+    ("Mascarilla facial", 30, 150, 3),
+]
+
+# ISO weekdays and opening hours a barber works
+SHIFTS = [
+    ((1, 2, 3, 4, 5, 6), 9, 17),
+    ((1, 2, 3, 4, 5, 6), 10, 19),
+    ((2, 3, 4, 5, 6, 7), 11, 20),
+    ((1, 2, 4, 5, 6), 9, 19),
+]
+
+FIRST_NAMES = [
+    "Ana", "Luis", "María", "José", "Sofía", "Carlos", "Valeria", "Diego", "Fernanda", "Jorge",
+    "Camila", "Miguel", "Daniela", "Juan", "Regina", "Andrés", "Ximena", "Ricardo", "Paula", "Emilio",
+]
+LAST_NAMES = [
+    "García", "Hernández", "López", "Martínez", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Flores", "Torres", "Vázquez", "Cruz", "Morales", "Reyes", "Jiménez",
+]
+COMMENTS = [
+    "Excelente servicio", "Muy buen corte", "Puntual y amable", "Volveré pronto",
+    "Tardó un poco", "Buen ambiente", "No era lo que pedí",
+]
+
+UNIT = 15  # minutes; appointments start on quarter hours
+REGULARS = 50
+WALK_IN_RATE = 0.3
+RATING_RATE = 0.35
+SYNCED_BARBER_RATE = 0.3
+
+_context = None
+
+
+def init_worker(context):
+    """Pool initializer: settings for make_password, and the shared context"""
+    global _context
+    django.setup()
+    _context = context
+
+
+def use_context(context):
+    """Run the generators in this process"""
+    global _context
+    _context = context
+
+
+def hash_password(password):
+    return make_password(password)
+
+
+def rng_for(seed, *key):
+    return random.Random(":".join(str(part) for part in (seed, *key)))
+
+
+def person(rng):
+    """(first name, last name, phone number)"""
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), "55" + "".join(rng.choices("0123456789", k=8))
+
+
+def working_days(shift, first, last):
+    weekdays = shift[0]
+    return [
+        first + timedelta(days=offset) for offset in range((last - first).days + 1)
+        if (first + timedelta(days=offset)).isoweekday() in weekdays
+    ]
+
+
+def max_per_day(shift):
+    """The most appointments a barber's day fits (all of the shortest service)"""
+    shortest = min(minutes for _, minutes, _, _ in SERVICES)
+    return (shift[2] - shift[1]) * 60 // shortest
+
+
+def _day_layout(rng, services, weights, count, shift):
+    """(start minute, service) of ``count`` non-overlapping appointments in one day"""
+    units = (shift[2] - shift[1]) * 60 // UNIT
+    chosen = rng.choices(services, weights, k=count)
+    # Swap the longest for the shortest until the day fits them
+    shortest = min(services, key=lambda service: service[1])
+    while sum(service[1] for service in chosen) // UNIT > units:
+        chosen[max(range(count), key=lambda i: chosen[i][1])] = shortest
+    free = units - sum(service[1] for service in chosen) // UNIT
+    # Sorted cut points split the free time into gaps before each appointment
+    gaps = sorted(rng.randint(0, free) for _ in range(count))
+    layout, busy = [], 0
+    for gap, service in zip(gaps, chosen):
+        layout.append((shift[1] * 60 + (gap + busy) * UNIT, service))
+        busy += service[1] // UNIT
+    return layout
+
+
+def appointment_rows(task):
+    """
+    Rows for one barber's history: ``task`` is (position, barber id, first
+    appointment id, appointment count, shift). Returns a dict of tuples:
+    appointments (id, client id, barber id, service id, datetime, minutes, status),
+    ratings (appointment id, user id, score, comment),
+    payments (appointment id, amount, status, paid_at, provider) and
+    calendar_events (appointment id, external event id, synced_at).
+    """
+    position, barber_id, next_id, count, shift = task
+    context = _context
+    rng = rng_for(context["seed"], "barber", position)
+    services = context["services"]
+    weights = [service[3] for service in services]
+    clients = context["client_ids"]
+    regulars = rng.sample(clients, min(REGULARS, len(clients)))
+    quality = rng.uniform(3.2, 4.8)
+    synced = rng.random() < SYNCED_BARBER_RATE
+    now = context["now"]
+    tz = context["tz"]
+
+    days = working_days(shift, context["first_day"], context["last_day"])
+    per_day, extra = divmod(count, len(days))
+    busier = set(rng.sample(range(len(days)), extra))
+
+    rows = {"appointments": [], "ratings": [], "payments": [], "calendar_events": []}
+    for index, day in enumerate(days):
+        daily = per_day + (index in busier)
+        if not daily:
+            continue
+        for minute, (service_id, minutes, price, _) in _day_layout(rng, services, weights, daily, shift):
+            moment = datetime(day.year, day.month, day.day, minute // 60, minute % 60, tzinfo=tz)
+            client_id = rng.choice(clients) if rng.random() < WALK_IN_RATE else rng.choice(regulars)
+            if moment > now:
+                status = rng.choices(["booked", "canceled"], [92, 8])[0]
+            else:
+                status = rng.choices(["completed", "canceled", "booked"], [78, 14, 8])[0]
+            appointment_id = next_id
+            next_id += 1
+            rows["appointments"].append((appointment_id, client_id, barber_id, service_id, moment, minutes, status))
+
+            if status == "completed":
+                if rng.random() < RATING_RATE:
+                    score = min(5, max(1, round(rng.gauss(quality, 0.8))))
+                    comment = rng.choice(COMMENTS) if rng.random() < 0.3 else ""
+                    rows["ratings"].append((appointment_id, client_id, score, comment))
+                payment = rng.choices(["completed", "pending", "refunded"], [90, 6, 4])[0]
+                paid_at = moment + timedelta(minutes=minutes) if payment != "pending" else None
+                rows["payments"].append((appointment_id, price, payment, paid_at, rng.choice(["cash", "card"])))
+            elif status == "booked" and moment > now and rng.random() < 0.1:
+                rows["payments"].append((appointment_id, price, "pending", None, "card"))
+            elif status == "canceled" and rng.random() < 0.05:
+                rows["payments"].append((appointment_id, price, "refunded", moment, "card"))
+
+            if synced and status != "canceled":
+                booked_at = moment - timedelta(days=rng.randint(0, 14), minutes=rng.randint(0, 600))
+                rows["calendar_events"].append((appointment_id, f"{rng.getrandbits(80):020x}", booked_at))
+    return rows
+
+
+def prepared_rows(task):
+    """``appointment_rows`` with datetimes and amounts in the database's format"""
+    rows = appointment_rows(task)
+    ops = connection.ops
+    moment = ops.adapt_datetimefield_value
+    return {
+        "appointments": [row[:4] + (moment(row[4]),) + row[5:] for row in rows["appointments"]],
+        "ratings": rows["ratings"],
+        "payments": [
+            (appointment_id, ops.adapt_decimalfield_value(amount, 10, 2), status, moment(paid_at), provider)
+            for appointment_id, amount, status, paid_at, provider in rows["payments"]
+        ],
+        "calendar_events": [
+            (appointment_id, event_id, moment(synced_at)) for appointment_id, event_id, synced_at in rows["calendar_events"]
+        ],
+    }
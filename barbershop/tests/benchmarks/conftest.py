@@ -0,0 +1,24 @@
+import statistics
+import time
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.fixture
+def measure():
+    """
+    Time a callable and count its queries.
+
+    Returns (median seconds, queries of the last run) over ``repeat`` runs.
+    """
+    def _measure(func, repeat=20):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+        return statistics.median(timings), len(ctx.captured_queries)
+    return _measure
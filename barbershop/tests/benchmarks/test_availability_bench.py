@@ -0,0 +1,52 @@
+"""
+Slot enumeration should cost the same no matter how many bookings a barber
+has on other days. Run with: pytest -m benchmark -s
+"""
+import pytest
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+from barbershop.availability import available_slots
+from barbershop.models import Appointment, BarberSchedule, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+DAY = date(2030, 1, 7)
+
+
+def seed_bookings(barber, service, count):
+    """Four bookings on DAY plus ``count`` more spread over the surrounding year"""
+    start = timezone.make_aware(datetime.combine(DAY, time(9)))
+    on_day = [start + timedelta(hours=2 * i) for i in range(4)]
+    elsewhere = [
+        start + timedelta(days=(i % 364) - 182 or 183, minutes=30 * (i // 364))
+        for i in range(count)
+    ]
+    Appointment.objects.bulk_create([
+        Appointment(
+            client=barber,
+            barber=barber,
+            service=service,
+            appointment_datetime=when,
+            duration_minutes=30,
+        )
+        for when in on_day + elsewhere
+    ])
+
+
+@pytest.mark.django_db
+def test_available_slots_cost_is_flat(create_user, sample_service, measure):
+    results = []
+    for count in (0, 100, 500, 5000):
+        barber = create_user(f"barber_{count}", UserProfile.Roles.BARBER)
+        BarberSchedule.objects.create(
+            barber=barber, day_of_week=DAY.isoweekday(), start_time="09:00", end_time="19:00"
+        )
+        seed_bookings(barber, sample_service, count)
+
+        seconds, queries = measure(lambda: available_slots(barber.id, DAY, 30, 15))
+        results.append((count, seconds, queries))
+        print(f"\n{count:>6} bookings: {seconds * 1000:.3f} ms/call, {queries} queries")
+
+    # The bookings of the day; the schedule comes from the schedule cache
+    assert {queries for _, _, queries in results} == {1}
+    assert results[-1][1] < results[0][1] * 3
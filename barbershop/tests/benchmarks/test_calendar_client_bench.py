@@ -0,0 +1,33 @@
+"""
+Per-call overhead of getting a Calendar client and preparing a request.
+No network: the bundled discovery document is used. Run with: pytest -m benchmark -s
+"""
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from barbershop.google_calendar_utils import calendar_service
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.django_db
+def test_cached_calendar_client_overhead(measure):
+    body = {"summary": "Cita"}
+
+    def per_call_build():
+        service = build('calendar', 'v3', credentials=Credentials(token="token"))
+        service.events().insert(calendarId='primary', body=body)
+
+    def cached_client():
+        service = calendar_service(Credentials(token="token"))
+        service.events().insert(calendarId='primary', body=body)
+
+    cached_client()  # load the shared resources
+    before, _ = measure(per_call_build, repeat=50)
+    after, _ = measure(cached_client, repeat=500)
+
+    print(
+        f"\nbuild() per call:    {before * 1e6:9.1f} us"
+        f"\ncached client:       {after * 1e6:9.1f} us ({before / after:.0f}x faster)"
+    )
+    assert after * 10 < before
@@ -0,0 +1,38 @@
+"""
+Bytes and time a revalidated /schedules/ fetch saves over a full one.
+Run with: pytest -m benchmark -s
+"""
+import os
+import pytest
+from datetime import time
+from barbershop.models import BarberSchedule, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+BARBERS = int(os.getenv("BENCH_CONDITIONAL_BARBERS", 100))
+
+
+@pytest.mark.django_db
+def test_not_modified_skips_serialization(auth_client, create_user, measure):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    for i in range(BARBERS):
+        barber = create_user(f"barber{i}", UserProfile.Roles.BARBER)
+        BarberSchedule.objects.bulk_create(
+            BarberSchedule(barber=barber, day_of_week=day, start_time=time(9), end_time=time(18))
+            for day in range(1, 7)
+        )
+    url = "/api/schedules/"
+    first = client.get(url)
+    etag = first["ETag"]
+
+    full, full_queries = measure(lambda: client.get(url))
+    revalidated, revalidated_queries = measure(lambda: client.get(url, HTTP_IF_NONE_MATCH=etag))
+    repeat = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    print(
+        f"\n{BARBERS * 6} schedules, first page"
+        f"\nfull fetch:  {full * 1000:6.2f} ms, {len(first.content)} bytes, {full_queries} queries"
+        f"\n304:         {revalidated * 1000:6.2f} ms, {len(repeat.content)} bytes, {revalidated_queries} queries"
+    )
+    assert repeat.status_code == 304
+    assert revalidated < full
@@ -0,0 +1,60 @@
+"""
+Conflict detection against a large appointment table must stay an index
+range scan. Run with: pytest -m benchmark -s
+"""
+import os
+import random
+import pytest
+from datetime import datetime, timedelta
+from django.db import connection
+from django.utils import timezone
+from barbershop.availability import find_conflict
+from barbershop.models import Appointment, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+APPOINTMENTS = int(os.getenv("BENCH_APPOINTMENTS", 100_000))
+
+
+@pytest.mark.django_db
+def test_conflict_probe_uses_index_range_scan(create_user, sample_service, measure):
+    rng = random.Random(3)
+    barbers = [create_user(f"barber{i}", UserProfile.Roles.BARBER) for i in range(50)]
+    origin = timezone.make_aware(datetime(2028, 1, 3, 9))
+    statuses = ["booked"] + ["completed"] * 6 + ["canceled"]
+
+    Appointment.objects.bulk_create((
+        Appointment(
+            client=barbers[0],
+            barber=rng.choice(barbers),
+            service=sample_service,
+            appointment_datetime=origin + timedelta(minutes=30 * rng.randrange(200_000)),
+            duration_minutes=rng.choice([30, 45, 60, 120]),
+            status=rng.choice(statuses),
+        )
+        for _ in range(APPOINTMENTS)
+    ), batch_size=5000)
+
+    start = origin + timedelta(days=400, hours=2)
+    end = start + timedelta(minutes=45)
+    barber_id = barbers[7].id
+
+    probe = (
+        Appointment.objects.filter(barber_id=barber_id)
+        .booked()
+        .overlapping(start, end)
+        .order_by('appointment_datetime')
+        .values_list('appointment_datetime', flat=True)[:1]
+    )
+    plan = probe.explain()
+    print(f"\n{APPOINTMENTS} appointments, query plan:\n{plan}")
+
+    seconds, queries = measure(lambda: find_conflict(barber_id, start, end), repeat=200)
+    print(f"find_conflict: {seconds * 1e6:.1f} us/call, {queries} query")
+
+    assert queries == 1
+    if connection.vendor == 'sqlite':
+        assert "USING INDEX appt_barber_status_dt_idx" in plan
+        assert "appointment_datetime>? AND appointment_datetime<?" in plan
+    elif connection.vendor == 'postgresql':
+        assert "appt_barber_status_dt_idx" in plan
@@ -0,0 +1,142 @@
+"""
+Latency and query counts of the hot API endpoints over a realistically sized
+shop: BENCH_ENDPOINT_BARBERS barbers (200) with ten clients each and
+BENCH_ENDPOINT_APPOINTMENTS appointments (100000) over two years, with
+ratings, payments and calendar events, loaded by ``seed_barbershop``.
+
+Each endpoint must stay within its query budget. Median latencies are
+compared with the baselines recorded for the same scale in BENCH_BASELINES
+(baselines.json next to this file); an endpoint slower than its baseline by
+more than BENCH_REGRESSION (0.5, i.e. 50%) and BENCH_REGRESSION_SLACK_MS
+(1 ms) fails the run. Every run writes its measurements to BENCH_OUTPUT
+(barbershop-bench/endpoints.json in the temporary directory), never to the
+source tree; BENCH_UPDATE_BASELINES=1 rewrites the baselines instead, for a
+reviewed commit. Baselines depend on the machine.
+Run with: pytest -m benchmark -s
+"""
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from barbershop.authentication import issue_tokens
+from barbershop.models import BarberSchedule, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+BARBERS = int(os.getenv("BENCH_ENDPOINT_BARBERS", 200))
+APPOINTMENTS = int(os.getenv("BENCH_ENDPOINT_APPOINTMENTS", 100000))
+REPEAT = int(os.getenv("BENCH_ENDPOINT_REPEAT", 20))
+BASELINES = Path(os.getenv("BENCH_BASELINES", Path(__file__).with_name("baselines.json")))
+REGRESSION = float(os.getenv("BENCH_REGRESSION", 0.5))
+SLACK_MS = float(os.getenv("BENCH_REGRESSION_SLACK_MS", 1))
+UPDATE = os.getenv("BENCH_UPDATE_BASELINES") == "1"
+OUTPUT = Path(os.getenv("BENCH_OUTPUT", Path(tempfile.gettempdir()) / "barbershop-bench" / "endpoints.json"))
+
+FUTURE_DAYS = 30
+
+# name, role, method, path, body, query budget
+ENDPOINTS = [
+    ("appointments", UserProfile.Roles.BARBER, "get", "/api/appointments/", None, 2),
+    ("appointments/upcoming", UserProfile.Roles.BARBER, "get", "/api/appointments/upcoming/", None, 2),
+    ("appointments/history", UserProfile.Roles.CLIENT, "get", "/api/appointments/history/", None, 2),
+    ("appointments/stats", UserProfile.Roles.ADMIN, "get", "/api/appointments/stats/", None, 2),
+    ("appointments/check_availability", UserProfile.Roles.CLIENT, "post",
+     "/api/appointments/check_availability/", "availability", 3),
+    ("profiles/barbers", UserProfile.Roles.CLIENT, "get", "/api/profiles/barbers/", None, 1),
+    ("ratings/barber_stats", UserProfile.Roles.CLIENT, "get", "/api/ratings/barber_stats/", "barber", 2),
+    ("services/popular", UserProfile.Roles.BARBER, "get", "/api/services/popular/", None, 3),
+    ("stats-json", UserProfile.Roles.BARBER, "get", "/api/stats-json/", None, 2),
+]
+
+
+def load_baselines():
+    try:
+        return json.loads(BASELINES.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+@pytest.mark.django_db
+def test_endpoint_budgets_and_baselines(measure, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command(
+            "seed_barbershop", barbers=BARBERS, appointments=APPOINTMENTS, future_days=FUTURE_DAYS,
+            password_hashes=1, stdout=io.StringIO(),
+        )
+    users = {
+        role: User.objects.get(username=username)
+        for role, username in ((UserProfile.Roles.BARBER, "barber0"), (UserProfile.Roles.CLIENT, "client0"),
+                               (UserProfile.Roles.ADMIN, "admin"))
+    }
+    barber = users[UserProfile.Roles.BARBER]
+    # The barber's first opening past the seeded bookings is free
+    schedule = BarberSchedule.objects.filter(barber=barber).order_by("day_of_week").first()
+    day = timezone.localdate() + timedelta(days=FUTURE_DAYS + 1)
+    day += timedelta(days=(schedule.day_of_week - day.isoweekday()) % 7)
+    bodies = {
+        "availability": {
+            "barber_id": barber.id, "duration_minutes": 30,
+            "appointment_datetime": timezone.make_aware(datetime.combine(day, schedule.start_time)).isoformat(),
+        },
+        "barber": {"barber_id": barber.id},
+    }
+    clients = {}
+    for role, user in users.items():
+        clients[role] = APIClient()
+        clients[role].credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(user).access_token}")
+
+    results = {}
+    for name, role, method, path, body, budget in ENDPOINTS:
+        client = clients[role]
+        data = bodies.get(body)
+
+        def request():
+            if method == "post":
+                resp = client.post(path, data, format="json")
+            else:
+                resp = client.get(path, data)
+            assert resp.status_code == 200, (name, resp.content)
+
+        seconds, queries = measure(request, repeat=REPEAT)
+        results[name] = {"ms": round(seconds * 1000, 3), "queries": queries, "budget": budget}
+
+    scale = f"{BARBERS} barbers x {APPOINTMENTS} appointments"
+    baselines = load_baselines()
+    recorded = baselines.get(scale, {})
+
+    print(f"\n{scale}\n{'endpoint':<34} {'queries':>7} {'budget':>6} {'ms':>8} {'baseline':>8}")
+    regressions = []
+    for name, result in results.items():
+        baseline = recorded.get(name, {}).get("ms")
+        print(
+            f"{name:<34} {result['queries']:>7} {result['budget']:>6} {result['ms']:>8.2f} "
+            f"{baseline if baseline is not None else '-':>8}"
+        )
+        if baseline is not None and not UPDATE and \
+                result["ms"] > baseline * (1 + REGRESSION) and result["ms"] - baseline > SLACK_MS:
+            regressions.append(f"{name}: {result['ms']:.2f} ms against a {baseline:.2f} ms baseline")
+
+    measured = {scale: {name: {"ms": result["ms"]} for name, result in results.items()}}
+    if UPDATE:
+        baselines.update(measured)
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baselines rewritten in {BASELINES}")
+    else:
+        OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+        OUTPUT.write_text(json.dumps(measured, indent=2, sort_keys=True) + "\n")
+        print(f"Measurements written to {OUTPUT}; BENCH_UPDATE_BASELINES=1 makes them the baselines")
+
+    over = [
+        f"{name}: {result['queries']} queries, budget {result['budget']}"
+        for name, result in results.items() if result["queries"] > result["budget"]
+    ]
+    assert not over, over
+    assert not regressions, regressions
@@ -0,0 +1,55 @@
+"""
+Peak Python memory while streaming a 1M-row appointment export.
+Run with: pytest -m benchmark -s
+"""
+import os
+import time
+import tracemalloc
+import pytest
+from datetime import datetime, timedelta
+from django.utils import timezone
+from barbershop.models import Appointment, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+ROWS = int(os.getenv("BENCH_EXPORT_ROWS", 1_000_000))
+# Independent of ROWS: a buffered export of 1M rows needs well over 1 GB
+MEMORY_CEILING = 32 * 1024 * 1024
+
+
+@pytest.mark.django_db
+def test_export_memory_is_flat(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.ADMIN)
+    customer = create_user("customer", UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    origin = timezone.make_aware(datetime(2020, 1, 1, 9))
+    Appointment.objects.bulk_create((
+        Appointment(
+            client=customer,
+            barber=barber,
+            service=sample_service,
+            appointment_datetime=origin + timedelta(minutes=30 * i),
+            duration_minutes=30,
+            status="completed",
+        )
+        for i in range(ROWS)
+    ), batch_size=5000)
+
+    for fmt in ("csv", "ndjson"):
+        tracemalloc.start()
+        start = time.perf_counter()
+        resp = client.get("/api/exports/appointments/", {"format": fmt})
+        lines = size = 0
+        for chunk in resp.streaming_content:
+            lines += 1
+            size += len(chunk)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"\n{fmt}: {ROWS} rows, {size / 2**20:.0f} MiB in {elapsed:.1f} s, "
+            f"peak traced memory {peak / 2**20:.1f} MiB"
+        )
+        assert lines == ROWS + (fmt == "csv")
+        assert peak < MEMORY_CEILING
@@ -0,0 +1,62 @@
+"""
+Per-request overhead of MetricsMiddleware against its 100 microsecond
+budget: alone around a trivial view, and end to end on /api/services/.
+Run with: pytest -m benchmark -s
+"""
+import os
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.test import APIClient
+from barbershop import metrics
+
+pytestmark = pytest.mark.benchmark
+
+REQUESTS = int(os.getenv("BENCH_METRICS_REQUESTS", 500))
+BUDGET = 100e-6
+
+
+@pytest.fixture
+def store(settings, tmp_path, monkeypatch):
+    settings.METRICS_DIR = str(tmp_path)
+    monkeypatch.setattr(metrics, "store", metrics.Store())
+
+
+@pytest.mark.django_db
+def test_metrics_middleware_overhead(store, settings, sample_service, measure):
+    request = RequestFactory().get("/api/services/")
+
+    def view(request):
+        return HttpResponse(b"{}")
+
+    middleware = metrics.MetricsMiddleware(view)
+
+    def bare():
+        for _ in range(REQUESTS):
+            view(request)
+
+    def instrumented():
+        for _ in range(REQUESTS):
+            middleware(request)
+
+    bare_time, _ = measure(bare)
+    instrumented_time, _ = measure(instrumented)
+    alone = (instrumented_time - bare_time) / REQUESTS
+
+    def served(client):
+        def run():
+            for _ in range(REQUESTS):
+                client.get("/api/services/")
+        return run
+
+    with_metrics, _ = measure(served(APIClient()), repeat=5)
+    settings.MIDDLEWARE = [name for name in settings.MIDDLEWARE if name != "barbershop.metrics.MetricsMiddleware"]
+    without_metrics, _ = measure(served(APIClient()), repeat=5)
+
+    print(
+        f"\nMetricsMiddleware overhead per request (budget {BUDGET * 1e6:.0f} us)"
+        f"\naround a trivial view:      {alone * 1e6:7.1f} us"
+        f"\n/api/services/ (cached):    {without_metrics / REQUESTS * 1e6:7.1f} us without, "
+        f"{with_metrics / REQUESTS * 1e6:7.1f} us with"
+    )
+    assert alone < BUDGET
@@ -0,0 +1,114 @@
+"""
+Booking latency with a slow SMTP server: queuing to the outbox versus the
+old inline send_mail. Run with: pytest -m benchmark -s
+"""
+import os
+import socketserver
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models.signals import post_save
+from django.utils import timezone
+from barbershop.models import Appointment, Notification, UserProfile
+from barbershop.notifications import deliver_pending, new_appointment_message
+
+pytestmark = pytest.mark.benchmark
+
+API = "/api"
+SMTP_DELAY = float(os.getenv("BENCH_SMTP_DELAY", 0.2))
+
+
+class SlowSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib, sleeping before every reply"""
+
+    def reply(self, line):
+        time.sleep(SMTP_DELAY)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 slow.example ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"DATA":
+                self.reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.reply("250 queued")
+            elif command == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def slow_smtp(settings):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SlowSMTPHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_HOST = "127.0.0.1"
+    settings.EMAIL_PORT = server.server_address[1]
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = ""
+    settings.DEFAULT_FROM_EMAIL = "noreply@example.com"
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def send_inline(sender, instance, created, **kwargs):
+    """The previous behavior: send_mail inside the request"""
+    if created:
+        subject, body = new_appointment_message(instance)
+        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [instance.barber.email], fail_silently=False)
+
+
+@pytest.mark.django_db
+def test_booking_latency_with_slow_smtp(slow_smtp, auth_client, create_user, sample_service, measure):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    barber.email = "barber@example.com"
+    barber.save()
+    slots = iter(
+        timezone.make_aware(datetime(2031, 1, 6, 9)) + timedelta(hours=i) for i in range(1000)
+    )
+
+    def post():
+        resp = client.post(f"{API}/appointments/", {
+            "barber_id": barber.id,
+            "service_id": sample_service.id,
+            "appointment_datetime": next(slots).isoformat(),
+            "duration_minutes": 30,
+        }, format="json")
+        assert resp.status_code == 201, resp.content
+
+    outbox_seconds, _ = measure(post, repeat=10)
+
+    post_save.connect(send_inline, sender=Appointment)
+    try:
+        inline_seconds, _ = measure(post, repeat=5)
+    finally:
+        post_save.disconnect(send_inline, sender=Appointment)
+
+    start = time.perf_counter()
+    result = deliver_pending()
+    drain_seconds = time.perf_counter() - start
+
+    print(
+        f"\nSMTP delay {SMTP_DELAY * 1000:.0f} ms/reply\n"
+        f"booking POST, outbox:      {outbox_seconds * 1000:8.1f} ms\n"
+        f"booking POST, inline mail: {inline_seconds * 1000:8.1f} ms\n"
+        f"worker drained {result['sent']} emails over one connection in {drain_seconds:.2f} s"
+    )
+
+    assert outbox_seconds < SMTP_DELAY
+    assert inline_seconds > outbox_seconds
+    assert result["sent"] == Notification.objects.count()
@@ -0,0 +1,63 @@
+"""
+Per-page latency of keyset pagination at page 1 and page 5,000, against
+OFFSET pagination. Run with: pytest -m benchmark -s
+"""
+import base64
+import json
+import os
+import pytest
+from datetime import datetime, timedelta
+from django.utils import timezone
+from barbershop.models import Appointment, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+PAGES = int(os.getenv("BENCH_PAGES", 5000))
+PAGE_SIZE = 20
+
+
+def cursor_before(row):
+    payload = {"v": row.appointment_datetime.isoformat(), "id": row.id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.django_db
+def test_keyset_page_latency_is_flat(auth_client, create_user, sample_service, measure):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    origin = timezone.make_aware(datetime(2020, 1, 1, 9))
+    Appointment.objects.bulk_create((
+        Appointment(
+            client=user,
+            barber=barber,
+            service=sample_service,
+            appointment_datetime=origin + timedelta(minutes=30 * i),
+            duration_minutes=30,
+            status="completed",
+        )
+        for i in range(PAGES * PAGE_SIZE)
+    ), batch_size=5000)
+
+    # Last row of page PAGES - 1, i.e. where page PAGES starts
+    boundary = Appointment.objects.order_by("-appointment_datetime", "-id")[(PAGES - 1) * PAGE_SIZE - 1]
+    url = f"/api/appointments/?page_size={PAGE_SIZE}&count=false"
+
+    def get(extra):
+        resp = client.get(url + extra)
+        assert resp.status_code == 200
+        assert len(resp.json()["results"]) == PAGE_SIZE
+
+    first, _ = measure(lambda: get(""))
+    deep, _ = measure(lambda: get(f"&cursor={cursor_before(boundary)}"))
+    offset_first, _ = measure(lambda: get("&page=1"))
+    offset_deep, _ = measure(lambda: get(f"&page={PAGES}"))
+
+    print(
+        f"\n{PAGES * PAGE_SIZE} appointments, {PAGE_SIZE} per page"
+        f"\nkeyset page 1:        {first * 1000:7.2f} ms"
+        f"\nkeyset page {PAGES}:   {deep * 1000:7.2f} ms"
+        f"\noffset page 1:        {offset_first * 1000:7.2f} ms"
+        f"\noffset page {PAGES}:   {offset_deep * 1000:7.2f} ms"
+    )
+    assert deep < first * 1.5
+    assert deep < offset_deep
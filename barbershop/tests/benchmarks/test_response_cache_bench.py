@@ -0,0 +1,44 @@
+"""
+Requests per second of the service catalog and barber directory with and
+without the response cache. Run with: pytest -m benchmark -s
+"""
+import os
+import pytest
+from barbershop.cache import bump, BARBERS, SERVICES
+from barbershop.models import Service, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+ROWS = int(os.getenv("BENCH_CACHE_ROWS", 20))
+
+
+@pytest.mark.django_db
+def test_cached_responses_are_faster(auth_client, create_user, measure):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    Service.objects.bulk_create(
+        Service(name=f"Service {i}", duration_minutes=30, price=100 + i) for i in range(ROWS)
+    )
+    for i in range(ROWS):
+        create_user(f"barber{i}", UserProfile.Roles.BARBER)
+
+    for name, url, namespace in [
+        ("services", "/api/services/", SERVICES),
+        ("barbers", "/api/profiles/barbers/", BARBERS),
+    ]:
+        def get():
+            assert client.get(url).status_code == 200
+
+        def get_uncached():
+            bump(namespace)
+            get()
+
+        uncached, uncached_queries = measure(get_uncached, repeat=200)
+        get()
+        cached, cached_queries = measure(get, repeat=200)
+
+        print(
+            f"\n{name} ({ROWS} rows): uncached {1 / uncached:7.0f} req/s ({uncached_queries} queries), "
+            f"cached {1 / cached:7.0f} req/s ({cached_queries} queries)"
+        )
+        assert cached_queries == 0
+        assert cached < uncached
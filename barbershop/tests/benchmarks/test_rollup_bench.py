@@ -0,0 +1,64 @@
+"""
+Barber stats latency from the daily rollup against the raw aggregate as one
+barber's history grows tenfold.
+Run with: pytest -m benchmark -s
+"""
+import os
+import pytest
+from datetime import datetime, timedelta
+from django.db.models import Count, Q
+from django.utils import timezone
+from barbershop import rollups
+from barbershop.models import Appointment, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+ROWS = int(os.getenv("BENCH_ROLLUP_ROWS", 20000))
+# History spans a year; growing it packs more appointments into each day
+DAYS = 365
+
+
+def grow(barber, client, service, count, offset):
+    origin = timezone.make_aware(datetime(2020, 1, 1, 8))
+    statuses = list(Appointment.Status.values)
+    Appointment.objects.bulk_create(
+        (
+            Appointment(
+                client=client, barber=barber, service=service,
+                appointment_datetime=origin + timedelta(days=i % DAYS, minutes=(offset + i) // DAYS),
+                duration_minutes=30, status=statuses[i % len(statuses)],
+            )
+            for i in range(offset, offset + count)
+        ),
+        batch_size=5000,
+    )
+
+
+@pytest.mark.django_db
+def test_rollup_latency_is_flat_as_history_grows(api_client, create_user, sample_service, measure):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    api_client.force_authenticate(barber)
+
+    def rollup():
+        assert api_client.get("/api/stats-json/").status_code == 200
+
+    def raw():
+        Appointment.objects.filter(barber=barber, active=True).aggregate(
+            **{status: Count("id", filter=Q(status=status)) for status in Appointment.Status.values}
+        )
+
+    results = []
+    for size, offset in ((ROWS // 10, 0), (ROWS, ROWS // 10)):
+        grow(barber, client, sample_service, size - offset, offset)
+        rollups.refresh(full=True)
+        results.append((size, measure(rollup)[0], measure(raw)[0]))
+
+    print(f"\n{'appointments':>12} {'rollup ms':>10} {'raw ms':>8}")
+    for size, rollup_time, raw_time in results:
+        print(f"{size:>12} {rollup_time * 1000:>10.2f} {raw_time * 1000:>8.2f}")
+
+    (_, small_rollup, small_raw), (_, large_rollup, large_raw) = results
+    # The rollup reads one row per day and status either way
+    assert large_rollup < small_rollup * 2
+    assert large_raw > small_raw * 2
@@ -0,0 +1,61 @@
+"""
+Schedule window lookups per second from the per-process schedule cache
+against the BarberSchedule query check_availability used to run.
+Run with: pytest -m benchmark -s
+"""
+import os
+import random
+import pytest
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from barbershop import schedule_cache
+from barbershop.models import BarberSchedule, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+BARBERS = int(os.getenv("BENCH_SCHEDULE_BARBERS", 50))
+LOOKUPS = int(os.getenv("BENCH_SCHEDULE_LOOKUPS", 5000))
+
+
+@pytest.mark.django_db
+def test_schedule_lookups_per_second(create_user, measure):
+    barbers = [create_user(f"barber{i}", UserProfile.Roles.BARBER).id for i in range(BARBERS)]
+    BarberSchedule.objects.bulk_create(
+        BarberSchedule(barber_id=barber_id, day_of_week=day, start_time=start, end_time=end)
+        for barber_id in barbers
+        for day in range(1, 7)
+        for start, end in ((time(9), time(13)), (time(14), time(19)))
+    )
+    rng = random.Random(3)
+    origin = timezone.make_aware(datetime(2030, 1, 7))
+    lookups = [
+        (rng.choice(barbers), origin + timedelta(days=rng.randrange(7), minutes=rng.randrange(8 * 60, 20 * 60)))
+        for _ in range(LOOKUPS)
+    ]
+
+    def queried():
+        for barber_id, moment in lookups:
+            BarberSchedule.objects.filter(
+                barber_id=barber_id,
+                day_of_week=moment.isoweekday(),
+                start_time__lte=moment.time(),
+                end_time__gte=moment.time(),
+                active=True
+            ).first()
+
+    def cached():
+        for barber_id, moment in lookups:
+            schedule_cache.window_at(barber_id, moment)
+
+    schedule_cache.weeks(barbers)
+    # Cached first: the query log Django keeps for counting holds 9000 queries
+    cache_time, cache_count = measure(cached, repeat=3)
+    query_time, _ = measure(queried, repeat=3)
+
+    print(
+        f"\n{LOOKUPS} schedule lookups over {BARBERS} barbers"
+        f"\nBarberSchedule query: {LOOKUPS / query_time:10.0f} lookups/s"
+        f"\nschedule cache:       {LOOKUPS / cache_time:10.0f} lookups/s, {cache_count} queries"
+    )
+    assert cache_count == 0
+    assert cache_time < query_time / 5
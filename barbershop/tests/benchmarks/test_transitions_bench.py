@@ -0,0 +1,57 @@
+"""
+Completing 1,000 appointments with one bulk request against 1,000 PATCHes.
+Run with: pytest -m benchmark -s
+"""
+import os
+import time
+import pytest
+from datetime import datetime, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from barbershop.models import Appointment, UserProfile
+
+pytestmark = pytest.mark.benchmark
+
+IDS = int(os.getenv("BENCH_BULK_IDS", 1000))
+
+
+@pytest.mark.django_db
+def test_bulk_complete_against_single_patches(auth_client, create_user, sample_service):
+    client, barber = auth_client(UserProfile.Roles.BARBER)
+    customer = create_user("customer", UserProfile.Roles.CLIENT)
+    origin = timezone.make_aware(datetime(2030, 1, 1, 9))
+    appointments = Appointment.objects.bulk_create(
+        Appointment(
+            client=customer, barber=barber, service=sample_service,
+            appointment_datetime=origin + timedelta(minutes=30 * i), duration_minutes=30,
+        )
+        for i in range(2 * IDS)
+    )
+    ids = [appointment.id for appointment in appointments]
+    single_ids, bulk_ids = ids[:IDS], ids[IDS:]
+
+    def timed(func):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            return time.perf_counter() - start, len(ctx.captured_queries)
+
+    def patch_each():
+        for appointment_id in single_ids:
+            assert client.patch(f"/api/appointments/{appointment_id}/complete/").status_code == 200
+
+    def bulk():
+        resp = client.post("/api/appointments/bulk_complete/", {"ids": bulk_ids}, format="json")
+        assert resp.json()["updated"] == IDS
+
+    single, single_queries = timed(patch_each)
+    batched, batched_queries = timed(bulk)
+
+    print(
+        f"\ncomplete {IDS} appointments"
+        f"\n{IDS} PATCH requests: {single * 1000:8.1f} ms, {single_queries} queries"
+        f"\n1 bulk request:     {batched * 1000:8.1f} ms, {batched_queries} queries"
+    )
+    assert Appointment.objects.filter(status=Appointment.Status.COMPLETED).count() == 2 * IDS
+    assert batched < single / 10
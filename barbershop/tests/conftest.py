@@ -3,6 +3,40 @@ from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from barbershop.models import UserProfile, Service
 
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix, tmp_path_factory):
+    """
+    Put the SQLite test database in a file: an in-memory database is shared
+    through one cache with table-level locks, so concurrent connections fail
+    with "table is locked" instead of waiting like they do in production.
+    """
+    from django.conf import settings
+    database = settings.DATABASES["default"]
+    if database["ENGINE"].endswith("sqlite3") and not database.get("TEST", {}).get("NAME"):
+        database.setdefault("TEST", {})["NAME"] = str(tmp_path_factory.mktemp("db") / "test.sqlite3")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Cached state (e.g. token revocations) must not leak between tests"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def detect_n_plus_one(request, settings):
+    """
+    Fail any request repeating a SELECT NPLUSONE_THRESHOLD times, naming the
+    serializer field behind it; mark a test allow_n_plus_one to opt out
+    """
+    if request.node.get_closest_marker("allow_n_plus_one") is None:
+        settings.NPLUSONE_DETECT = True
+        settings.NPLUSONE_RAISE = True
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -0,0 +1,128 @@
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from barbershop import authentication
+from barbershop.authentication import issue_tokens
+from barbershop.models import UserProfile
+
+API = "/api"
+
+
+def bearer(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.access_token}")
+    return client
+
+
+def issued_earlier(user):
+    """Tokens from a login a few seconds ago; revocations count whole seconds"""
+    moment = timezone.now() - timedelta(seconds=5)
+    with mock.patch("rest_framework_simplejwt.tokens.aware_utcnow", return_value=moment):
+        refresh = issue_tokens(user)
+        return SimpleNamespace(access_token=str(refresh.access_token))
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get(url)
+    assert resp.status_code == 200, resp.content
+    return len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", ["/appointments/", "/schedules/", "/calendar-events/"])
+def test_role_claims_skip_user_and_profile_queries(create_user, url):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    # Read the (absent) revocation into the cache, as any later request finds it
+    count_queries(bearer(issue_tokens(barber)), f"{API}{url}")
+
+    plain = count_queries(bearer(RefreshToken.for_user(barber)), f"{API}{url}")
+    claims = count_queries(bearer(issue_tokens(barber)), f"{API}{url}")
+
+    # No User row to authenticate, no UserProfile row for the role checks
+    assert plain - claims == 2
+
+
+@pytest.mark.django_db
+def test_login_token_carries_role(api_client, create_user):
+    create_user("ana", UserProfile.Roles.BARBER)
+
+    resp = api_client.post(f"{API}/login/", {"username": "ana", "password": "1234"}, format="json")
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {resp.json()['access']}")
+
+    me = client.get(f"{API}/profiles/me/")
+    assert me.status_code == 200
+    assert me.json()["role"] == UserProfile.Roles.BARBER
+    assert me.json()["phone_number"] == ""
+
+
+@pytest.mark.django_db
+def test_role_change_revokes_issued_tokens(create_user, django_capture_on_commit_callbacks):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = bearer(issued_earlier(barber))
+    assert client.get(f"{API}/schedules/").status_code == 200
+
+    profile = barber.profile
+    profile.role = UserProfile.Roles.CLIENT
+    with django_capture_on_commit_callbacks(execute=True):
+        profile.save()
+
+    resp = client.get(f"{API}/schedules/")
+    assert resp.status_code == 401
+    assert resp.json()["code"] == "token_revoked"
+
+
+@pytest.mark.django_db
+def test_password_change_revokes_issued_tokens(create_user, django_capture_on_commit_callbacks):
+    user = create_user("cliente", UserProfile.Roles.CLIENT)
+    client = bearer(issued_earlier(user))
+
+    user.set_password("new-password")
+    with django_capture_on_commit_callbacks(execute=True):
+        user.save()
+
+    assert client.get(f"{API}/appointments/").status_code == 401
+    # The token handed out with the change, in the same second, is kept
+    assert bearer(issue_tokens(user)).get(f"{API}/appointments/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_rolled_back_changes_revoke_nothing(create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = bearer(issued_earlier(barber))
+
+    with pytest.raises(RuntimeError), transaction.atomic():
+        profile = barber.profile
+        profile.role = UserProfile.Roles.CLIENT
+        profile.save()
+        raise RuntimeError("rolled back")
+
+    assert client.get(f"{API}/schedules/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_revocation_reaches_workers_with_their_own_cache(create_user, monkeypatch, django_capture_on_commit_callbacks):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = bearer(issued_earlier(barber))
+    assert client.get(f"{API}/schedules/").status_code == 200
+
+    profile = barber.profile
+    profile.role = UserProfile.Roles.CLIENT
+    with django_capture_on_commit_callbacks(execute=True):
+        profile.save()
+
+    # Another worker's local memory, which never saw the revocation
+    other = LocMemCache("other-worker", {})
+    other.clear()
+    monkeypatch.setattr(authentication, "cache", other)
+    resp = client.get(f"{API}/schedules/")
+    assert resp.status_code == 401
+    assert resp.json()["code"] == "token_revoked"
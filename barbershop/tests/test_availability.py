@@ -0,0 +1,157 @@
+import pytest
+from datetime import date, datetime, timedelta, time
+from django.utils import timezone
+from barbershop.availability import subtract_intervals, slot_starts
+from barbershop.models import Appointment, BarberSchedule, UserProfile
+
+API = "/api"
+
+
+def at(hour, minute=0):
+    return datetime(2030, 1, 7, hour, minute, tzinfo=timezone.get_current_timezone())
+
+
+def test_subtract_intervals_sweeps_unsorted_and_overlapping_input():
+    windows = [(at(14), at(18)), (at(9), at(12)), (at(11), at(13))]
+    busy = [(at(15), at(16)), (at(8), at(9, 30)), (at(12, 30), at(14, 30)), (at(15, 30), at(16, 30))]
+
+    assert subtract_intervals(windows, busy) == [
+        (at(9, 30), at(12, 30)),
+        (at(14, 30), at(15)),
+        (at(16, 30), at(18)),
+    ]
+
+
+def test_slot_starts_only_returns_slots_that_fit():
+    free = [(at(9), at(10)), (at(10, 30), at(10, 45))]
+
+    assert slot_starts(free, timedelta(minutes=30), timedelta(minutes=15)) == [
+        at(9), at(9, 15), at(9, 30)
+    ]
+
+
+@pytest.mark.django_db
+def test_available_slots_skips_booked_intervals(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    day = date(2030, 1, 7)
+
+    BarberSchedule.objects.create(
+        barber=barber, day_of_week=day.isoweekday(), start_time="09:00", end_time="11:00"
+    )
+    Appointment.objects.create(
+        client=barber,
+        barber=barber,
+        appointment_datetime=timezone.make_aware(datetime.combine(day, time(9, 30))),
+        duration_minutes=45,
+        status="booked",
+        service=sample_service
+    )
+
+    resp = client.get(f"{API}/appointments/available_slots/", {
+        "barber_id": barber.id,
+        "date": day.isoformat(),
+        "service_id": sample_service.id,
+        "step_minutes": 15,
+    })
+
+    assert resp.status_code == 200, resp.content
+    assert resp.json()["available_slots"] == ["09:00:00", "10:15:00", "10:30:00"]
+
+
+@pytest.mark.django_db
+def test_available_slots_requires_a_barber(auth_client):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+
+    resp = client.get(f"{API}/appointments/available_slots/", {
+        "barber_id": user.id,
+        "date": "2030-01-07",
+        "duration_minutes": 30,
+    })
+
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_search_slots_ranks_earliest_across_barbers(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    early = create_user("early", UserProfile.Roles.BARBER)
+    late = create_user("late", UserProfile.Roles.BARBER)
+    day = date(2030, 1, 7)
+
+    BarberSchedule.objects.create(barber=early, day_of_week=day.isoweekday(), start_time="09:00", end_time="10:00")
+    BarberSchedule.objects.create(barber=late, day_of_week=day.isoweekday(), start_time="09:30", end_time="10:30")
+    Appointment.objects.create(
+        client=early,
+        barber=early,
+        appointment_datetime=timezone.make_aware(datetime.combine(day, time(9))),
+        duration_minutes=30,
+        status="booked",
+        service=sample_service
+    )
+
+    resp = client.get(f"{API}/appointments/search_slots/", {
+        "service_id": sample_service.id,
+        "start_date": day.isoformat(),
+        "end_date": day.isoformat(),
+        "step_minutes": 30,
+    })
+
+    assert resp.status_code == 200, resp.content
+    assert [(slot["barber_name"], slot["start"][11:16]) for slot in resp.json()["slots"]] == [
+        ("early", "09:30"), ("late", "09:30"), ("late", "10:00")
+    ]
+
+
+@pytest.mark.django_db
+def test_search_slots_query_count_is_constant(auth_client, create_user, sample_service, django_assert_num_queries):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barbers = [create_user(f"barber{i}", UserProfile.Roles.BARBER) for i in range(6)]
+    for barber in barbers:
+        for day_of_week in range(1, 8):
+            BarberSchedule.objects.create(barber=barber, day_of_week=day_of_week, start_time="09:00", end_time="17:00")
+
+    def search(**extra):
+        return client.get(f"{API}/appointments/search_slots/", {
+            "service_id": sample_service.id, "start_date": "2030-01-07", **extra
+        })
+
+    # The first search loads every barber's week into the schedule cache
+    with django_assert_num_queries(4):
+        assert search(end_date="2030-01-07").status_code == 200
+
+    # service + barbers + appointments, whatever the size of the search
+    with django_assert_num_queries(3):
+        assert search(end_date="2030-01-07", barber_ids=[barbers[0].id]).status_code == 200
+    with django_assert_num_queries(3):
+        assert search(end_date="2030-02-05", limit=500).status_code == 200
+
+
+@pytest.mark.django_db
+def test_check_availability_detects_long_running_booking(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    day = date(2030, 1, 7)
+    BarberSchedule.objects.create(barber=barber, day_of_week=day.isoweekday(), start_time="08:00", end_time="18:00")
+    start = timezone.make_aware(datetime.combine(day, time(9)))
+    Appointment.objects.create(
+        client=barber,
+        barber=barber,
+        appointment_datetime=start,
+        duration_minutes=300,
+        status="booked",
+        service=sample_service
+    )
+
+    def check(hour):
+        return client.post(f"{API}/appointments/check_availability/", {
+            "barber_id": barber.id,
+            "appointment_datetime": datetime.combine(day, time(hour)).isoformat(),
+            "duration_minutes": 30,
+        }).json()
+
+    # Starts 4 hours after the booking began, which the old 120 minute window missed
+    busy = check(13)
+    assert busy["available"] is False
+    assert busy["conflict_time"] == start.isoformat()
+    assert check(14)["available"] is True
@@ -0,0 +1,113 @@
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from barbershop.models import Appointment, UserProfile
+
+API = "/api"
+
+SLOT = timezone.make_aware(datetime.combine(timezone.now().date() + timedelta(days=30), time(10)))
+
+
+def booking_payload(barber, service, when=SLOT):
+    return {
+        "barber_id": barber.id,
+        "service_id": service.id,
+        "appointment_datetime": when.isoformat(),
+        "duration_minutes": 30,
+    }
+
+
+@pytest.mark.django_db
+def test_overlapping_booking_is_rejected(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+
+    first = client.post(f"{API}/appointments/", booking_payload(barber, sample_service), format="json")
+    overlap = client.post(f"{API}/appointments/", booking_payload(barber, sample_service, SLOT + timedelta(minutes=15)), format="json")
+    after = client.post(f"{API}/appointments/", booking_payload(barber, sample_service, SLOT + timedelta(minutes=30)), format="json")
+
+    assert first.status_code == 201, first.content
+    assert overlap.status_code == 409
+    assert after.status_code == 201
+
+
+@pytest.mark.django_db
+def test_reschedule_can_overlap_its_own_old_slot(auth_client, create_user, sample_service):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    appt = Appointment.objects.create(
+        client=user, barber=barber, service=sample_service,
+        appointment_datetime=SLOT, duration_minutes=30
+    )
+    Appointment.objects.create(
+        client=user, barber=barber, service=sample_service,
+        appointment_datetime=SLOT + timedelta(hours=1), duration_minutes=30
+    )
+
+    from barbershop.booking import SlotUnavailable, reschedule
+    reschedule(appt, SLOT + timedelta(minutes=15), "[RESCHEDULED]")
+    with pytest.raises(SlotUnavailable):
+        reschedule(appt, SLOT + timedelta(minutes=45), "[RESCHEDULED]")
+
+
+# Restore the rows migrations create (e.g. the stats watermark) after the flush
+@pytest.mark.django_db(transaction=True, serialized_rollback=True)
+def test_concurrent_bookings_for_one_slot_have_one_winner(create_user, sample_service):
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        pytest.skip("needs a database that supports concurrent connections")
+
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    clients = [create_user(f"client{i}", UserProfile.Roles.CLIENT) for i in range(8)]
+    attempts = 200
+    start = threading.Barrier(16)
+
+    def post(i):
+        api = APIClient()
+        api.force_authenticate(clients[i % len(clients)])
+        if i < 16:
+            start.wait()
+        try:
+            return api.post(f"{API}/appointments/", booking_payload(barber, sample_service), format="json").status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        codes = list(pool.map(post, range(attempts)))
+
+    assert codes.count(201) == 1
+    assert codes.count(409) == attempts - 1
+    assert Appointment.objects.filter(barber=barber, appointment_datetime=SLOT).count() == 1
+
+
+@pytest.mark.django_db
+def test_editing_an_appointment_cannot_double_book(auth_client, create_user, sample_service):
+    admin, _ = auth_client(UserProfile.Roles.ADMIN)
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    other = create_user("other", UserProfile.Roles.BARBER)
+    appt = Appointment.objects.create(
+        client=client, barber=barber, service=sample_service, appointment_datetime=SLOT, duration_minutes=30
+    )
+    for who in (barber, other):
+        Appointment.objects.create(
+            client=client, barber=who, service=sample_service,
+            appointment_datetime=SLOT + timedelta(hours=1), duration_minutes=30
+        )
+    url = f"{API}/appointments/{appt.id}/"
+
+    onto_taken = admin.patch(url, {"appointment_datetime": (SLOT + timedelta(minutes=45)).isoformat()}, format="json")
+    longer = admin.patch(url, {"duration_minutes": 90}, format="json")
+    other_barber = admin.patch(url, {"barber_id": other.id, "appointment_datetime": (SLOT + timedelta(hours=1)).isoformat()}, format="json")
+    within_own_slot = admin.patch(url, {"appointment_datetime": (SLOT + timedelta(minutes=15)).isoformat()}, format="json")
+
+    assert onto_taken.status_code == 409
+    assert "conflict_time" in onto_taken.json()
+    assert longer.status_code == 409
+    assert other_barber.status_code == 409
+    assert within_own_slot.status_code == 200, within_own_slot.content
+    appt.refresh_from_db()
+    assert (appt.barber, appt.appointment_datetime) == (barber, SLOT + timedelta(minutes=15))
@@ -0,0 +1,97 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from barbershop.models import Service, UserProfile
+
+API = "/api"
+
+
+@pytest.mark.django_db
+def test_service_list_is_served_from_cache(api_client, sample_service):
+    first = api_client.get(f"{API}/services/")
+
+    with CaptureQueriesContext(connection) as ctx:
+        second = api_client.get(f"{API}/services/")
+
+    assert len(ctx.captured_queries) == 0
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second["Content-Type"] == first["Content-Type"]
+
+
+@pytest.mark.django_db
+def test_workers_without_a_shared_cache_skip_it(api_client, sample_service, settings):
+    settings.WEB_CONCURRENCY = 3
+    api_client.get(f"{API}/services/")
+
+    # Another worker's save never bumps this worker's local version
+    Service.objects.filter(pk=sample_service.pk).update(name="Renamed")
+
+    names = [row["name"] for row in api_client.get(f"{API}/services/").json()["results"]]
+    assert names == ["Renamed"]
+
+
+@pytest.mark.django_db
+def test_saving_a_service_invalidates_the_list(api_client, sample_service, django_capture_on_commit_callbacks):
+    api_client.get(f"{API}/services/")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Service.objects.create(name="Barba", duration_minutes=15, price=80)
+
+    names = [row["name"] for row in api_client.get(f"{API}/services/").json()["results"]]
+    assert "Barba" in names
+
+
+@pytest.mark.django_db
+def test_roles_get_their_own_variant(api_client, auth_client, sample_service):
+    Service.objects.create(name="Retired", duration_minutes=15, price=80, active=False)
+    admin, _ = auth_client(UserProfile.Roles.ADMIN)
+
+    public = api_client.get(f"{API}/services/").json()
+    everything = admin.get(f"{API}/services/").json()
+
+    assert public["count"] == 1
+    assert everything["count"] == 2
+
+
+@pytest.mark.django_db
+def test_barber_directory_follows_profile_changes(auth_client, create_user, django_capture_on_commit_callbacks):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    assert client.get(f"{API}/profiles/barbers/").json()["count"] == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        profile = barber.profile
+        profile.active = False
+        profile.save()
+
+    assert client.get(f"{API}/profiles/barbers/").json()["count"] == 0
+
+
+@pytest.mark.django_db
+def test_logins_keep_the_barber_directory_cached(auth_client, create_user, django_capture_on_commit_callbacks):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client.get(f"{API}/profiles/barbers/")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        User.objects.get(pk=barber.pk).save(update_fields=["last_login"])
+
+    with CaptureQueriesContext(connection) as ctx:
+        client.get(f"{API}/profiles/barbers/")
+    assert len(ctx.captured_queries) == 0
+
+
+def test_local_memory_cache_is_not_shared_between_workers(settings, caplog):
+    from barbershop.cache import is_shared, warn_if_not_shared
+    settings.WEB_CONCURRENCY = 1
+    assert is_shared()
+
+    settings.WEB_CONCURRENCY = 3
+    assert not is_shared()
+    warn_if_not_shared()
+    assert "set REDIS_URL" in caplog.text
+
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": ""}}
+    assert is_shared()
@@ -0,0 +1,286 @@
+import json
+import os
+import threading
+import uuid
+import pytest
+import googleapiclient
+from datetime import timedelta
+from types import SimpleNamespace
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.utils import timezone
+from barbershop import calendar_sync
+from barbershop.management.commands import sync_calendar
+from barbershop.models import Appointment, CalendarCredential, CalendarEvent, CalendarSyncTask, UserProfile
+
+API = "/api"
+
+DISCOVERY_DOC = os.path.join(
+    os.path.dirname(googleapiclient.__file__), "discovery_cache", "documents", "calendar.v3.json"
+)
+
+
+class FakeCalendar:
+    """
+    In-process stand-in for the Calendar discovery and batch endpoints.
+
+    ``fail`` maps an HTTP method to a list of statuses returned, one per call,
+    before requests with that method start succeeding.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.batches = []
+        self.discovery_fetches = 0
+        self.fail = {}
+        self.tokens = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body, content_type="application/json"):
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                fake.discovery_fetches += 1
+                with open(DISCOVERY_DOC) as fp:
+                    doc = json.load(fp)
+                doc["rootUrl"] = fake.url
+                doc["baseUrl"] = fake.url + doc["servicePath"]
+                self.send(200, json.dumps(doc))
+
+            def do_POST(self):
+                fake.tokens.add(self.headers.get("Authorization"))
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                message = BytesParser().parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                )
+                parts = []
+                for part in message.get_payload():
+                    request = part.get_payload()
+                    parts.append((part["Content-ID"], fake.call(request)))
+                fake.batches.append(len(parts))
+
+                boundary = uuid.uuid4().hex
+                chunks = []
+                for content_id, (status, payload) in parts:
+                    chunks.append(
+                        f"--{boundary}\r\n"
+                        f"Content-Type: application/http\r\n"
+                        f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                        f"HTTP/1.1 {status} X\r\n"
+                        f"Content-Type: application/json\r\n\r\n"
+                        f"{json.dumps(payload)}\r\n"
+                    )
+                chunks.append(f"--{boundary}--\r\n")
+                self.send(200, "".join(chunks), f"multipart/mixed; boundary={boundary}")
+
+        return Handler
+
+    def call(self, raw):
+        head, _, body = raw.partition("\r\n\r\n") if "\r\n\r\n" in raw else raw.partition("\n\n")
+        method, path, _ = head.splitlines()[0].split(" ", 2)
+        path = path.split("?")[0]
+
+        statuses = self.fail.get(method)
+        if statuses:
+            status = statuses.pop(0)
+            return status, {"error": {"code": status, "errors": [{"reason": "backendError"}]}}
+
+        event_id = path.rsplit("/", 1)[1]
+        if method == "POST":
+            event_id = uuid.uuid4().hex
+            self.events[event_id] = json.loads(body)
+            return 200, {"id": event_id, **self.events[event_id]}
+        if event_id not in self.events:
+            return 404, {"error": {"code": 404, "errors": [{"reason": "notFound"}]}}
+        if method == "PUT":
+            self.events[event_id] = json.loads(body)
+            return 200, {"id": event_id, **self.events[event_id]}
+        del self.events[event_id]
+        return 204, ""
+
+
+@pytest.fixture
+def fake_calendar(settings):
+    fake = FakeCalendar()
+    threading.Thread(target=fake.server.serve_forever, daemon=True).start()
+    settings.GOOGLE_CALENDAR_DISCOVERY_URL = fake.url + "discovery/v1/apis/calendar/v3/rest"
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+@pytest.fixture
+def connected_barber(create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    CalendarCredential.objects.create(barber=barber, access_token="barber-token")
+    return barber
+
+
+def book(barber, service, count):
+    client = barber  # clients don't matter to the calendar
+    start = timezone.now() + timedelta(days=2)
+    return [
+        Appointment.objects.create(
+            client=client,
+            barber=barber,
+            appointment_datetime=start + timedelta(hours=i),
+            duration_minutes=30,
+            service=service
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_worker_inserts_updates_and_deletes_in_batches(fake_calendar, connected_barber, sample_service):
+    appointments = book(connected_barber, sample_service, 60)
+    assert CalendarSyncTask.objects.filter(status="pending").count() == 60
+
+    assert calendar_sync.run_pending() == {"synced": 60, "retry": 0, "failed": 0}
+    # One barber: 60 calls go out as one full batch plus the remainder
+    assert fake_calendar.batches == [50, 10]
+    assert fake_calendar.tokens == {"Bearer barber-token"}
+    assert CalendarEvent.objects.count() == len(fake_calendar.events) == 60
+
+    moved, canceled = appointments[0], appointments[1]
+    moved.appointment_datetime += timedelta(days=1)
+    moved.save()
+    canceled.status = Appointment.Status.CANCELED
+    canceled.save()
+
+    assert calendar_sync.run_pending() == {"synced": 2, "retry": 0, "failed": 0}
+    assert fake_calendar.batches[-1] == 2
+    event = CalendarEvent.objects.get(appointment=moved)
+    assert fake_calendar.events[event.external_event_id]["start"]["dateTime"] == moved.appointment_datetime.isoformat()
+    assert not CalendarEvent.objects.filter(appointment=canceled).exists()
+    assert len(fake_calendar.events) == 59
+    # The discovery document is parsed once per process, not per run or barber
+    assert fake_calendar.discovery_fetches == 1
+
+
+@pytest.mark.django_db
+def test_worker_retries_transient_errors_with_backoff(fake_calendar, connected_barber, sample_service):
+    book(connected_barber, sample_service, 2)
+    fake_calendar.fail["POST"] = [503, 400]
+    now = timezone.now()
+
+    assert calendar_sync.run_pending(now=now) == {"synced": 0, "retry": 1, "failed": 1}
+    retry = CalendarSyncTask.objects.get(status="pending")
+    assert retry.next_attempt_at == now + calendar_sync.backoff(1)
+    assert "503" in retry.last_error
+
+    # Not due yet, then due
+    assert calendar_sync.run_pending(now=now) == {"synced": 0, "retry": 0, "failed": 0}
+    assert calendar_sync.run_pending(now=retry.next_attempt_at)["synced"] == 1
+    assert CalendarEvent.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_sync_endpoint_queues_instead_of_calling_google(auth_client, sample_service, fake_calendar):
+    client, barber = auth_client(UserProfile.Roles.BARBER)
+    appointment = book(barber, sample_service, 1)[0]
+
+    resp = client.post(f"{API}/calendar-events/sync/", {
+        "appointment_id": appointment.id, "access_token": "fresh-token"
+    }, format="json")
+
+    assert resp.status_code == 202, resp.content
+    assert fake_calendar.batches == []
+    assert CalendarCredential.objects.get(barber=barber).access_token == "fresh-token"
+
+    calendar_sync.run_pending()
+    assert fake_calendar.tokens == {"Bearer fresh-token"}
+    assert client.post(f"{API}/calendar-events/sync/", {
+        "appointment_id": appointment.id, "access_token": "fresh-token"
+    }, format="json").status_code == 200
+
+
+@pytest.mark.django_db
+def test_calls_go_out_with_the_tasks_claimed_and_no_transaction_open(
+    fake_calendar, connected_barber, sample_service, monkeypatch
+):
+    book(connected_barber, sample_service, 2)
+    depth = len(connection.atomic_blocks)
+    seen = []
+    sync_barber = calendar_sync._sync_barber
+
+    def watching(tasks, *args):
+        seen.append((list(CalendarSyncTask.objects.values_list("status", flat=True)), len(connection.atomic_blocks)))
+        sync_barber(tasks, *args)
+
+    monkeypatch.setattr(calendar_sync, "_sync_barber", watching)
+    assert calendar_sync.run_pending()["synced"] == 2
+    assert seen == [(["running", "running"], depth)]
+
+
+@pytest.mark.django_db
+def test_one_task_per_appointment_runs_at_a_time(fake_calendar, connected_barber, sample_service):
+    appointment = book(connected_barber, sample_service, 1)[0]
+    now = timezone.now()
+    # Another worker holds the first task; the appointment changes meanwhile
+    CalendarSyncTask.objects.update(status="running", attempts=1, next_attempt_at=now + calendar_sync.LEASE)
+    calendar_sync.enqueue(appointment)
+
+    assert calendar_sync.run_pending(now=now)["synced"] == 0
+    # The lease ran out (the worker died): one call syncs for both tasks
+    assert calendar_sync.run_pending(now=now + calendar_sync.LEASE)["synced"] == 2
+    assert CalendarEvent.objects.count() == len(fake_calendar.events) == 1
+    assert set(CalendarSyncTask.objects.values_list("status", flat=True)) == {"done"}
+
+
+@pytest.mark.django_db
+def test_tasks_use_the_appointments_current_barber(fake_calendar, connected_barber, create_user, sample_service):
+    appointment = book(connected_barber, sample_service, 1)[0]
+    other = create_user("other", UserProfile.Roles.BARBER)
+    CalendarCredential.objects.create(barber=other, access_token="other-token")
+
+    # Moved before the worker ran: the pending task was queued for the first barber
+    appointment.barber = other
+    appointment.save()
+    assert CalendarSyncTask.objects.get().barber_id == connected_barber.id
+
+    assert calendar_sync.run_pending()["synced"] == 1
+    assert fake_calendar.tokens == {"Bearer other-token"}
+
+
+class Stop(Exception):
+    pass
+
+
+def test_worker_loop_outlives_errors(monkeypatch):
+    results = [OperationalError("server closed the connection unexpectedly"), {"synced": 1, "retry": 0, "failed": 0}]
+    sleeps, closed = [], []
+
+    def run(batch_size):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if not results:
+            raise Stop
+
+    monkeypatch.setattr(sync_calendar, "run_pending", run)
+    monkeypatch.setattr(sync_calendar, "close_old_connections", lambda: closed.append(1))
+    monkeypatch.setattr(sync_calendar, "time", SimpleNamespace(sleep=sleep))
+    with pytest.raises(Stop):
+        call_command("sync_calendar", loop=True, interval=1)
+
+    assert sleeps == [1, 1] and len(closed) == 2
@@ -0,0 +1,105 @@
+import pytest
+from datetime import time, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from barbershop.models import Appointment, BarberSchedule, UserProfile
+from barbershop.serializers import AppointmentListSerializer, BarberScheduleSerializer
+
+API = "/api"
+
+
+@pytest.fixture
+def count_serialized(monkeypatch):
+    """Number of rows each serializer class turned into data"""
+    calls = {}
+
+    def spy(serializer_class):
+        original = serializer_class.to_representation
+
+        def to_representation(self, instance):
+            calls[serializer_class] = calls.get(serializer_class, 0) + 1
+            return original(self, instance)
+        monkeypatch.setattr(serializer_class, "to_representation", to_representation)
+
+    spy(BarberScheduleSerializer)
+    spy(AppointmentListSerializer)
+    return calls
+
+
+@pytest.fixture
+def schedules(auth_client, create_user):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    BarberSchedule.objects.bulk_create(
+        BarberSchedule(barber=barber, day_of_week=day, start_time=time(9), end_time=time(18))
+        for day in range(1, 7)
+    )
+    return client, barber
+
+
+@pytest.mark.django_db
+def test_repeat_fetch_is_a_bodiless_304(schedules, count_serialized):
+    client, _ = schedules
+    first = client.get(f"{API}/schedules/")
+    assert first.status_code == 200
+    assert first["ETag"] and first["Last-Modified"]
+    assert count_serialized[BarberScheduleSerializer] == 6
+
+    with CaptureQueriesContext(connection) as ctx:
+        repeat = client.get(f"{API}/schedules/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat["ETag"] == first["ETag"]
+    assert count_serialized[BarberScheduleSerializer] == 6
+    # Only the validator; the rows aren't loaded
+    assert len(ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_changes_and_deletes_change_the_etag(schedules):
+    client, barber = schedules
+    etag = client.get(f"{API}/schedules/")["ETag"]
+
+    schedule = BarberSchedule.objects.filter(barber=barber).first()
+    schedule.end_time = time(17)
+    schedule.save()
+    changed = client.get(f"{API}/schedules/", HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+
+    schedule.delete()
+    deleted = client.get(f"{API}/schedules/", HTTP_IF_NONE_MATCH=changed["ETag"])
+    assert deleted.status_code == 200
+    assert deleted["ETag"] not in (etag, changed["ETag"])
+
+
+@pytest.mark.django_db
+def test_cached_service_list_revalidates(api_client, sample_service):
+    first = api_client.get(f"{API}/services/")
+    repeat = api_client.get(f"{API}/services/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert repeat.status_code == 304
+    assert repeat["ETag"] == first["ETag"]
+
+
+@pytest.mark.django_db
+def test_upcoming_appointments_revalidate(auth_client, create_user, sample_service, count_serialized):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    for days in range(1, 4):
+        Appointment.objects.create(
+            client=user,
+            barber=barber,
+            service=sample_service,
+            appointment_datetime=timezone.now() + timedelta(days=days),
+            duration_minutes=30,
+        )
+
+    first = client.get(f"{API}/appointments/upcoming/")
+    repeat = client.get(f"{API}/appointments/upcoming/", HTTP_IF_NONE_MATCH=first["ETag"])
+    assert repeat.status_code == 304
+    assert count_serialized[AppointmentListSerializer] == 3
+
+    Appointment.objects.filter(client=user).first().save()
+    assert client.get(f"{API}/appointments/upcoming/", HTTP_IF_NONE_MATCH=first["ETag"]).status_code == 200
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from barbershop.models import Appointment, Payment, UserProfile
+
+API = "/api"
+
+
+@pytest.fixture
+def booked(create_user, sample_service):
+    ana = create_user("ana", UserProfile.Roles.CLIENT)
+    luis = create_user("luis", UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    start = timezone.make_aware(datetime(2029, 1, 10, 9))
+    for i, client in enumerate([ana, ana, luis]):
+        appointment = Appointment.objects.create(
+            client=client,
+            barber=barber,
+            service=sample_service,
+            appointment_datetime=start + timedelta(days=30 * i),
+            duration_minutes=30,
+        )
+        Payment.objects.create(appointment=appointment, amount="150.00", currency="MXN", provider="cash")
+    return ana, barber
+
+
+def rows(response):
+    return list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+
+@pytest.mark.django_db
+def test_csv_export_is_scoped_to_the_client(api_client, booked):
+    ana, _ = booked
+    api_client.force_authenticate(ana)
+
+    resp = api_client.get(f"{API}/exports/appointments/")
+
+    assert resp.status_code == 200
+    assert resp["Content-Type"].startswith("text/csv")
+    assert resp["Content-Disposition"] == 'attachment; filename="appointments.csv"'
+    exported = rows(resp)
+    assert [row["client__username"] for row in exported] == ["ana", "ana"]
+    assert exported[0]["service__name"] == "Corte"
+
+
+@pytest.mark.django_db
+def test_ndjson_export_applies_date_filters(api_client, booked):
+    _, barber = booked
+    api_client.force_authenticate(barber)
+
+    resp = api_client.get(f"{API}/exports/appointments/", {
+        "format": "ndjson", "start_date": "2029-02-01", "end_date": "2029-12-31"
+    })
+
+    lines = b"".join(resp.streaming_content).decode().splitlines()
+    assert resp["Content-Type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["client__username"] for line in lines] == ["ana", "luis"]
+
+
+@pytest.mark.django_db
+def test_payments_export_requires_authentication(api_client, booked):
+    assert api_client.get(f"{API}/exports/payments/").status_code == 401
+
+
+@pytest.mark.django_db
+def test_export_command_writes_every_row(booked, tmp_path):
+    output = tmp_path / "payments.csv"
+
+    call_command("export_data", "payments", "--output", str(output), stderr=io.StringIO())
+
+    with open(output, newline="") as fh:
+        exported = list(csv.DictReader(fh))
+    assert len(exported) == 3
+    assert {row["amount"] for row in exported} == {"150.00"}
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+import pytest
+import rsa
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.auth import crypt, jwt
+from barbershop.google_auth import GoogleIdTokenVerifier, _verifier
+from barbershop.models import UserProfile
+
+API = "/api"
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class KeyServer:
+    """Local stand-in for Google's certificate endpoint"""
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.keys = {}
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/oauth2/v1/certs"
+
+    def add_key(self, kid):
+        public, private = rsa.newkeys(1024)
+        self.keys[kid] = public.save_pkcs1().decode()
+        return crypt.RSASigner.from_string(private.save_pkcs1(), key_id=kid)
+
+    def handler(self):
+        keys = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                keys.requests += 1
+                body = json.dumps(keys.keys).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={keys.max_age}, must-revalidate")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def key_server():
+    server = KeyServer()
+    threading.Thread(target=server.server.serve_forever, daemon=True).start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def id_token(signer, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "ana@example.com",
+        "iat": now,
+        "exp": now + 3600,
+        **claims,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+def test_keys_are_fetched_once_per_max_age_across_logins(key_server):
+    signer = key_server.add_key("key-1")
+    token = id_token(signer)
+    clock = FakeClock()
+    verifier = GoogleIdTokenVerifier(key_server.url, clock=clock)
+
+    # 1,000 logins one second apart with keys cacheable for 300 seconds
+    for _ in range(1000):
+        assert verifier.verify(token, CLIENT_ID)["sub"] == "1234567890"
+        clock.now += 1
+
+    assert verifier.fetches == key_server.requests == 4
+
+
+def test_unknown_key_id_triggers_rate_limited_refetch(key_server):
+    old = key_server.add_key("old")
+    clock = FakeClock()
+    verifier = GoogleIdTokenVerifier(key_server.url, clock=clock)
+    verifier.verify(id_token(old), CLIENT_ID)
+
+    # Google rotated its keys: the new kid is fetched without waiting for max-age
+    new = key_server.add_key("new")
+    clock.now += 61
+    assert verifier.verify(id_token(new), CLIENT_ID)
+    assert key_server.requests == 2
+
+    # A forged kid right afterwards doesn't cause another fetch
+    forged = crypt.RSASigner.from_string(rsa.newkeys(512)[1].save_pkcs1(), key_id="forged")
+    with pytest.raises(ValueError):
+        verifier.verify(id_token(forged), CLIENT_ID)
+    assert key_server.requests == 2
+
+
+def test_wrong_audience_and_issuer_are_rejected(key_server):
+    signer = key_server.add_key("key-1")
+    verifier = GoogleIdTokenVerifier(key_server.url)
+
+    with pytest.raises(ValueError):
+        verifier.verify(id_token(signer, aud="someone-else"), CLIENT_ID)
+    with pytest.raises(ValueError):
+        verifier.verify(id_token(signer, iss="https://evil.example.com"), CLIENT_ID)
+
+
+@pytest.mark.django_db
+def test_google_login_verifies_locally(api_client, key_server, settings, monkeypatch):
+    signer = key_server.add_key("key-1")
+    settings.GOOGLE_CERTS_URL = key_server.url
+    monkeypatch.setenv("GOOGLE_CLIENT_ID", CLIENT_ID)
+    _verifier.cache_clear()
+
+    for _ in range(3):
+        resp = api_client.post(f"{API}/google/", {
+            "id_token": id_token(signer), "role": UserProfile.Roles.CLIENT
+        }, format="json")
+        assert resp.status_code == 200, resp.content
+
+    assert key_server.requests == 1
+    assert resp.json()["user"]["email"] == "ana@example.com"
+    _verifier.cache_clear()
@@ -0,0 +1,175 @@
+import random
+import pytest
+from datetime import datetime, timedelta
+from unittest import mock
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.utils import timezone
+from barbershop import leaderboards
+from barbershop.models import (
+    Appointment, LeaderboardDay, LeaderboardEntry, LeaderboardWindow, Rating, Service, UserProfile
+)
+
+API = "/api"
+
+
+def snapshot(board):
+    entries = {
+        (entry.days, entry.subject_id): (entry.count, entry.total)
+        for entry in LeaderboardEntry.objects.filter(board=board, count__gt=0)
+    }
+    buckets = {
+        (row["subject_id"], row["date"]): (row["count"], row["total"])
+        for row in LeaderboardDay.objects.filter(board=board, count__gt=0).values()
+    }
+    return buckets, entries
+
+
+def recomputed(board):
+    buckets, entries = leaderboards.compute(board)
+    return {(row["subject_id"], row["date"]): (row["count"], row["total"]) for row in buckets}, entries
+
+
+@pytest.mark.django_db
+def test_leaderboards_match_a_full_recomputation(create_user, sample_service):
+    rng = random.Random(11)
+    barbers = [create_user(f"barber{i}", UserProfile.Roles.BARBER) for i in range(3)]
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    services = [sample_service] + [
+        Service.objects.create(name=f"Servicio {i}", duration_minutes=30, price=100) for i in range(3)
+    ]
+    leaderboards.rebuild()
+    start = timezone.make_aware(datetime(2030, 1, 1, 12))
+    appointments, ratings = [], []
+
+    # 14 months of bookings, ratings, edits and deletes, a few days apart
+    for step in range(140):
+        now = start + timedelta(days=3 * step)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            for _ in range(3):
+                appointments.append(Appointment.objects.create(
+                    client=client, barber=rng.choice(barbers), service=rng.choice(services),
+                    appointment_datetime=now + timedelta(days=1), duration_minutes=30,
+                ))
+            ratings.append(Rating.objects.create(
+                appointment=rng.choice(appointments), user=client, score=rng.randint(1, 5)
+            ))
+            if step % 5 == 0:
+                rating = rng.choice(ratings)
+                rating.score = rng.randint(1, 5)
+                rating.save()
+            if step % 7 == 0:
+                appointment = rng.choice(appointments)
+                appointment.service = rng.choice(services)
+                appointment.save()
+            if step % 11 == 0:
+                victim = appointments.pop(rng.randrange(len(appointments)))
+                ratings = [rating for rating in ratings if rating.appointment_id != victim.id]
+                victim.delete()
+            if step % 4 == 0:
+                # Reads expire the days that have left each window
+                leaderboards.top(leaderboards.SERVICES, Service.objects.all())
+                leaderboards.top(leaderboards.BARBERS, UserProfile.objects.all(), field_name="user_id")
+
+    with mock.patch("django.utils.timezone.now", return_value=now + timedelta(days=2)):
+        for board, subjects, field_name in (
+            (leaderboards.SERVICES, Service.objects.all(), "pk"),
+            (leaderboards.BARBERS, UserProfile.objects.all(), "user_id"),
+        ):
+            leaderboards.top(board, subjects, field_name=field_name)
+            assert snapshot(board) == recomputed(board)
+
+    # Every window has something in it, and the buckets stop at the longest one
+    assert {days for days, _ in snapshot(leaderboards.BARBERS)[1]} == set(leaderboards.WINDOWS)
+    oldest = LeaderboardDay.objects.order_by("date").values_list("date", flat=True).first()
+    assert oldest > timezone.localdate(now) - timedelta(days=leaderboards.KEPT_DAYS)
+
+
+@pytest.fixture
+def ranked(create_user, sample_service):
+    """Ratings for three barbers and bookings for three services, today and 100 days ago"""
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    steady = create_user("steady", UserProfile.Roles.BARBER)
+    lucky = create_user("lucky", UserProfile.Roles.BARBER)
+    gone = create_user("gone", UserProfile.Roles.BARBER)
+    beard = Service.objects.create(name="Barba", duration_minutes=15, price=80)
+    retired = Service.objects.create(name="Retirado", duration_minutes=15, price=80, active=False)
+    leaderboards.rebuild()
+
+    def book(barber, service, count, score=None):
+        for _ in range(count):
+            appointment = Appointment.objects.create(
+                client=client, barber=barber, service=service,
+                appointment_datetime=timezone.now() + timedelta(days=1), duration_minutes=30,
+            )
+            if score:
+                Rating.objects.create(appointment=appointment, user=client, score=score)
+
+    with mock.patch("django.utils.timezone.now", return_value=timezone.now() - timedelta(days=100)):
+        book(steady, beard, 6, score=4)
+    book(steady, sample_service, 2, score=5)
+    book(lucky, sample_service, 1, score=5)
+    book(gone, retired, 4, score=5)
+    gone.profile.active = False
+    gone.profile.save()
+    return steady, lucky, sample_service, beard
+
+
+@pytest.mark.django_db
+def test_top_barbers_use_a_bayesian_average(api_client, ranked, django_assert_max_num_queries):
+    steady, lucky, _, _ = ranked
+    api_client.force_authenticate(lucky)
+
+    with django_assert_max_num_queries(3):
+        resp = api_client.get(f"{API}/profiles/top_barbers/")
+
+    data = resp.json()
+    # 8 ratings averaging 4.25 beat a single 5; inactive barbers are left out
+    assert [row["username"] for row in data] == ["steady", "lucky"]
+    assert data[0]["total_ratings"] == 8
+    assert data[0]["average_rating"] == 4.25
+    week = api_client.get(f"{API}/profiles/top_barbers/", {"days": 7}).json()
+    assert [(row["username"], row["total_ratings"]) for row in week] == [("steady", 2), ("lucky", 1)]
+    assert api_client.get(f"{API}/profiles/top_barbers/", {"days": 5}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_popular_services_by_window(api_client, ranked):
+    steady, _, cut, beard = ranked
+    api_client.force_authenticate(steady)
+
+    all_time = api_client.get(f"{API}/services/popular/").json()
+    month = api_client.get(f"{API}/services/popular/", {"days": 30}).json()
+
+    assert [(row["id"], row["booking_count"]) for row in all_time] == [(beard.id, 6), (cut.id, 3)]
+    assert [(row["id"], row["booking_count"]) for row in month] == [(cut.id, 3)]
+
+
+@pytest.mark.django_db
+def test_unbuilt_boards_are_built_once(api_client, create_user, sample_service, monkeypatch):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    Appointment.objects.create(
+        client=barber, barber=barber, service=sample_service,
+        appointment_datetime=timezone.now() + timedelta(days=1), duration_minutes=30,
+    )
+    LeaderboardWindow.objects.all().delete()
+    call_command("rebuild_leaderboards", missing=True)
+    assert LeaderboardWindow.objects.count() == len(leaderboards.BOARDS) * len(leaderboards.WINDOWS)
+    # Built boards are left alone
+    with mock.patch.object(leaderboards, "rebuild") as rebuild:
+        assert leaderboards.build_missing() == []
+    rebuild.assert_not_called()
+
+    # Two first reads at once: the other one commits its build before ours
+    LeaderboardWindow.objects.filter(board=leaderboards.SERVICES).delete()
+    rebuild = leaderboards.rebuild
+
+    def beaten(boards):
+        rebuild(boards)
+        raise IntegrityError("duplicate key value violates unique constraint \"leaderboard_window_key\"")
+
+    monkeypatch.setattr(leaderboards, "rebuild", beaten)
+    api_client.force_authenticate(barber)
+    resp = api_client.get(f"{API}/services/popular/")
+    assert resp.status_code == 200
+    assert [(row["id"], row["booking_count"]) for row in resp.json()] == [(sample_service.id, 1)]
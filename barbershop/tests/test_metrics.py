@@ -0,0 +1,85 @@
+import json
+import re
+import pytest
+from barbershop import metrics
+from barbershop.models import UserProfile
+
+API = "/api"
+
+
+@pytest.fixture
+def store(settings, tmp_path, monkeypatch):
+    """An empty metrics store writing to a temporary directory"""
+    settings.METRICS_DIR = str(tmp_path)
+    settings.METRICS_TOKEN = None
+    settings.METRICS_PUBLIC = True
+    monkeypatch.setattr(metrics, "store", metrics.Store())
+    return tmp_path
+
+
+def sample(text, name, **labels):
+    """Value of one sample in a Prometheus text exposition"""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+@pytest.mark.django_db
+def test_requests_are_recorded_per_url_name(store, api_client, auth_client, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    for _ in range(3):
+        api_client.get(f"{API}/services/")
+    client.get(f"{API}/appointments/")
+    client.get(f"{API}/appointments/999999/")
+
+    text = api_client.get("/metrics").content.decode()
+
+    assert sample(text, "barbershop_http_requests_total", view="service-list", method="GET", status="200") == 3
+    assert sample(text, "barbershop_http_requests_total", view="appointment-detail", method="GET", status="404") == 1
+    listed = dict(view="appointment-list", method="GET")
+    assert sample(text, "barbershop_http_request_duration_seconds_count", **listed) == 1
+    assert sample(text, "barbershop_http_request_duration_seconds_bucket", **listed, le="+Inf") == 1
+    assert sample(text, "barbershop_http_request_queries_sum", **listed) >= 1
+    assert sample(text, "barbershop_http_request_db_seconds_total", **listed) > 0
+    assert sample(text, "barbershop_http_response_size_bytes_sum", **listed) > 0
+
+
+@pytest.mark.django_db
+def test_metrics_add_up_across_workers(store, api_client, sample_service):
+    api_client.get(f"{API}/services/")
+    # Another worker's file, as its Store would write it
+    other = metrics.Store()
+    other.observe("service-list", "GET", 200, 0.02, 1, 0.001, 512)
+    other.observe("service-list", "GET", 500, 2.0, 30, 1.5, 10)
+    other.pid = 1
+    other._write()
+
+    text = api_client.get("/metrics").content.decode()
+
+    assert sample(text, "barbershop_http_requests_total", view="service-list", method="GET", status="200") == 2
+    assert sample(text, "barbershop_http_requests_total", view="service-list", method="GET", status="500") == 1
+    assert sample(text, "barbershop_http_request_queries_bucket", view="service-list", method="GET", le="20") == 2
+    assert sample(text, "barbershop_http_request_queries_count", view="service-list", method="GET") == 3
+    assert json.loads((store / "1.json").read_text())["service-list\tGET"]["statuses"] == {"200": 1, "500": 1}
+
+
+@pytest.mark.django_db
+def test_metrics_are_private_by_default(store, settings, api_client, create_user):
+    settings.METRICS_PUBLIC = False
+
+    assert api_client.get("/metrics").status_code == 403
+    assert api_client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code == 403
+    settings.METRICS_TOKEN = "scrape-me"
+    assert api_client.get("/metrics").status_code == 403
+    assert api_client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code == 403
+    resp = api_client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-me")
+    assert resp.status_code == 200
+    assert resp["Content-Type"].startswith("text/plain; version=0.0.4")
+
+    api_client.force_login(create_user("client", UserProfile.Roles.CLIENT))
+    assert api_client.get("/metrics").status_code == 403
+    staff = create_user("staff", UserProfile.Roles.ADMIN)
+    staff.is_staff = True
+    staff.save()
+    api_client.force_login(staff)
+    assert api_client.get("/metrics").status_code == 200
@@ -1,7 +1,10 @@
 import pytest
-from barbershop.models import BarberSchedule, Appointment, UserProfile
+from barbershop import cache
+from barbershop.models import BarberSchedule, Appointment, UserProfile, Rating, BarberRatingSummary
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
 
 @pytest.mark.django_db
 def test_create_barber_schedule(create_user):
@@ -33,3 +36,76 @@ def test_create_appointment(create_user, sample_service):
     )
 
     assert appt.id is not None
+
+
+def _summary_state(barber):
+    summary = BarberRatingSummary.objects.get(barber=barber)
+    return summary.count, summary.total, summary.distribution
+
+
+@pytest.mark.django_db
+def test_rating_summary_follows_rating_writes(create_user, sample_service):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = create_user("cliente", UserProfile.Roles.CLIENT)
+
+    def rate(score):
+        appt = Appointment.objects.create(
+            client=client,
+            barber=barber,
+            appointment_datetime=timezone.now(),
+            duration_minutes=30,
+            status="completed",
+            service=sample_service
+        )
+        return Rating.objects.create(appointment=appt, user=client, score=score)
+
+    first = rate(5)
+    second = rate(3)
+    assert _summary_state(barber) == (2, 8, {"5": 1, "4": 0, "3": 1, "2": 0, "1": 0})
+
+    second.score = 4
+    second.save()
+    assert _summary_state(barber) == (2, 9, {"5": 1, "4": 1, "3": 0, "2": 0, "1": 0})
+
+    first.delete()
+    summary = BarberRatingSummary.objects.get(barber=barber)
+    assert (summary.count, summary.average) == (1, 4.0)
+
+    # Cascading deletes of the appointment keep the summary in step too
+    second.appointment.delete()
+    assert _summary_state(barber)[:2] == (0, 0)
+
+
+@pytest.mark.django_db
+def test_rebuild_rating_summaries_matches_incremental_totals(create_user, sample_service):
+    client = create_user("cliente", UserProfile.Roles.CLIENT)
+    for name, scores in [("ana", [5, 4, 4, 1]), ("beto", [2]), ("carla", [])]:
+        barber = create_user(name, UserProfile.Roles.BARBER)
+        for score in scores:
+            appt = Appointment.objects.create(
+                client=client,
+                barber=barber,
+                appointment_datetime=timezone.now(),
+                duration_minutes=30,
+                status="completed",
+                service=sample_service
+            )
+            Rating.objects.create(appointment=appt, user=client, score=score)
+
+    fields = ["barber_id", "count", "total", "star_1", "star_2", "star_3", "star_4", "star_5"]
+    incremental = list(BarberRatingSummary.objects.order_by("barber_id").values_list(*fields))
+
+    call_command("rebuild_rating_summaries", stdout=StringIO())
+
+    assert list(BarberRatingSummary.objects.order_by("barber_id").values_list(*fields)) == incremental
+    assert len(incremental) == 2
+
+
+@pytest.mark.django_db
+def test_rebuild_rating_summaries_invalidates_cached_barbers(django_capture_on_commit_callbacks):
+    before = cache.version(cache.BARBERS)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        BarberRatingSummary.rebuild()
+
+    assert cache.version(cache.BARBERS) != before
@@ -0,0 +1,165 @@
+import smtplib
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.utils import timezone
+from barbershop.management.commands import send_notifications
+from barbershop.models import Appointment, Notification, UserProfile
+from barbershop.notifications import LEASE, MAX_ATTEMPTS, deliver_pending
+
+API = "/api"
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+
+
+class WatchingBackend(EmailBackend):
+    """Records the outbox and the transaction depth at sending time"""
+    seen = []
+
+    def send_messages(self, messages):
+        WatchingBackend.seen.append(
+            (list(Notification.objects.values_list("status", flat=True)), len(connection.atomic_blocks))
+        )
+        return super().send_messages(messages)
+
+
+class DownBackend(BaseEmailBackend):
+    def open(self):
+        raise smtplib.SMTPConnectError(421, "unavailable")
+
+
+def book(create_user, sample_service, count=1):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    barber.email = "barber@example.com"
+    barber.save()
+    client = create_user("cliente", UserProfile.Roles.CLIENT)
+    start = timezone.now() + timedelta(days=1)
+    for i in range(count):
+        Appointment.objects.create(
+            client=client,
+            barber=barber,
+            appointment_datetime=start + timedelta(hours=i),
+            duration_minutes=30,
+            service=sample_service
+        )
+
+
+@pytest.mark.django_db
+def test_booking_queues_notification_without_sending(auth_client, create_user, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    barber.email = "barber@example.com"
+    barber.save()
+
+    resp = client.post(f"{API}/appointments/", {
+        "barber_id": barber.id,
+        "service_id": sample_service.id,
+        "appointment_datetime": (timezone.now() + timedelta(days=1)).isoformat(),
+        "duration_minutes": 30,
+    }, format="json")
+
+    assert resp.status_code == 201, resp.content
+    assert mail.outbox == []
+    notification = Notification.objects.get()
+    assert notification.recipient == "barber@example.com"
+    assert notification.status == Notification.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_deliver_pending_sends_batch_over_one_connection(create_user, sample_service):
+    book(create_user, sample_service, count=5)
+    CountingBackend.opened = 0
+
+    result = deliver_pending(connection=CountingBackend())
+
+    assert result == {"sent": 5, "retry": 0, "failed": 0}
+    assert CountingBackend.opened == 1
+    assert len(mail.outbox) == 5
+    assert not Notification.objects.exclude(status=Notification.Status.SENT).exists()
+    assert deliver_pending(connection=CountingBackend()) == {"sent": 0, "retry": 0, "failed": 0}
+
+
+@pytest.mark.django_db
+def test_deliver_pending_backs_off_then_gives_up(create_user, sample_service):
+    book(create_user, sample_service)
+    now = timezone.now()
+
+    assert deliver_pending(now=now, connection=DownBackend())["retry"] == 1
+    notification = Notification.objects.get()
+    assert notification.attempts == 1
+    assert notification.next_attempt_at == now + timedelta(minutes=1)
+    assert "SMTPConnectError" in notification.last_error
+
+    # Not due yet
+    assert deliver_pending(now=now, connection=DownBackend())["retry"] == 0
+
+    for attempt in range(2, MAX_ATTEMPTS + 1):
+        now = Notification.objects.get().next_attempt_at
+        result = deliver_pending(now=now, connection=DownBackend())
+    assert result["failed"] == 1
+    assert Notification.objects.get().status == Notification.Status.FAILED
+
+
+@pytest.mark.django_db
+def test_messages_are_sent_outside_the_claiming_transaction(create_user, sample_service):
+    book(create_user, sample_service, count=2)
+    WatchingBackend.seen = []
+    depth = len(connection.atomic_blocks)
+
+    assert deliver_pending(connection=WatchingBackend())["sent"] == 2
+
+    # Claimed and committed before sending, no transaction left open
+    assert WatchingBackend.seen == [([Notification.Status.SENDING] * 2, depth)] * 2
+    assert not Notification.objects.exclude(status=Notification.Status.SENT).exists()
+
+
+@pytest.mark.django_db
+def test_batches_left_sending_are_claimed_again_after_the_lease(create_user, sample_service):
+    book(create_user, sample_service)
+    now = timezone.now()
+    # A worker claimed the batch, then died
+    Notification.objects.update(status=Notification.Status.SENDING, attempts=1, next_attempt_at=now + LEASE)
+
+    assert deliver_pending(now=now, connection=EmailBackend())["sent"] == 0
+    assert deliver_pending(now=now + LEASE, connection=EmailBackend())["sent"] == 1
+    notification = Notification.objects.get()
+    assert notification.status == Notification.Status.SENT
+    assert notification.attempts == 2
+
+
+class Stop(Exception):
+    pass
+
+
+def test_worker_loop_outlives_errors(monkeypatch):
+    results = [OperationalError("server closed the connection unexpectedly"), {"sent": 1, "retry": 0, "failed": 0}]
+    sleeps, closed = [], []
+
+    def deliver(batch_size):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if not results:
+            raise Stop
+
+    monkeypatch.setattr(send_notifications, "deliver_pending", deliver)
+    monkeypatch.setattr(send_notifications, "close_old_connections", lambda: closed.append(1))
+    monkeypatch.setattr(send_notifications, "time", SimpleNamespace(sleep=sleep))
+    with pytest.raises(Stop):
+        call_command("send_notifications", loop=True, interval=1)
+
+    assert sleeps == [1, 1] and len(closed) == 2
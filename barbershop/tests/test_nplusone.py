@@ -0,0 +1,62 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from barbershop.models import Appointment, Payment, Service, UserProfile
+from barbershop.nplusone import Detector, NPlusOneError, template
+from barbershop.serializers import PaymentSerializer
+
+API = "/api"
+
+
+@pytest.fixture
+def payments(create_user, sample_service):
+    """Five paid appointments with different services"""
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    for i in range(5):
+        service = Service.objects.create(name=f"Servicio {i}", duration_minutes=30, price=100)
+        appointment = Appointment.objects.create(
+            client=client, barber=barber, service=service,
+            appointment_datetime=timezone.now() + timedelta(days=i + 1), duration_minutes=30,
+        )
+        Payment.objects.create(appointment=appointment, amount="100.00", currency="MXN", provider="cash")
+    return client
+
+
+def test_templates_drop_literals_and_in_lists():
+    assert template('SELECT "a" FROM t WHERE id = %s AND name = \'x\' LIMIT 21') == (
+        'SELECT "a" FROM t WHERE id = ? AND name = ? LIMIT ?'
+    )
+    assert template("SELECT * FROM t WHERE id IN (%s, %s, %s)") == template("SELECT * FROM t WHERE id IN (%s)")
+
+
+@pytest.mark.django_db
+def test_detector_names_the_serializer_field(payments):
+    with Detector() as detector:
+        PaymentSerializer(Payment.objects.select_related("appointment"), many=True).data
+
+    sources = ", ".join(sources for _, _, sources in detector.problems())
+    for field in ("service_name", "client_name", "barber_name"):
+        assert f"PaymentSerializer.appointment_details > AppointmentListSerializer.{field}" in sources
+    # One query per payment for each of service, client and barber
+    assert sum(count for _, count, _ in detector.problems()) == 15
+
+
+@pytest.mark.django_db
+def test_list_endpoints_load_relations_up_front(api_client, payments, django_assert_max_num_queries):
+    api_client.force_authenticate(payments)
+
+    # The autouse detect_n_plus_one fixture fails repeated lazy loads
+    with django_assert_max_num_queries(3):
+        assert len(api_client.get(f"{API}/payments/").json()["results"]) == 5
+    assert len(api_client.get(f"{API}/appointments/").json()["results"]) == 5
+
+
+@pytest.mark.django_db
+def test_middleware_raises_in_tests(api_client, payments, monkeypatch):
+    from barbershop import views
+    monkeypatch.setattr(views.PaymentViewSet, "queryset", Payment.objects.all())
+    api_client.force_authenticate(payments)
+
+    with pytest.raises(NPlusOneError, match="PaymentSerializer.appointment_details"):
+        api_client.get(f"{API}/payments/")
@@ -0,0 +1,113 @@
+import base64
+import json
+import pytest
+from datetime import datetime, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from barbershop.models import Appointment, Rating, UserProfile
+
+API = "/api"
+
+
+@pytest.fixture
+def appointments(auth_client, create_user, sample_service):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    start = timezone.make_aware(datetime(2029, 3, 1, 9))
+    # Pairs share a start time, so the id has to break ties
+    Appointment.objects.bulk_create(
+        Appointment(
+            client=user,
+            barber=barber,
+            service=sample_service,
+            appointment_datetime=start + timedelta(hours=i // 2),
+            duration_minutes=30,
+            status="completed",
+        )
+        for i in range(11)
+    )
+    return client, user
+
+
+def walk(client, url):
+    pages = []
+    while url:
+        data = client.get(url).json()
+        pages.append(data)
+        url = data["next"]
+    return pages
+
+
+@pytest.mark.django_db
+def test_cursor_pages_cover_every_row_once_in_order(appointments):
+    client, user = appointments
+    expected = list(
+        Appointment.objects.filter(client=user).order_by("-appointment_datetime", "-id").values_list("id", flat=True)
+    )
+
+    pages = walk(client, f"{API}/appointments/?page_size=4")
+
+    assert [len(page["results"]) for page in pages] == [4, 4, 3]
+    assert [row["id"] for page in pages for row in page["results"]] == expected
+    assert pages[0]["count"] == 11
+    assert pages[0]["previous"] is None
+
+    back = client.get(pages[2]["previous"]).json()
+    assert back["results"] == pages[1]["results"]
+
+
+@pytest.mark.django_db
+def test_count_can_be_skipped(appointments):
+    client, _ = appointments
+
+    with CaptureQueriesContext(connection) as ctx:
+        data = client.get(f"{API}/appointments/history/", {"count": "false", "page_size": 5}).json()
+
+    assert not any("COUNT(" in query["sql"] for query in ctx.captured_queries)
+    assert "count" not in data
+    assert len(data["results"]) == 5
+    assert data["next"]
+
+
+@pytest.mark.django_db
+def test_other_orderings_and_page_numbers_fall_back_to_offsets(appointments):
+    client, _ = appointments
+
+    by_status = client.get(f"{API}/appointments/", {"ordering": "status"}).json()
+    numbered = client.get(f"{API}/appointments/", {"page": 1}).json()
+
+    assert by_status["count"] == numbered["count"] == 11
+    assert by_status["next"] is None and numbered["next"] is None
+
+
+@pytest.mark.django_db
+def test_my_ratings_is_paginated(appointments):
+    client, user = appointments
+    for appt in Appointment.objects.filter(client=user):
+        Rating.objects.create(appointment=appt, user=user, score=4)
+
+    pages = walk(client, f"{API}/ratings/my_ratings/?page_size=5")
+
+    assert [len(page["results"]) for page in pages] == [5, 5, 1]
+    assert len({row["id"] for page in pages for row in page["results"]}) == 11
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("payload", [
+    {"v": "abc", "id": 1},
+    {"v": {"a": 1}, "id": 1},
+    {"v": ["2029-03-01T09:00:00+00:00"], "id": 1},
+    {"v": "2029-03-01T09:00:00+00:00", "id": {"a": 1}},
+    {"v": None, "id": 1},
+    ["2029-03-01T09:00:00+00:00", 1],
+    "not-json",
+])
+def test_tampered_cursors_are_rejected(appointments, payload):
+    client, _ = appointments
+    token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    resp = client.get(f"{API}/appointments/", {"cursor": token})
+
+    assert resp.status_code == 404
+    assert resp.json()["detail"] == "Invalid cursor"
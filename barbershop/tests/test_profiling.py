@@ -0,0 +1,111 @@
+import pstats
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from rest_framework.test import APIClient
+from barbershop import profiling
+from barbershop.authentication import issue_tokens
+from barbershop.models import UserProfile
+
+API = "/api"
+
+
+@pytest.fixture
+def captures(settings, tmp_path):
+    """Profiles go to a temporary directory"""
+    settings.PROFILING_DIR = str(tmp_path)
+    settings.PROFILING_SAMPLE_RATES = {}
+    return tmp_path
+
+
+def saved(directory, suffix=".prof"):
+    return sorted(path for path in directory.iterdir() if path.suffix == suffix)
+
+
+@pytest.mark.django_db
+def test_signed_header_profiles_one_request(captures, auth_client, sample_service):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+
+    client.get(f"{API}/services/", HTTP_X_PROFILE="cpu:forged:signature")
+    assert saved(captures) == []
+
+    resp = client.get(f"{API}/services/", HTTP_X_PROFILE=profiling.sign())
+    client.get(f"{API}/services/")
+
+    assert resp.status_code == 200
+    prof, = saved(captures)
+    assert "service-list-GET" in prof.name
+    assert pstats.Stats(str(prof)).total_calls > 0
+    summary, = saved(captures, ".txt")
+    assert "status: 200" in summary.read_text()
+    assert "trigger: header" in summary.read_text()
+
+
+@pytest.mark.django_db
+def test_unwritable_profile_dir_still_answers(captures, settings, auth_client, sample_service, caplog):
+    blocked = captures / "not-a-directory"
+    blocked.write_text("")
+    settings.PROFILING_DIR = str(blocked)
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+
+    resp = client.get(f"{API}/services/", HTTP_X_PROFILE=profiling.sign(profiling.MEMORY))
+
+    assert resp.status_code == 200
+    assert "Could not save profile" in caplog.text
+
+
+def bearer(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(user).access_token}")
+    return client
+
+
+@pytest.mark.django_db
+def test_query_flag_is_for_admins_only(captures, create_user, monkeypatch):
+    sessions = []
+    client = bearer(create_user("client", UserProfile.Roles.CLIENT))
+    with monkeypatch.context() as patch:
+        patch.setattr(profiling, "_Session", lambda *args: sessions.append(args))
+        APIClient().get(f"{API}/services/", {"_profile": "1"})
+        client.get(f"{API}/payments/", {"_profile": "memory"})
+    # Nobody but an admin gets the profiler started, saved or not
+    assert sessions == []
+
+    admin = bearer(create_user("admin", UserProfile.Roles.ADMIN))
+    admin.get(f"{API}/payments/", {"_profile": "memory"})
+    summary, = saved(captures, ".txt")
+    assert "tracemalloc peak" in summary.read_text()
+
+
+@pytest.mark.django_db
+def test_sampling_and_ring_bound(captures, settings, auth_client):
+    settings.PROFILING_SAMPLE_RATES = {"payment-list": 1.0}
+    settings.PROFILING_MAX_CAPTURES = 2
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+
+    for _ in range(3):
+        client.get(f"{API}/payments/")
+    client.get(f"{API}/appointments/")
+
+    assert len(saved(captures)) == 2
+    assert len(saved(captures, ".txt")) == 2
+    assert all("payment-list" in path.name for path in saved(captures))
+
+
+@pytest.mark.django_db
+def test_captures_page_lists_and_serves_captures(captures, auth_client, sample_service):
+    staff = User.objects.create_user("staff", password="1234", is_staff=True)
+    browser = Client()
+    assert browser.get("/admin/profiles/").status_code == 302
+    browser.force_login(staff)
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    client.get(f"{API}/services/", HTTP_X_PROFILE=profiling.sign())
+    prof, = saved(captures)
+
+    page = browser.get("/admin/profiles/")
+    download = browser.get(f"/admin/profiles/{prof.name}")
+
+    assert prof.stem in page.content.decode()
+    assert download["Content-Disposition"].startswith("attachment")
+    assert b"".join(download.streaming_content) == prof.read_bytes()
+    assert browser.get("/admin/profiles/..%2Fsecret.txt").status_code == 404
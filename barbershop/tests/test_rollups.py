@@ -0,0 +1,224 @@
+import io
+import random
+import pytest
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from django.core.management import call_command
+from django.db import OperationalError
+from django.utils import timezone
+from barbershop import rollups, transitions
+from barbershop.management.commands import refresh_stats
+from barbershop.models import (
+    Appointment, BarberSchedule, DailyBarberStats, Payment, RollupWatermark, Service, UserProfile
+)
+
+API = "/api"
+
+KEY = ("barber_id", "service_id", "date", "status")
+VALUES = (
+    "appointments", "payments", "payments_pending", "payments_completed",
+    "payments_refunded", "payment_amount", "revenue",
+)
+
+
+def snapshot():
+    return {
+        tuple(row[field] for field in KEY): tuple(row[field] for field in VALUES)
+        for row in DailyBarberStats.objects.values(*KEY, *VALUES)
+    }
+
+
+def recomputed():
+    """The rollup as a full rebuild would produce it"""
+    incremental = snapshot()
+    rollups.refresh(full=True)
+    return incremental, snapshot()
+
+
+@pytest.fixture
+def history(create_user, sample_service):
+    """Two barbers with 60 appointments and some payments over 20 days"""
+    rng = random.Random(7)
+    barbers = [create_user(f"barber{i}", UserProfile.Roles.BARBER) for i in range(2)]
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    beard = Service.objects.create(name="Barba", duration_minutes=15, price=80)
+    origin = timezone.make_aware(datetime(2029, 5, 1, 9))
+    appointments = []
+    for i in range(60):
+        appointments.append(Appointment.objects.create(
+            client=client,
+            barber=rng.choice(barbers),
+            service=rng.choice([sample_service, beard]),
+            appointment_datetime=origin + timedelta(days=i % 20, minutes=30 * (i // 20)),
+            duration_minutes=30,
+            status=rng.choice(list(Appointment.Status.values)),
+        ))
+    for appointment in appointments[::3]:
+        Payment.objects.create(
+            appointment=appointment, amount="120.50", currency="MXN", provider="cash",
+            status=rng.choice(list(Payment.Status.values)),
+        )
+    return barbers, appointments
+
+
+@pytest.mark.django_db
+def test_incremental_refresh_matches_full_rebuild(history):
+    barbers, appointments = history
+    # Age the fixture rows past the refresh overlap
+    hour_ago = timezone.now() - timedelta(hours=1)
+    Appointment.objects.update(updated_at=hour_ago)
+    Payment.objects.update(updated_at=hour_ago)
+    assert rollups.refresh(full=True) is None
+    RollupWatermark.objects.update(value=hour_ago + timedelta(minutes=30))
+
+    # Changes of every kind since the first refresh
+    appointments[0].status = Appointment.Status.CANCELED
+    appointments[0].save()
+    appointments[1].appointment_datetime += timedelta(days=3)
+    appointments[1].save()
+    appointments[2].barber = barbers[1] if appointments[2].barber == barbers[0] else barbers[0]
+    appointments[2].save()
+    appointments[3].delete()
+    appointments[4].active = False
+    appointments[4].save()
+    Payment.objects.filter(appointment=appointments[6]).delete()
+    Payment.objects.create(appointment=appointments[7], amount="99.99", currency="MXN", provider="card")
+
+    refreshed = rollups.refresh()
+
+    incremental, full = recomputed()
+    assert incremental == full
+    # Only the touched days were recomputed
+    assert 0 < refreshed <= 10
+
+
+@pytest.mark.django_db
+def test_bulk_reschedule_refreshes_the_day_left(history, create_user):
+    _, appointments = history
+    admin = create_user("admin", UserProfile.Roles.ADMIN)
+    moved = next(a for a in appointments if a.status == Appointment.Status.BOOKED)
+    new_time = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=400)
+    BarberSchedule.objects.create(
+        barber=moved.barber, day_of_week=new_time.isoweekday(), start_time=time(9), end_time=time(18)
+    )
+    rollups.refresh()
+
+    result, = transitions.reschedule(admin, [(moved.id, new_time)])
+    assert "error" not in result
+    rollups.refresh()
+
+    incremental, full = recomputed()
+    assert incremental == full
+
+
+@pytest.mark.django_db
+def test_stats_endpoints_read_the_rollup(history, api_client, django_assert_max_num_queries):
+    barbers, _ = history
+    barber = barbers[0]
+    rollups.refresh()
+    api_client.force_authenticate(barber)
+    raw = Appointment.objects.filter(barber=barber, active=True)
+
+    with django_assert_max_num_queries(2):
+        stats = api_client.get(f"{API}/stats-json/").json()
+    assert stats == {
+        "total_completed": raw.filter(status="completed").count(),
+        "total_canceled": raw.filter(status="canceled").count(),
+        "total_booked": raw.filter(status="booked").count(),
+    }
+
+    top = api_client.get(f"{API}/top-services/").json()
+    assert sum(row["total"] for row in top) == raw.count()
+    assert top == sorted(top, key=lambda row: -row["total"])
+
+    payments = api_client.get(f"{API}/payments/stats/").json()
+    assert payments["total_payments"] == Payment.objects.filter(appointment__barber=barber).count()
+
+
+@pytest.mark.django_db
+def test_stats_time_series(history, auth_client):
+    client, _ = auth_client(UserProfile.Roles.ADMIN)
+    rollups.refresh()
+
+    resp = client.get(f"{API}/appointments/stats/", {
+        "start_date": "2029-05-03", "end_date": "2029-05-09", "series": "day"
+    })
+
+    data = resp.json()
+    assert [row["period"] for row in data["series"]] == [f"2029-05-{day:02d}" for day in range(3, 10)]
+    assert sum(row["total"] for row in data["series"]) == data["total"] == 21
+    assert client.get(f"{API}/appointments/stats/", {"series": "hour"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_stats_refresh_the_days_changed_since_the_last_run(history, api_client, django_assert_num_queries):
+    barbers, appointments = history
+    barber = barbers[0]
+    api_client.force_authenticate(barber)
+    before = api_client.get(f"{API}/stats-json/").json()
+
+    # No refresh ran, yet the change is counted
+    changed = next(a for a in appointments if a.barber == barber and a.status == Appointment.Status.BOOKED)
+    changed.status = Appointment.Status.CANCELED
+    changed.save()
+    after = api_client.get(f"{API}/stats-json/").json()
+    assert after["total_booked"] == before["total_booked"] - 1
+    assert after["total_canceled"] == before["total_canceled"] + 1
+
+    # Nothing changed since: one query to check, one to read
+    with django_assert_num_queries(2):
+        api_client.get(f"{API}/stats-json/")
+
+
+@pytest.mark.django_db
+def test_reads_never_rebuild_or_wait_for_a_refresh(history, api_client, monkeypatch):
+    barbers, appointments = history
+    api_client.force_authenticate(barbers[0])
+
+    # Never built: deploy's refresh_stats builds it, not the first read
+    RollupWatermark.objects.all().delete()
+    assert api_client.get(f"{API}/stats-json/").json()["total_booked"] == 0
+    assert not DailyBarberStats.objects.exists()
+
+    rollups.refresh()
+    before = api_client.get(f"{API}/stats-json/").json()
+    changed = next(a for a in appointments if a.barber == barbers[0] and a.status == Appointment.Status.BOOKED)
+    changed.status = Appointment.Status.CANCELED
+    changed.save()
+
+    # Another refresh holds the watermark (NOWAIT fails): serve the rows as they are
+    def locked(watermark, full):
+        raise OperationalError("could not obtain lock on row in relation \"barbershop_rollupwatermark\"")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(rollups, "_refresh", locked)
+        assert api_client.get(f"{API}/stats-json/").json() == before
+    assert api_client.get(f"{API}/stats-json/").json()["total_booked"] == before["total_booked"] - 1
+
+
+class Stop(Exception):
+    pass
+
+
+def test_refresh_loop_outlives_errors(monkeypatch):
+    results = [OperationalError("server closed the connection unexpectedly"), 3]
+    sleeps, closed = [], []
+
+    def refresh(full):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if not results:
+            raise Stop
+
+    monkeypatch.setattr(refresh_stats, "refresh", refresh)
+    monkeypatch.setattr(refresh_stats, "close_old_connections", lambda: closed.append(1))
+    monkeypatch.setattr(refresh_stats, "time", SimpleNamespace(sleep=sleep))
+    with pytest.raises(Stop):
+        call_command("refresh_stats", loop=True, interval=1, stdout=io.StringIO())
+
+    assert sleeps == [1, 1] and len(closed) == 2
@@ -0,0 +1,89 @@
+import pytest
+from datetime import date, datetime, time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from barbershop import schedule_cache, schedules
+from barbershop.cache import bump
+from barbershop.models import BarberSchedule, UserProfile
+
+API = "/api"
+MONDAY = date(2030, 1, 7)
+
+
+def at(hour, minute=0):
+    return timezone.make_aware(datetime.combine(MONDAY, time(hour, minute)))
+
+
+@pytest.fixture
+def barber(create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    BarberSchedule.objects.create(barber=barber, day_of_week=1, start_time=time(14), end_time=time(19))
+    BarberSchedule.objects.create(barber=barber, day_of_week=1, start_time=time(9), end_time=time(13))
+    BarberSchedule.objects.create(barber=barber, day_of_week=2, start_time=time(9), end_time=time(13), active=False)
+    return barber
+
+
+@pytest.mark.django_db
+def test_windows_are_found_without_schedule_queries(auth_client, barber):
+    client, _ = auth_client(UserProfile.Roles.CLIENT)
+    assert schedule_cache.week(barber.id) == {1: [(time(9), time(13)), (time(14), time(19))]}
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.post(f"{API}/appointments/check_availability/", {
+            "barber_id": barber.id, "appointment_datetime": "2030-01-07T14:00:00", "duration_minutes": 30,
+        })
+
+    assert resp.json()["schedule"] == {"day_of_week": 1, "start_time": "14:00:00", "end_time": "19:00:00"}
+    assert not any("barberschedule" in query["sql"] for query in ctx.captured_queries)
+    assert schedule_cache.window_at(barber.id, at(9)) == (time(9), time(13))
+    assert schedule_cache.window_at(barber.id, at(13)) == (time(9), time(13))
+    assert schedule_cache.window_at(barber.id, at(13, 30)) is None
+    assert schedule_cache.window_at(barber.id, at(19)) == (time(14), time(19))
+
+
+@pytest.mark.django_db
+def test_schedule_changes_reach_every_worker(barber, django_capture_on_commit_callbacks):
+    schedule_cache.week(barber.id)
+
+    # Another worker saves a window: only the shared version moves
+    BarberSchedule.objects.filter(barber=barber, day_of_week=2).update(active=True)
+    assert 2 not in schedule_cache.week(barber.id)
+    bump(f"schedules:{barber.id}")
+    assert schedule_cache.week(barber.id)[2] == [(time(9), time(13))]
+
+    # Deletes send post_delete for every row
+    with django_capture_on_commit_callbacks(execute=True):
+        BarberSchedule.objects.filter(barber=barber, start_time=time(9)).delete()
+    assert schedule_cache.week(barber.id) == {1: [(time(14), time(19))]}
+
+
+@pytest.mark.django_db
+def test_moving_a_window_or_bulk_creating_invalidates(barber, create_user, django_capture_on_commit_callbacks):
+    other = create_user("other", UserProfile.Roles.BARBER)
+    schedule_cache.weeks([barber.id, other.id])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        window = BarberSchedule.objects.get(barber=barber, start_time=time(14))
+        window.barber = other
+        window.save()
+    assert schedule_cache.week(barber.id) == {1: [(time(9), time(13))]}
+    assert schedule_cache.week(other.id) == {1: [(time(14), time(19))]}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        created, errors = schedules.bulk_create([
+            {"barber": other.id, "day_of_week": 3, "start_time": "10:00", "end_time": "12:00"},
+        ])
+    assert not errors
+    assert schedule_cache.week(other.id)[3] == [(time(10), time(12))]
+
+
+@pytest.mark.django_db
+def test_weeks_expire_even_without_a_version_bump(barber, settings):
+    schedule_cache.week(barber.id)
+    # A change this worker never hears about, e.g. a bump lost with the cache
+    BarberSchedule.objects.filter(barber=barber, day_of_week=2).update(active=True)
+    assert 2 not in schedule_cache.week(barber.id)
+
+    settings.SCHEDULE_CACHE_TTL = 0
+    assert schedule_cache.week(barber.id)[2] == [(time(9), time(13))]
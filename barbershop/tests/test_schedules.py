@@ -0,0 +1,86 @@
+import pytest
+from datetime import time
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from barbershop.models import BarberSchedule, UserProfile
+
+API = "/api"
+URL = f"{API}/schedules/bulk_create/"
+
+
+def window(barber, day, start, end):
+    return {"barber": barber.id, "day_of_week": day, "start_time": start, "end_time": end}
+
+
+@pytest.fixture
+def admin(auth_client):
+    client, _ = auth_client(UserProfile.Roles.ADMIN)
+    return client
+
+
+@pytest.mark.django_db
+def test_two_thousand_rows_in_a_handful_of_queries(admin):
+    # 300 barbers x 7 days, minus 100
+    users = User.objects.bulk_create(User(username=f"barber{i}") for i in range(300))
+    UserProfile.objects.bulk_create(UserProfile(user=user, role=UserProfile.Roles.BARBER) for user in users)
+    rows = [window(user, day, "09:00", "18:00") for user in users for day in range(1, 8)][:2000]
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = admin.post(URL, {"schedules": rows}, format="json")
+
+    assert resp.status_code == 201, resp.content
+    assert resp.json()["total_created"] == 2000
+    assert BarberSchedule.objects.count() == 2000
+    inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+    # roles + lock + existing windows + batched INSERTs + transaction control
+    assert len(ctx.captured_queries) - len(inserts) <= 6
+    assert len(inserts) <= 2000 // connection.ops.bulk_batch_size(["a"] * 7, []) + 1
+
+
+@pytest.mark.django_db
+def test_atomic_mode_creates_nothing_on_any_error(admin, create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = create_user("client", UserProfile.Roles.CLIENT)
+
+    resp = admin.post(URL, {"schedules": [
+        window(barber, 1, "09:00", "13:00"),
+        window(client, 1, "09:00", "13:00"),
+        window(barber, 2, "18:00", "09:00"),
+    ]}, format="json")
+
+    assert resp.status_code == 400
+    assert [error["index"] for error in resp.json()["errors"]] == [1, 2]
+    assert resp.json()["errors"][0]["errors"] == {"barber": ["User must have barber role"]}
+    assert not BarberSchedule.objects.exists()
+
+
+@pytest.mark.django_db
+def test_best_effort_keeps_the_first_of_overlapping_windows(admin, create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    BarberSchedule.objects.create(barber=barber, day_of_week=3, start_time="09:00", end_time="12:00")
+
+    resp = admin.post(URL, {"mode": "best_effort", "schedules": [
+        window(barber, 1, "09:00", "13:00"),
+        window(barber, 1, "12:00", "15:00"),
+        window(barber, 1, "13:00", "18:00"),
+        window(barber, 3, "11:00", "14:00"),
+        window(barber, 4, "09:00", "18:00"),
+    ]}, format="json")
+
+    assert resp.status_code == 201
+    assert resp.json()["total_created"] == 3
+    assert [error["index"] for error in resp.json()["errors"]] == [1, 3]
+    assert set(BarberSchedule.objects.values_list("day_of_week", "start_time")) == {
+        (1, time(9)), (1, time(13)), (3, time(9)), (4, time(9))
+    }
+
+
+@pytest.mark.django_db
+def test_unknown_mode_is_rejected(admin, create_user):
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+
+    resp = admin.post(URL, {"mode": "some", "schedules": [window(barber, 1, "09:00", "13:00")]}, format="json")
+
+    assert resp.status_code == 400
+    assert "error" in resp.json()
@@ -0,0 +1,74 @@
+import pytest
+from collections import defaultdict
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from barbershop.models import (
+    Appointment, BarberRatingSummary, BarberSchedule, CalendarEvent, DailyBarberStats, LeaderboardEntry,
+    Payment, Rating, Service,
+)
+
+SCALE = {"barbers": 6, "clients": 20, "appointments": 600, "days": 60, "future_days": 14, "password_hashes": 1}
+
+
+def seed(**options):
+    call_command("seed_barbershop", **{**SCALE, **options})
+
+
+def unseed():
+    User.objects.all().delete()
+    Service.objects.all().delete()
+
+
+def snapshot():
+    return list(Appointment.objects.order_by("id").values_list(
+        "barber__username", "client__username", "service__name", "appointment_datetime", "status",
+        "ratings__score", "payments__status", "calendar_events__external_event_id",
+    ))
+
+
+@pytest.mark.django_db
+def test_histories_fit_the_schedules(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        seed(workers=1)
+
+    assert Appointment.objects.count() == 600
+    assert User.objects.count() == 27
+    assert User.objects.get(username="client0").check_password("1234")
+
+    windows = defaultdict(dict)
+    for schedule in BarberSchedule.objects.all():
+        windows[schedule.barber_id][schedule.day_of_week] = (schedule.start_time, schedule.end_time)
+    previous = {}
+    for appointment in Appointment.objects.order_by("barber", "appointment_datetime"):
+        start = appointment.appointment_datetime
+        end = start + timedelta(minutes=appointment.duration_minutes)
+        opens, closes = windows[appointment.barber_id][start.isoweekday()]
+        assert opens <= start.time() and end.time() <= closes
+        assert previous.get(appointment.barber_id, start) <= start
+        previous[appointment.barber_id] = end
+        if start > timezone.now():
+            assert appointment.status != Appointment.Status.COMPLETED
+
+    assert not Rating.objects.exclude(appointment__status=Appointment.Status.COMPLETED).exists()
+    assert Payment.objects.exists() and CalendarEvent.objects.exists()
+    # bulk-loaded rows have their derived tables rebuilt
+    assert sum(summary.count for summary in BarberRatingSummary.objects.all()) == Rating.objects.count()
+    assert DailyBarberStats.objects.exists() and LeaderboardEntry.objects.exists()
+
+
+@pytest.mark.django_db
+def test_same_seed_same_data_with_any_number_of_workers():
+    seed(workers=1)
+    first = snapshot()
+    with pytest.raises(CommandError):
+        seed(workers=1)
+
+    unseed()
+    seed(workers=2)
+    assert snapshot() == first
+
+    unseed()
+    seed(workers=1, seed=1)
+    assert snapshot() != first
@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime, time, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from barbershop.models import (
+    Appointment, BarberSchedule, CalendarEvent, CalendarSyncTask, UserProfile
+)
+
+API = "/api"
+
+
+@pytest.fixture
+def day(create_user, sample_service):
+    """A barber with five booked appointments tomorrow from 10:00"""
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    client = create_user("client", UserProfile.Roles.CLIENT)
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    start = timezone.make_aware(datetime.combine(tomorrow, time(10)))
+    BarberSchedule.objects.create(
+        barber=barber, day_of_week=tomorrow.isoweekday(), start_time=time(9), end_time=time(18)
+    )
+    appointments = Appointment.objects.bulk_create(
+        Appointment(
+            client=client, barber=barber, service=sample_service,
+            appointment_datetime=start + timedelta(hours=i), duration_minutes=30,
+        )
+        for i in range(5)
+    )
+    return barber, client, [appointment.id for appointment in appointments]
+
+
+@pytest.mark.django_db
+def test_bulk_complete_reports_each_id(api_client, day, create_user):
+    barber, _, ids = day
+    Appointment.objects.filter(pk=ids[0]).update(status=Appointment.Status.CANCELED)
+    other = create_user("other", UserProfile.Roles.BARBER)
+    foreign = Appointment.objects.create(
+        client=other, barber=other, service=Appointment.objects.get(pk=ids[1]).service,
+        appointment_datetime=timezone.now() + timedelta(days=3), duration_minutes=30,
+    )
+    api_client.force_authenticate(barber)
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = api_client.post(f"{API}/appointments/bulk_complete/", {"ids": ids + [foreign.id]}, format="json")
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [result.get("status") for result in results] == [None, "completed", "completed", "completed", "completed", None]
+    assert results[0]["error"] == "Only booked appointments can be completed. Current status: canceled"
+    assert results[-1]["error"] == "Appointment not found"
+    assert resp.json()["updated"] == 4
+    assert sum(query["sql"].startswith("UPDATE") for query in ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_only_the_barber_or_an_admin_can_complete(api_client, day):
+    _, client, ids = day
+    api_client.force_authenticate(client)
+
+    resp = api_client.post(f"{API}/appointments/bulk_complete/", {"ids": ids}, format="json")
+
+    assert resp.status_code == 400
+    assert not Appointment.objects.filter(status=Appointment.Status.COMPLETED).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_cancel_appends_the_reason_and_queues_calendar_sync(auth_client, day):
+    admin, _ = auth_client(UserProfile.Roles.ADMIN)
+    _, _, ids = day
+    Appointment.objects.filter(pk=ids[1]).update(notes="Bring photo")
+    CalendarEvent.objects.create(appointment_id=ids[1], external_event_id="evt-1")
+
+    resp = admin.post(f"{API}/appointments/bulk_cancel/", {"ids": ids[:2], "reason": "Closed"}, format="json")
+
+    assert resp.json()["updated"] == 2
+    notes = dict(Appointment.objects.filter(pk__in=ids[:2]).values_list("id", "notes"))
+    assert notes[ids[0]] == "[CANCELED by test_admin]: Closed"
+    assert notes[ids[1]] == "Bring photo\n[CANCELED by test_admin]: Closed"
+    assert list(CalendarSyncTask.objects.values_list("appointment_id", flat=True)) == [ids[1]]
+
+
+@pytest.mark.django_db
+def test_bulk_reschedule_checks_hours_and_overlaps(api_client, day):
+    _, client, ids = day
+    first = Appointment.objects.get(pk=ids[0]).appointment_datetime
+    api_client.force_authenticate(client)
+
+    resp = api_client.post(f"{API}/appointments/bulk_reschedule/", {"appointments": [
+        # 10:00 -> 15:30, free
+        {"id": ids[0], "appointment_datetime": (first + timedelta(hours=5, minutes=30)).isoformat()},
+        # 11:00 -> 15:45, now taken by the move above
+        {"id": ids[1], "appointment_datetime": (first + timedelta(hours=5, minutes=45)).isoformat()},
+        # 12:00 -> 13:15, overlaps the 13:00 booking
+        {"id": ids[2], "appointment_datetime": (first + timedelta(hours=3, minutes=15)).isoformat()},
+        # 13:00 -> 20:00, after hours
+        {"id": ids[3], "appointment_datetime": (first + timedelta(hours=10)).isoformat()},
+        # 14:00 -> 14:10, overlaps only itself
+        {"id": ids[4], "appointment_datetime": (first + timedelta(hours=4, minutes=10)).isoformat()},
+    ]}, format="json")
+
+    results = resp.json()["results"]
+    assert [result.get("error") for result in results] == [
+        None,
+        "Time slot conflicts with existing appointment",
+        "Time slot conflicts with existing appointment",
+        "Barber is not working at this time",
+        None,
+    ]
+    moved = Appointment.objects.get(pk=ids[0])
+    assert moved.appointment_datetime == first + timedelta(hours=5, minutes=30)
+    assert moved.notes.startswith("[RESCHEDULED]: ")
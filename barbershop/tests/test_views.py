@@ -1,7 +1,7 @@
 import pytest
 from django.utils import timezone
 from datetime import timedelta
-from barbershop.models import Appointment, UserProfile, BarberSchedule
+from barbershop.models import Appointment, UserProfile, BarberSchedule, Rating
 
 API = "/api"   # prefijo general
 
@@ -110,3 +110,67 @@ def test_barber_stats(auth_client, sample_service):
 
     assert resp.status_code == 200
     assert data["completed"] == 1
+
+
+@pytest.mark.django_db
+def test_barbers_list_has_rating_stats_in_constant_queries(
+    auth_client, create_user, sample_service, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+
+    def add_barber(name, scores):
+        barber = create_user(name, UserProfile.Roles.BARBER)
+        for score in scores:
+            appt = Appointment.objects.create(
+                client=user,
+                barber=barber,
+                appointment_datetime=timezone.now(),
+                duration_minutes=30,
+                status="completed",
+                service=sample_service
+            )
+            Rating.objects.create(appointment=appt, user=user, score=score)
+        return barber
+
+    add_barber("ana", [5, 4, 4])
+    add_barber("beto", [])
+
+    # page count + page rows
+    with django_assert_num_queries(2):
+        resp = client.get(f"{API}/profiles/barbers/")
+    stats = {row["username"]: (row["average_rating"], row["total_ratings"]) for row in resp.json()["results"]}
+    assert stats == {"ana": (4.33, 3), "beto": (0, 0)}
+
+    # New barbers invalidate the cached directory on commit
+    with django_capture_on_commit_callbacks(execute=True):
+        for i in range(10):
+            add_barber(f"barber{i}", [3, 5])
+    with django_assert_num_queries(2):
+        resp = client.get(f"{API}/profiles/barbers/")
+    assert resp.json()["count"] == 12
+
+
+@pytest.mark.django_db
+def test_barber_stats_reads_the_rating_summary(auth_client, create_user, sample_service):
+    client, user = auth_client(UserProfile.Roles.CLIENT)
+    barber = create_user("barber", UserProfile.Roles.BARBER)
+    for score in [5, 5, 2]:
+        appt = Appointment.objects.create(
+            client=user,
+            barber=barber,
+            appointment_datetime=timezone.now(),
+            duration_minutes=30,
+            status="completed",
+            service=sample_service
+        )
+        resp = client.post(f"{API}/ratings/", {"appointment": appt.id, "appointment_id": appt.id, "score": score}, format="json")
+        assert resp.status_code == 201, resp.content
+
+    data = client.get(f"{API}/ratings/barber_stats/", {"barber_id": barber.id}).json()
+    assert data["average_score"] == 4.0
+    assert data["total_ratings"] == 3
+    assert data["rating_distribution"] == {"5": 2, "4": 0, "3": 0, "2": 1, "1": 0}
+    assert len(data["recent_reviews"]) == 3
+
+    empty = client.get(f"{API}/ratings/barber_stats/", {"barber_id": user.id}).json()
+    assert (empty["average_score"], empty["total_ratings"]) == (0, 0)
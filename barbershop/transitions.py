@@ -0,0 +1,221 @@
+"""
+Bulk appointment state transitions.
+
+Completing or canceling a list of appointments reads them in one query,
+checks each against the same rules as the single-appointment endpoints and
+moves every eligible one with a single UPDATE, scoped to the appointments
+the user can see. Rescheduling checks working hours and overlaps for the
+whole batch in memory and writes the new times with one bulk_update().
+
+update() sends no post_save, so the calendar sync hook runs once for the
+batch (calendar_sync.appointments_changed). Every function returns one
+result per requested id, in request order: {"id", "status"} on success or
+{"id", "error"}.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, TextField, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import calendar_sync, rollups, schedule_cache
+from .booking import lock_barbers
+from .models import Appointment, MAX_APPOINTMENT_MINUTES, UserProfile
+from .scoping import filter_appointments, role_of
+
+
+NOT_FOUND = "Appointment not found"
+CHANGED = "Appointment was changed by another request"
+
+
+def _visible(user):
+    return filter_appointments(Appointment.objects.all(), user, {})
+
+
+def _rows(user, ids, *fields):
+    return {
+        row['id']: row
+        for row in _visible(user).filter(pk__in=ids).values('id', 'status', 'barber_id', 'client_id', *fields)
+    }
+
+
+def _transition(user, ids, check, new_status, **changes):
+    """
+    Move the appointments passing ``check(row)`` (an error message or None)
+    from booked to ``new_status`` with one UPDATE
+    """
+    ids = list(dict.fromkeys(ids))
+    rows = _rows(user, ids)
+    errors = {}
+    for appointment_id in ids:
+        row = rows.get(appointment_id)
+        error = NOT_FOUND if row is None else check(row)
+        if error:
+            errors[appointment_id] = error
+
+    eligible = [appointment_id for appointment_id in ids if appointment_id not in errors]
+    if eligible:
+        now = timezone.now()
+        with transaction.atomic():
+            updated = _visible(user).filter(
+                pk__in=eligible, status=Appointment.Status.BOOKED
+            ).update(status=new_status, updated_at=now, **changes)
+            if updated != len(eligible):
+                # Some changed between the read and the UPDATE; ours carry ``now``
+                moved = set(Appointment.objects.filter(
+                    pk__in=eligible, status=new_status, updated_at=now
+                ).values_list('id', flat=True))
+                errors.update({appointment_id: CHANGED for appointment_id in eligible if appointment_id not in moved})
+                eligible = [appointment_id for appointment_id in eligible if appointment_id in moved]
+            calendar_sync.appointments_changed(eligible)
+
+    return [
+        {"id": appointment_id, "error": errors[appointment_id]} if appointment_id in errors
+        else {"id": appointment_id, "status": new_status}
+        for appointment_id in ids
+    ]
+
+
+def complete(user, ids):
+    """Mark booked appointments completed (their barber or an admin)"""
+    is_admin = role_of(user) == UserProfile.Roles.ADMIN
+
+    def check(row):
+        if not (is_admin or row['barber_id'] == user.id):
+            return "Only the assigned barber or admin can complete appointments"
+        if row['status'] != Appointment.Status.BOOKED:
+            return f"Only booked appointments can be completed. Current status: {row['status']}"
+        return None
+
+    return _transition(user, ids, check, Appointment.Status.COMPLETED)
+
+
+def cancel(user, ids, reason='No reason provided'):
+    """Cancel booked appointments (their client, their barber or an admin)"""
+    is_admin = role_of(user) == UserProfile.Roles.ADMIN
+    note = f"[CANCELED by {user.username}]: {reason}"
+
+    def check(row):
+        if not (is_admin or user.id in (row['client_id'], row['barber_id'])):
+            return "You don't have permission to cancel this appointment"
+        if row['status'] == Appointment.Status.CANCELED:
+            return "Appointment is already canceled"
+        if row['status'] == Appointment.Status.COMPLETED:
+            return "Cannot cancel completed appointment"
+        return None
+
+    return _transition(
+        user, ids, check, Appointment.Status.CANCELED,
+        notes=Case(
+            When(notes='', then=Value(note)),
+            default=Concat('notes', Value(f"\n{note}")),
+            output_field=TextField()
+        )
+    )
+
+
+def _works_at(windows, start):
+    moment = timezone.localtime(start).time()
+    return any(window_start <= moment <= window_end for window_start, window_end in windows)
+
+
+def _overlaps(busy, start, end, appointment_id):
+    """
+    Whether [start, end) overlaps an interval in ``busy`` (sorted (start, end, id)
+    tuples) other than the appointment's own current one
+    """
+    earliest = start - timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+    # Walk back from the last interval starting before ``end``
+    for index in range(bisect_left(busy, (end,)) - 1, -1, -1):
+        other_start, other_end, other_id = busy[index]
+        if other_start <= earliest:
+            break
+        if other_end > start and other_id != appointment_id:
+            return True
+    return False
+
+
+def reschedule(user, moves):
+    """
+    Move booked appointments to new start times; ``moves`` are
+    (id, aware datetime) pairs.
+
+    Slots vacated by other moves in the same batch stay taken: each move is
+    checked against the current bookings plus the moves accepted before it.
+    """
+    moves = list(dict(moves).items())
+    ids = [appointment_id for appointment_id, _ in moves]
+    is_admin = role_of(user) == UserProfile.Roles.ADMIN
+    now = timezone.now()
+    errors = {}
+    accepted = []
+
+    with transaction.atomic():
+        rows = _rows(user, ids, 'appointment_datetime', 'duration_minutes', 'notes')
+        candidates = []
+        for appointment_id, start in moves:
+            row = rows.get(appointment_id)
+            if row is None:
+                errors[appointment_id] = NOT_FOUND
+            elif not (is_admin or row['client_id'] == user.id):
+                errors[appointment_id] = "Only the client or admin can reschedule appointments"
+            elif row['status'] != Appointment.Status.BOOKED:
+                errors[appointment_id] = "Only booked appointments can be rescheduled"
+            elif start < now:
+                errors[appointment_id] = "Cannot book appointments in the past"
+            else:
+                candidates.append((row, start))
+
+        barber_ids = sorted({row['barber_id'] for row, _ in candidates})
+        weeks = {}
+        busy = defaultdict(list)
+        if candidates:
+            lock_barbers(barber_ids)
+            weeks = schedule_cache.weeks(barber_ids)
+
+            starts = [start for _, start in candidates]
+            for appointment_id, barber_id, start, minutes in Appointment.objects.filter(
+                barber_id__in=barber_ids
+            ).booked().filter(
+                appointment_datetime__gt=min(starts) - timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+                appointment_datetime__lt=max(starts) + timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+            ).values_list('id', 'barber_id', 'appointment_datetime', 'duration_minutes'):
+                busy[barber_id].append((start, start + timedelta(minutes=minutes), appointment_id))
+            for intervals in busy.values():
+                intervals.sort()
+
+        for row, start in candidates:
+            appointment_id, barber_id = row['id'], row['barber_id']
+            end = start + timedelta(minutes=row['duration_minutes'])
+            if not _works_at(weeks[barber_id].get(timezone.localtime(start).isoweekday(), []), start):
+                errors[appointment_id] = "Barber is not working at this time"
+                continue
+            if _overlaps(busy[barber_id], start, end, appointment_id):
+                errors[appointment_id] = "Time slot conflicts with existing appointment"
+                continue
+            insort(busy[barber_id], (start, end, appointment_id))
+            note = f"[RESCHEDULED]: {row['appointment_datetime'].isoformat()} -> {start.isoformat()}"
+            accepted.append(Appointment(
+                id=appointment_id,
+                appointment_datetime=start,
+                notes=f"{row['notes']}\n{note}".strip(),
+                updated_at=now,
+            ))
+
+        Appointment.objects.bulk_update(accepted, ['appointment_datetime', 'notes', 'updated_at'])
+        # bulk_update sends no pre_save; the days the appointments left need a rollup refresh
+        moved = {appointment.id for appointment in accepted}
+        rollups.mark_dirty(
+            (row['barber_id'], row['appointment_datetime']) for row, _ in candidates if row['id'] in moved
+        )
+        calendar_sync.appointments_changed([appointment.id for appointment in accepted])
+
+    new_times = {appointment.id: appointment.appointment_datetime for appointment in accepted}
+    return [
+        {"id": appointment_id, "error": errors[appointment_id]} if appointment_id in errors
+        else {"id": appointment_id, "status": Appointment.Status.BOOKED, "appointment_datetime": new_times[appointment_id]}
+        for appointment_id in ids
+    ]
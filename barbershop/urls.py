@@ -8,6 +8,7 @@ from .views import (
     RatingViewSet, 
     PaymentViewSet, 
     CalendarEventViewSet,
+    ExportViewSet,
     LoginAPIView,
     GoogleLoginAPIView,
     RegisterAPIView,
@@ -30,6 +31,7 @@ router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'ratings', RatingViewSet, basename='rating')
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'calendar-events', CalendarEventViewSet, basename='calendarevent')
+router.register(r'exports', ExportViewSet, basename='export')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
@@ -3,38 +3,41 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q, Avg, Count, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta, time
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-# Google Modules
-from google.auth.transport import requests
-from google.oauth2 import id_token
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
 from django.shortcuts import render
 from .permissions import IsBarberOrAdmin
 from django.contrib.auth.decorators import login_required, user_passes_test
 from googleapiclient.errors import HttpError
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 import os
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .models import (
     UserProfile, Service, BarberSchedule,
-    Appointment, Rating, Payment, CalendarEvent
+    Appointment, Rating, Payment, CalendarEvent,
+    BarberRatingSummary, CalendarCredential, MAX_APPOINTMENT_MINUTES
 )
 from .serializers import (
     UserProfileSerializer, ServiceSerializer, BarberScheduleSerializer,
     AppointmentListSerializer, AppointmentDetailSerializer, RatingSerializer,
     PaymentSerializer, CalendarEventSerializer, BarberAvailabilitySerializer,
-    AppointmentCancelSerializer, UserSerializer
+    AppointmentCancelSerializer, UserSerializer, AvailabilitySearchSerializer,
+    AvailableSlotSerializer, BarberProfileSerializer, BulkAppointmentIdsSerializer,
+    BulkRescheduleSerializer, StatsQuerySerializer, LeaderboardQuerySerializer
 )
 from .permissions import IsBarberOrAdmin, IsClientOrAdmin, IsOwnerOrAdmin
+from .authentication import issue_tokens
+from .pagination import AppointmentKeysetPagination, CreatedAtKeysetPagination
+from .scoping import filter_appointments, filter_payments, role_of
+from .cache import cached_response, BARBERS, SERVICES
+from .conditional import ConditionalGetMixin
+from . import availability, booking, calendar_sync, exports, google_auth, leaderboards, rollups, schedule_cache, schedules, transitions
 
 
 def index(request):
@@ -48,6 +51,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     - GET /profiles/ - List all profiles
     - GET /profiles/me/ - Get current user profile
     - GET /profiles/barbers/ - List all active barbers
+    - GET /profiles/top_barbers/ - Best rated active barbers
     - GET /profiles/{id}/ - Get specific profile
     - PUT /profiles/{id}/ - Update profile
     - PATCH /profiles/{id}/ - Partial update
@@ -73,9 +77,15 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         # Others only see active profiles
         return queryset.filter(active=True)
     
+    def get_serializer_class(self) -> type:
+        """Barber listings carry rating stats"""
+        if self.action == 'barbers':
+            return BarberProfileSerializer
+        return UserProfileSerializer
+    
     def get_permissions(self):
         """Custom permissions for different actions"""
-        if self.action in ['me', 'barbers']:
+        if self.action in ['me', 'barbers', 'top_barbers']:
             return [IsAuthenticated()]
         elif self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsOwnerOrAdmin()]
@@ -88,7 +98,8 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         GET /profiles/me/
         """
         try:
-            profile = request.user.profile
+            # request.user.profile may be built from token claims; read the row
+            profile = UserProfile.objects.select_related('user').get(user_id=request.user.id)
             serializer = self.get_serializer(profile)
             return Response(serializer.data)
         except UserProfile.DoesNotExist:
@@ -98,35 +109,54 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             )
     
     @action(detail=False, methods=['get'])
+    @cached_response(BARBERS)
     def barbers(self, request):
         """
-        List all active barbers with their stats
+        List all active barbers with their stats (paginated, cached per role)
         GET /profiles/barbers/
         """
-        barbers = self.queryset.filter(
+        # Rating stats come from the summary row joined into the same query
+        barbers = self.filter_queryset(self.queryset.filter(
             role=UserProfile.Roles.BARBER,
             active=True
-        )
+        )).select_related('user__rating_summary')
         
-        # Add rating stats
-        barber_data = []
-        for barber in barbers:
-            serializer = self.get_serializer(barber)
-            data = serializer.data
-            
-            # Calculate average rating
-            ratings = Rating.objects.filter(appointment__barber=barber.user)
-            stats = ratings.aggregate(
-                avg_rating=Avg('score'),
-                total_ratings=Count('id')
-            )
-            
-            data['average_rating'] = round(stats['avg_rating'], 2) if stats['avg_rating'] else 0
-            data['total_ratings'] = stats['total_ratings']
-            
-            barber_data.append(data)
+        page = self.paginate_queryset(barbers)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         
-        return Response(barber_data)
+        serializer = self.get_serializer(barbers, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def top_barbers(self, request):
+        """
+        Active barbers by Bayesian-average rating, over the last
+        ?days=7|30|365 or all time
+        GET /profiles/top_barbers/
+        """
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        ranked = leaderboards.top(
+            leaderboards.BARBERS,
+            self.queryset.filter(role=UserProfile.Roles.BARBER, active=True, user__is_active=True),
+            days=query.validated_data.get('days', leaderboards.ALL_TIME),
+            limit=query.validated_data.get('limit', 10),
+            field_name='user_id',
+        )
+        
+        data = [
+            {
+                **UserProfileSerializer(profile).data,
+                "total_ratings": entry.count,
+                "average_rating": round(entry.total / entry.count, 2),
+                "score": round(entry.score, 3),
+            }
+            for profile, entry in ranked
+        ]
+        return Response(data)
     
     @action(detail=True, methods=['patch'])
     def toggle_active(self, request, pk=None):
@@ -151,13 +181,14 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         })
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing barbershop services
     
     Endpoints:
     - GET /services/ - List all services (public)
     - POST /services/ - Create service (barber/admin)
+    - GET /services/popular/ - Most booked services
     - GET /services/{id}/ - Get service details
     - PUT /services/{id}/ - Update service (barber/admin)
     - DELETE /services/{id}/ - Deactivate service (barber/admin)
@@ -185,19 +216,35 @@ class ServiceViewSet(viewsets.ModelViewSet):
         
         return queryset.filter(active=True)
     
+    @cached_response(SERVICES)
+    def list(self, request, *args, **kwargs):
+        """
+        List services, served from the cache per role until a service changes
+        GET /services/
+        """
+        return super().list(request, *args, **kwargs)
+    
     @action(detail=False, methods=['get'])
     def popular(self, request):
         """
-        Get most popular services by booking count
+        Get most popular services by booking count, over the last
+        ?days=7|30|365 or all time
         GET /services/popular/
         """
-        # Count appointments for each service
-        services = self.get_queryset().annotate(
-            booking_count=Count('appointment')
-        ).order_by('-booking_count')[:5]
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        ranked = leaderboards.top(
+            leaderboards.SERVICES, self.get_queryset(),
+            days=query.validated_data.get('days', leaderboards.ALL_TIME),
+            limit=query.validated_data.get('limit', 5),
+        )
         
-        serializer = self.get_serializer(services, many=True)
-        return Response(serializer.data)
+        data = [
+            {**self.get_serializer(service).data, "booking_count": entry.count}
+            for service, entry in ranked
+        ]
+        return Response(data)
     
     def perform_destroy(self, instance):
         """Soft delete - just mark as inactive"""
@@ -205,7 +252,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
         instance.save()
 
 
-class BarberScheduleViewSet(viewsets.ModelViewSet):
+class BarberScheduleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing barber schedules
     
@@ -261,7 +308,8 @@ class BarberScheduleViewSet(viewsets.ModelViewSet):
         """
         Create multiple schedule entries at once
         POST /schedules/bulk_create/
-        Body: {"schedules": [{barber, day_of_week, start_time, end_time}, ...]}
+        Body: {"schedules": [{barber, day_of_week, start_time, end_time}, ...],
+               "mode": "atomic" (default, all or nothing) | "best_effort"}
         """
         if not hasattr(request.user, 'profile') or request.user.profile.role not in [UserProfile.Roles.BARBER, UserProfile.Roles.ADMIN]:
             return Response(
@@ -270,48 +318,53 @@ class BarberScheduleViewSet(viewsets.ModelViewSet):
             )
         
         schedules_data = request.data.get('schedules', [])
+        mode = request.data.get('mode', schedules.ATOMIC)
         
-        if not schedules_data:
+        if not schedules_data or not isinstance(schedules_data, list):
             return Response(
                 {"error": "No schedules provided"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if mode not in schedules.MODES:
+            return Response(
+                {"error": f"mode must be one of: {', '.join(schedules.MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        created_schedules = []
-        errors = []
-        
-        for schedule_data in schedules_data:
-            serializer = self.get_serializer(data=schedule_data)
-            if serializer.is_valid():
-                serializer.save()
-                created_schedules.append(serializer.data)
-            else:
-                errors.append(serializer.errors)
+        created, errors = schedules.bulk_create(schedules_data, mode)
         
         return Response({
-            "created": created_schedules,
+            "created": self.get_serializer(created, many=True).data,
             "errors": errors,
-            "total_created": len(created_schedules)
-        }, status=status.HTTP_201_CREATED if created_schedules else status.HTTP_400_BAD_REQUEST)
+            "total_created": len(created)
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments with advanced booking logic
     
     Endpoints:
-    - GET /appointments/ - List appointments
+    - GET /appointments/ - List appointments (cursor paginated, ?count=false skips the total)
     - GET /appointments/?status=booked - Filter by status
     - GET /appointments/upcoming/ - Upcoming appointments
     - GET /appointments/history/ - Past appointments
     - POST /appointments/ - Book appointment
     - POST /appointments/check_availability/ - Check time slot
+    - GET /appointments/available_slots/ - Free slots for a barber-day
+    - GET /appointments/search_slots/ - Earliest free slots across barbers
     - PATCH /appointments/{id}/cancel/ - Cancel appointment
     - PATCH /appointments/{id}/complete/ - Complete appointment
     - PATCH /appointments/{id}/reschedule/ - Reschedule appointment
+    - POST /appointments/bulk_complete/ - Complete many appointments
+    - POST /appointments/bulk_cancel/ - Cancel many appointments
+    - POST /appointments/bulk_reschedule/ - Reschedule many appointments
     """
-    queryset = Appointment.objects.select_related('client', 'barber').all()
+    queryset = Appointment.objects.select_related('client', 'barber', 'service').all()
     permission_classes = [IsAuthenticated]
+    pagination_class = AppointmentKeysetPagination
+    # Only upcoming/ is conditional; the paginated list skips the validator query
+    conditional_list = False
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['appointment_datetime', 'created_at', 'status']
     ordering = ['-appointment_datetime']
@@ -324,54 +377,26 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter appointments based on user role and query params"""
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Admin sees all
-        if hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN:
-            pass
-        # Barbers see their appointments
-        elif hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.BARBER:
-            queryset = queryset.filter(barber=user)
-        # Clients see their own appointments
-        else:
-            queryset = queryset.filter(client=user)
-        
-        # Filter by status
-        status_param = self.request.query_params.get('status')
-        if status_param:
-            queryset = queryset.filter(status=status_param)
-        
-        # Filter by barber
-        barber_id = self.request.query_params.get('barber_id')
-        if barber_id:
-            queryset = queryset.filter(barber_id=barber_id)
-        
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(appointment_datetime__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(appointment_datetime__lte=end_date)
-        
-        return queryset.filter(active=True)
+        return filter_appointments(super().get_queryset(), self.request.user, self.request.query_params)
     
     def perform_create(self, serializer):
-        """Set client to current user if not admin"""
+        """Set client to current user if not admin, and refuse double bookings"""
         user = self.request.user
         
         # If user is not admin, force them as the client
         if not (hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN): # type: ignore
-            serializer.save(client=user)
+            booking.book(serializer, client=user)
         else:
-            serializer.save()
+            booking.book(serializer)
+    
+    def perform_update(self, serializer):
+        """Refuse moving a booking onto a taken slot, like reschedule/"""
+        booking.update(serializer)
     
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         """
-        Get upcoming appointments for current user
+        Get upcoming appointments for current user (supports If-None-Match)
         GET /appointments/upcoming/
         """
         user = request.user
@@ -383,22 +408,26 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 appointment_datetime__gte=now,
                 status=Appointment.Status.BOOKED,
                 active=True
-            ).order_by('appointment_datetime')[:10]
+            )
         else:
             appointments = self.queryset.filter(
                 client=user,
                 appointment_datetime__gte=now,
                 status=Appointment.Status.BOOKED,
                 active=True
-            ).order_by('appointment_datetime')[:10]
+            )
         
-        serializer = AppointmentListSerializer(appointments, many=True)
-        return Response(serializer.data)
+        # The validator covers every upcoming row, so the first 10 changing
+        # as appointments pass also changes the ETag
+        def render():
+            serializer = AppointmentListSerializer(appointments.order_by('appointment_datetime')[:10], many=True)
+            return Response(serializer.data)
+        return self.conditional(appointments, render)
     
     @action(detail=False, methods=['get'])
     def history(self, request):
         """
-        Get past appointments (completed or canceled)
+        Get past appointments (completed or canceled), cursor paginated
         GET /appointments/history/
         """
         user = request.user
@@ -416,8 +445,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 active=True
             ).order_by('-appointment_datetime')
         
-        serializer = AppointmentListSerializer(appointments, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(appointments)
+        serializer = AppointmentListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def check_availability(self, request):
@@ -436,6 +466,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        try:
+            duration_minutes = int(duration_minutes)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "duration_minutes must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < duration_minutes <= MAX_APPOINTMENT_MINUTES:
+            return Response(
+                {"error": f"duration_minutes must be between 1 and {MAX_APPOINTMENT_MINUTES}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
             appointment_dt = datetime.fromisoformat(appointment_datetime.replace('Z', '+00:00'))
             if timezone.is_naive(appointment_dt):
@@ -469,19 +512,10 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Check barber schedule
-        day_of_week = appointment_dt.isoweekday()  # Monday=1, Sunday=7
-        appointment_time = appointment_dt.time()
-        
-        schedule = BarberSchedule.objects.filter(
-            barber_id=barber_id,
-            day_of_week=day_of_week,
-            start_time__lte=appointment_time,
-            end_time__gte=appointment_time,
-            active=True
-        ).first()
+        # Check barber schedule (from the per-process schedule cache)
+        window = schedule_cache.window_at(barber.id, appointment_dt)
         
-        if not schedule:
+        if not window:
             return Response({
                 "available": False,
                 "reason": "Barber is not working at this time",
@@ -489,40 +523,82 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 "datetime": appointment_datetime
             })
         
-        # Check for conflicting appointments
+        # Check for conflicting appointments (overlap is computed in the database)
         end_dt = appointment_dt + timedelta(minutes=duration_minutes)
-        conflicts = Appointment.objects.filter(
-            barber_id=barber_id,
-            status=Appointment.Status.BOOKED,
-            active=True,
-            appointment_datetime__lt=end_dt
-        ).filter(
-            appointment_datetime__gte=appointment_dt - timedelta(minutes=120)
-        )
-        
-        # Check if any conflict overlaps
-        for conflict in conflicts:
-            conflict_end = conflict.appointment_datetime + timedelta(minutes=conflict.duration_minutes)
-            if not (end_dt <= conflict.appointment_datetime or appointment_dt >= conflict_end):
-                return Response({
-                    "available": False,
-                    "reason": "Time slot conflicts with existing appointment",
-                    "barber_id": barber_id,
-                    "datetime": appointment_datetime,
-                    "conflict_time": conflict.appointment_datetime.isoformat()
-                })
+        conflict_time = availability.find_conflict(barber_id, appointment_dt, end_dt)
+        if conflict_time is not None:
+            return Response({
+                "available": False,
+                "reason": "Time slot conflicts with existing appointment",
+                "barber_id": barber_id,
+                "datetime": appointment_datetime,
+                "conflict_time": conflict_time.isoformat()
+            })
         
         return Response({
             "available": True,
             "barber_id": barber_id,
             "datetime": appointment_datetime,
             "schedule": {
-                "day_of_week": schedule.day_of_week,
-                "start_time": str(schedule.start_time),
-                "end_time": str(schedule.end_time)
+                "day_of_week": appointment_dt.isoweekday(),
+                "start_time": str(window[0]),
+                "end_time": str(window[1])
             }
         })
-    
+
+    @action(detail=False, methods=['get'])
+    def available_slots(self, request):
+        """
+        List every free start time for a barber on one day
+        GET /appointments/available_slots/?barber_id=X&date=YYYY-MM-DD&service_id=Y&step_minutes=15
+        (duration_minutes=N can be sent instead of service_id)
+        """
+        serializer = BarberAvailabilitySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        slots = availability.available_slots(
+            params['barber_id'],
+            params['date'],
+            params['duration_minutes'],
+            params['step_minutes']
+        )
+
+        return Response(BarberAvailabilitySerializer({
+            **params,
+            "available_slots": [timezone.localtime(slot).time() for slot in slots]
+        }).data)
+
+    @action(detail=False, methods=['get'])
+    def search_slots(self, request):
+        """
+        Find the earliest free slots for a service across barbers and days
+        GET /appointments/search_slots/?service_id=Y&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        Optional: barber_ids=1&barber_ids=2, step_minutes, limit, per_barber
+        """
+        serializer = AvailabilitySearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        service = params['service']
+
+        slots = availability.search_slots(
+            service.duration_minutes,
+            params['start_date'],
+            params['end_date'],
+            barber_ids=params.get('barber_ids'),
+            step_minutes=params['step_minutes'],
+            limit=params['limit'],
+            per_barber=params.get('per_barber')
+        )
+
+        return Response({
+            "service_id": service.id,
+            "start_date": params['start_date'],
+            "end_date": params['end_date'],
+            "duration_minutes": service.duration_minutes,
+            "slots": AvailableSlotSerializer(slots, many=True).data
+        })
+
     @action(detail=True, methods=['patch'])
     def cancel(self, request, pk=None):
         """
@@ -631,36 +707,92 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
         
         old_datetime = appointment.appointment_datetime
-        appointment.appointment_datetime = datetime.fromisoformat(new_datetime.replace('Z', '+00:00'))
-        appointment.notes = f"{appointment.notes}\n[RESCHEDULED]: {old_datetime.isoformat()} -> {new_datetime}".strip()
-        appointment.save()
+        booking.reschedule(
+            appointment,
+            datetime.fromisoformat(new_datetime.replace('Z', '+00:00')),
+            f"[RESCHEDULED]: {old_datetime.isoformat()} -> {new_datetime}"
+        )
         
         return Response(
             AppointmentDetailSerializer(appointment).data,
             status=status.HTTP_200_OK
         )
     
+    @action(detail=False, methods=['post'])
+    def bulk_complete(self, request):
+        """
+        Mark several appointments as completed (barber/admin), one UPDATE
+        POST /appointments/bulk_complete/
+        Body: {ids: [1, 2, ...]}
+        """
+        serializer = BulkAppointmentIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._bulk_response(transitions.complete(request.user, serializer.validated_data['ids']))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_cancel(self, request):
+        """
+        Cancel several appointments, one UPDATE
+        POST /appointments/bulk_cancel/
+        Body: {ids: [1, 2, ...], reason: "optional reason"}
+        """
+        serializer = BulkAppointmentIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._bulk_response(transitions.cancel(
+            request.user, serializer.validated_data['ids'], serializer.validated_data['reason']
+        ))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_reschedule(self, request):
+        """
+        Reschedule several appointments (client/admin)
+        POST /appointments/bulk_reschedule/
+        Body: {appointments: [{id: 1, appointment_datetime: "new datetime"}, ...]}
+        """
+        serializer = BulkRescheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        moves = [(item['id'], item['appointment_datetime']) for item in serializer.validated_data['appointments']]
+        return self._bulk_response(transitions.reschedule(request.user, moves))
+    
+    def _bulk_response(self, results):
+        """Per-id results; 200 when any appointment changed, else 400"""
+        updated = sum('error' not in result for result in results)
+        return Response(
+            {"results": results, "updated": updated, "failed": len(results) - updated},
+            status=status.HTTP_200_OK if updated else status.HTTP_400_BAD_REQUEST
+        )
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
         Get appointment statistics
-        GET /appointments/stats/
+        GET /appointments/stats/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&series=day|week|month
+        Barber and admin figures come from the daily rollup (manage.py refresh_stats)
         """
+        params = StatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start_date, end_date = params.validated_data.get('start_date'), params.validated_data.get('end_date')
+        series = params.validated_data.get('series')
         user = request.user
+        role = role_of(user)
         
-        if hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.BARBER:
-            appointments = self.queryset.filter(barber=user)
-        elif hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN:
-            appointments = self.queryset.all()
-        else:
-            appointments = self.queryset.filter(client=user)
+        if role in (UserProfile.Roles.BARBER, UserProfile.Roles.ADMIN):
+            rows = rollups.stats_rows(user.id if role == UserProfile.Roles.BARBER else None, start_date, end_date)
+            return Response(rollups.summarize(rows, rollups.APPOINTMENT_AGGREGATES, series))
         
-        stats = appointments.aggregate(
-            total=Count('id'),
-            booked=Count('id', filter=Q(status=Appointment.Status.BOOKED)),
-            completed=Count('id', filter=Q(status=Appointment.Status.COMPLETED)),
-            canceled=Count('id', filter=Q(status=Appointment.Status.CANCELED))
-        )
+        # A client's own appointments are few enough to count directly
+        appointments = self.queryset.filter(client=user, active=True)
+        if start_date:
+            appointments = appointments.filter(appointment_datetime__date__gte=start_date)
+        if end_date:
+            appointments = appointments.filter(appointment_datetime__date__lte=end_date)
+        
+        stats = rollups.summarize(appointments, {
+            'total': Count('id'),
+            'booked': Count('id', filter=Q(status=Appointment.Status.BOOKED)),
+            'completed': Count('id', filter=Q(status=Appointment.Status.COMPLETED)),
+            'canceled': Count('id', filter=Q(status=Appointment.Status.CANCELED))
+        }, series, date_field='appointment_datetime')
         
         return Response(stats)
 
@@ -680,6 +812,7 @@ class RatingViewSet(viewsets.ModelViewSet):
     queryset = Rating.objects.select_related('appointment', 'user').all()
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'score']
     ordering = ['-created_at']
@@ -700,6 +833,19 @@ class RatingViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsOwnerOrAdmin()]
         return super().get_permissions()
     
+    # Writes run in a transaction so the rating summary signals commit with them
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+    
     @action(detail=False, methods=['get'])
     def barber_stats(self, request):
         """
@@ -708,50 +854,38 @@ class RatingViewSet(viewsets.ModelViewSet):
         """
         barber_id = request.query_params.get('barber_id')
         
-        if not barber_id:
+        if not barber_id or not barber_id.isdigit():
             return Response(
                 {"error": "barber_id is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        ratings = Rating.objects.filter(appointment__barber_id=barber_id)
-        stats = ratings.aggregate(
-            average_score=Avg('score'),
-            total_ratings=Count('id'),
-            five_star=Count('id', filter=Q(score=5)),
-            four_star=Count('id', filter=Q(score=4)),
-            three_star=Count('id', filter=Q(score=3)),
-            two_star=Count('id', filter=Q(score=2)),
-            one_star=Count('id', filter=Q(score=1))
-        )
+        # Totals are maintained incrementally, so this is a primary-key lookup
+        summary = BarberRatingSummary.objects.filter(barber_id=barber_id).first() \
+            or BarberRatingSummary(barber_id=barber_id)
         
         # Get recent reviews
-        recent_reviews = ratings.order_by('-created_at')[:5]
+        recent_reviews = self.queryset.filter(appointment__barber_id=barber_id).order_by('-created_at')[:5]
         recent_reviews_data = RatingSerializer(recent_reviews, many=True).data
         
         return Response({
             "barber_id": barber_id,
-            "average_score": round(stats['average_score'], 2) if stats['average_score'] else 0,
-            "total_ratings": stats['total_ratings'],
-            "rating_distribution": {
-                "5": stats['five_star'],
-                "4": stats['four_star'],
-                "3": stats['three_star'],
-                "2": stats['two_star'],
-                "1": stats['one_star']
-            },
+            "average_score": summary.average,
+            "total_ratings": summary.count,
+            "rating_distribution": summary.distribution,
             "recent_reviews": recent_reviews_data
         })
     
     @action(detail=False, methods=['get'])
     def my_ratings(self, request):
         """
-        Get ratings created by current user
+        Get ratings created by current user, cursor paginated
         GET /ratings/my_ratings/
         """
-        ratings = self.queryset.filter(user=request.user)
-        serializer = self.get_serializer(ratings, many=True)
-        return Response(serializer.data)
+        ratings = self.queryset.filter(user=request.user).order_by('-created_at')
+        page = self.paginate_queryset(ratings)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -765,24 +899,21 @@ class PaymentViewSet(viewsets.ModelViewSet):
     - PUT /payments/{id}/ - Update payment
     - PATCH /payments/{id}/mark_paid/ - Mark as paid
     """
-    queryset = Payment.objects.select_related('appointment').all()
+    # appointment_details renders the appointment's client, barber and service
+    queryset = Payment.objects.select_related(
+        'appointment__client', 'appointment__barber', 'appointment__service'
+    ).all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['paid_at', 'created_at', 'amount']
-    ordering = ['-paid_at']
+    # paid_at is empty until payment, so newest first by creation (keyset paginated)
+    ordering = ['-created_at']
     
     def get_queryset(self):
         """Users can only see their own payments"""
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN:
-            return queryset
-        
-        return queryset.filter(
-            Q(appointment__client=user) | Q(appointment__barber=user)
-        )
+        return filter_payments(super().get_queryset(), self.request.user, {})
     
     @action(detail=True, methods=['patch'])
     def mark_paid(self, request, pk=None):
@@ -814,25 +945,34 @@ class PaymentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
-        Get payment statistics
-        GET /payments/stats/
+        Get payment statistics, by appointment date
+        GET /payments/stats/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&series=day|week|month
+        Barber and admin figures come from the daily rollup (manage.py refresh_stats)
         """
+        params = StatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start_date, end_date = params.validated_data.get('start_date'), params.validated_data.get('end_date')
+        series = params.validated_data.get('series')
         user = request.user
+        role = role_of(user)
         
-        if hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.ADMIN:
-            payments = self.queryset.all()
-        elif hasattr(user, 'profile') and user.profile.role == UserProfile.Roles.BARBER:
-            payments = self.queryset.filter(appointment__barber=user)
-        else:
-            payments = self.queryset.filter(appointment__client=user)
-        
-        stats = payments.aggregate(
-            total_amount=Sum('amount'),
-            total_payments=Count('id'),
-            pending=Count('id', filter=Q(status=Payment.Status.PENDING)),
-            completed=Count('id', filter=Q(status=Payment.Status.COMPLETED)),
-            refunded=Count('id', filter=Q(status=Payment.Status.REFUNDED))
-        )
+        if role in (UserProfile.Roles.BARBER, UserProfile.Roles.ADMIN):
+            rows = rollups.stats_rows(user.id if role == UserProfile.Roles.BARBER else None, start_date, end_date)
+            return Response(rollups.summarize(rows, rollups.PAYMENT_AGGREGATES, series))
+        
+        payments = self.queryset.filter(appointment__client=user, appointment__active=True)
+        if start_date:
+            payments = payments.filter(appointment__appointment_datetime__date__gte=start_date)
+        if end_date:
+            payments = payments.filter(appointment__appointment_datetime__date__lte=end_date)
+        
+        stats = rollups.summarize(payments, {
+            'total_amount': Sum('amount'),
+            'total_payments': Count('id'),
+            'pending': Count('id', filter=Q(status=Payment.Status.PENDING)),
+            'completed': Count('id', filter=Q(status=Payment.Status.COMPLETED)),
+            'refunded': Count('id', filter=Q(status=Payment.Status.REFUNDED))
+        }, series, date_field='appointment__appointment_datetime')
         
         return Response(stats)
 
@@ -866,9 +1006,9 @@ class CalendarEventViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def sync(self, request):
         """
-        Sync an appointment to Google Calendar
+        Queue an appointment for Google Calendar sync
         POST /calendar-events/sync/
-        Body: {appointment_id, access_token}
+        Body: {appointment_id, access_token, refresh_token (optional)}
         """
         appointment_id = request.data.get('appointment_id')
         provider = request.data.get('provider', 'google_calendar')
@@ -905,53 +1045,75 @@ class CalendarEventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
         
-        # Create temporary credentials with the access_token
-        try:
-            creds = Credentials(token=access_token)
-            service = build('calendar', 'v3', credentials=creds)
-        except Exception as e:
-            return Response({"error": f"Google Calendar connection failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Build event body
-        start_time = appointment.appointment_datetime
-        end_time = appointment.appointment_datetime + timedelta(minutes=appointment.duration_minutes)
-        event_body = {
-            'summary': f'Cita con {appointment.client.username}',
-            'description': (
-                f'Servicio: {appointment.service.name}\n'
-                f'Cliente: {appointment.client.username}\n'
-                f'Notas: {appointment.notes or "Sin notas"}'
-            ),
-            'start': {'dateTime': start_time.isoformat(), 'timeZone': 'America/Mexico_City'},
-            'end': {'dateTime': end_time.isoformat(), 'timeZone': 'America/Mexico_City'},
-            'reminders': {
-                'useDefault': False,
-                'overrides': [{'method': 'popup', 'minutes': 30}]
-            }
-        }
-
-        try:
-            event = service.events().insert(calendarId='primary', body=event_body).execute()
-            external_event_id = event['id']
-        except Exception as e:
-            return Response({"error": f"Failed to create Google Calendar event: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Save event
-        calendar_event = CalendarEvent.objects.create(
-            appointment=appointment,
-            external_event_id=external_event_id,
-            provider=provider,
-            synced_at=timezone.now()
-        )
+        # The worker (manage.py sync_calendar) talks to Google with the stored token
+        with transaction.atomic():
+            CalendarCredential.objects.update_or_create(
+                barber_id=appointment.barber_id,
+                defaults={
+                    "access_token": access_token,
+                    "refresh_token": request.data.get('refresh_token') or ""
+                }
+            )
+            task = calendar_sync.enqueue(appointment)
 
         return Response(
             {
-                "message": "Appointment synced to Google Calendar successfully",
-                "event": CalendarEventSerializer(calendar_event).data
+                "message": "Appointment queued for Google Calendar sync",
+                "task_id": task.id,
+                "status": task.status
             },
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_202_ACCEPTED
         )
 
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Streaming exports for reporting
+
+    Endpoints:
+    - GET /exports/appointments/ - Appointments as CSV (?format=ndjson for NDJSON)
+    - GET /exports/payments/ - Payments
+    - GET /exports/ratings/ - Ratings
+
+    Rows are scoped by role like the list endpoints and accept the same
+    start_date / end_date (and, for appointments, status / barber_id) filters.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [exports.CSVRenderer, exports.NDJSONRenderer]
+
+    def _export(self, request, name):
+        fmt = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            exports.stream(name, fmt, request.user, request.query_params),
+            content_type=request.accepted_renderer.media_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def appointments(self, request):
+        """
+        Export appointments
+        GET /exports/appointments/?start_date=2025-01-01&end_date=2025-12-31
+        """
+        return self._export(request, 'appointments')
+
+    @action(detail=False, methods=['get'])
+    def payments(self, request):
+        """
+        Export payments
+        GET /exports/payments/?format=ndjson
+        """
+        return self._export(request, 'payments')
+
+    @action(detail=False, methods=['get'])
+    def ratings(self, request):
+        """
+        Export ratings
+        GET /exports/ratings/
+        """
+        return self._export(request, 'ratings')
+
+
 class LoginAPIView(APIView):
     """
     Handle traditional username/password login.
@@ -976,8 +1138,8 @@ class LoginAPIView(APIView):
         if user is None:
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens carrying the role claims
+        refresh = issue_tokens(user)
 
         return Response({
             'access': str(refresh.access_token),
@@ -1025,12 +1187,8 @@ class GoogleLoginAPIView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-            # Verify token with Google
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                requests.Request(), 
-                GOOGLE_CLIENT_ID
-            )
+            # Verify token locally against Google's cached signing keys
+            idinfo = google_auth.verify_id_token(token, GOOGLE_CLIENT_ID)
 
             # Extract user info
             google_id = idinfo['sub']
@@ -1049,6 +1207,11 @@ class GoogleLoginAPIView(APIView):
                 {'error': f'Invalid Google token: {str(e)}'}, 
                 status=status.HTTP_401_UNAUTHORIZED
             )
+        except google_auth.KeyFetchError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
 
         # Find or create user by email
         user, created = User.objects.get_or_create(
@@ -1074,8 +1237,8 @@ class GoogleLoginAPIView(APIView):
                 profile.google_id = google_id
                 profile.save()
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens carrying the role claims
+        refresh = issue_tokens(user, profile)
 
         return Response({
             'access': str(refresh.access_token),
@@ -1139,8 +1302,8 @@ class RegisterAPIView(APIView):
         # Create related profile with selected role
         profile = UserProfile.objects.create(user=user, role=role)
 
-        # Generae JWT tokens
-        refresh = RefreshToken.for_user(user)
+        # Generae JWT tokens carrying the role claims
+        refresh = issue_tokens(user, profile)
 
         return Response({
             "access": str(refresh.access_token),
@@ -1175,15 +1338,19 @@ def barber_stats_json(request):
     if not hasattr(user, 'profile') or user.profile.role != "barber":
         return Response({"error": "Forbidden"}, status=403)
 
-    # Retrieve only active appointments
-    appointments = Appointment.objects.filter(barber=user, active=True)
+    params = StatsQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
 
-    # Build statistics dictionary
-    stats = {
-        "total_completed": appointments.filter(status="completed").count(),
-        "total_canceled": appointments.filter(status="canceled").count(),
-        "total_booked": appointments.filter(status="booked").count(),
-    }
+    # One query over the daily rollup (active appointments only)
+    rows = rollups.stats_rows(
+        user.id, params.validated_data.get('start_date'), params.validated_data.get('end_date')
+    )
+    aggregates = rollups.APPOINTMENT_AGGREGATES
+    stats = rollups.summarize(rows, {
+        "total_completed": aggregates['completed'],
+        "total_canceled": aggregates['canceled'],
+        "total_booked": aggregates['booked'],
+    }, params.validated_data.get('series'))
 
     # Return as JSON response
     return Response(stats)
@@ -1205,11 +1372,11 @@ def barber_top_services_json(request):
     if not hasattr(user, 'profile') or user.profile.role != "barber":
         return Response({"error": "Forbidden"}, status=403)
 
-    # Group appointments by service and count their occurrences
-    qs = (
-        Appointment.objects.filter(barber=user, active=True)
-        .values("service__name")
-        .annotate(total=Count("id"))
-        .order_by("-total")  
+    params = StatsQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+
+    # Group the rollup by service and add up the appointments
+    rows = rollups.stats_rows(
+        user.id, params.validated_data.get('start_date'), params.validated_data.get('end_date')
     )
-    return Response(list(qs))
\ No newline at end of file
+    return Response(rollups.top_services(rows))
\ No newline at end of file
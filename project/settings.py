@@ -19,6 +19,9 @@ load_dotenv()
 
 # GOOGLE ID 
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+# Leave unset to use the discovery document bundled with google-api-python-client
+GOOGLE_CALENDAR_DISCOVERY_URL = os.getenv('GOOGLE_CALENDAR_DISCOVERY_URL')
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +60,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # First, so the rest of the stack is timed too
+    'barbershop.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -66,6 +71,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Only loaded with NPLUSONE_DETECT
+    'barbershop.nplusone.NPlusOneMiddleware',
+    # Last, so profiles cover the view
+    'barbershop.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -162,7 +171,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'barbershop.authentication.RoleJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
@@ -178,6 +187,58 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Gunicorn worker processes (start.sh); more than one needs a shared cache
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Cache shared by all workers: schedule and response cache versions rely on
+# it. Redis when REDIS_URL is set; otherwise several workers share a
+# database table (start.sh runs createcachetable), and a single process,
+# like runserver or the tests, uses local memory.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif WEB_CONCURRENCY > 1:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'barbershop_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a worker trusts its copy of a barber's week (barbershop.schedule_cache)
+SCHEDULE_CACHE_TTL = int(os.getenv('SCHEDULE_CACHE_TTL', 60))
+# Seconds a worker trusts its cached copy of a user's token revocation
+# (barbershop.authentication); revocations themselves are stored in the database
+REVOCATION_CACHE_SECONDS = int(os.getenv('REVOCATION_CACHE_SECONDS', 30))
+
+# Per-endpoint metrics (barbershop.metrics): each worker writes its totals
+# to a file in METRICS_DIR and /metrics sums them. /metrics answers staff
+# sessions and "Authorization: Bearer <METRICS_TOKEN>"; METRICS_PUBLIC=1
+# opens it to anyone.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC') == '1'
+
+# Opt-in request profiling (barbershop.profiling), listed at /admin/profiles/.
+# PROFILING_SAMPLE_RATES maps URL names to the share of calls to profile.
+PROFILING_DIR = os.getenv('PROFILING_DIR')
+PROFILING_MAX_CAPTURES = int(os.getenv('PROFILING_MAX_CAPTURES', 100))
+PROFILING_SAMPLE_RATES = {}
+
+# Warn about repeated SELECTs within a request (barbershop.nplusone);
+# the test suite turns this on and makes it raise
+NPLUSONE_DETECT = os.getenv('NPLUSONE_DETECT') == '1'
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
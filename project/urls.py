@@ -20,6 +20,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from barbershop.views import barber_stats_view
+from barbershop.metrics import metrics_view
+from barbershop.profiling import capture_download, captures_view
 
 # Swagger schema view
 schema_view = get_schema_view(
@@ -57,8 +59,11 @@ schema_view = get_schema_view(
 )
 
 urlpatterns = [
+    path('admin/profiles/', captures_view, name='profiling-captures'),
+    path('admin/profiles/<str:name>', capture_download, name='profiling-capture'),
     path('admin/', admin.site.urls),
     path('barber/stats/', barber_stats_view, name='barber-stats'),
+    path('metrics', metrics_view, name='metrics'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('api/', include('barbershop.urls')),
     
@@ -20,10 +20,24 @@ else
     export MEDIA_ROOT="/app/media"
 fi
 
+# Workers share schedule versions and cached responses through Redis, or
+# through a database table without REDIS_URL (see CACHES in settings.py)
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-3}"
+
 # Run migrations
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+if [ -z "$REDIS_URL" ]; then
+    echo "REDIS_URL is not set: sharing the cache through the database"
+    python manage.py createcachetable
+fi
+
+# Build the leaderboards and daily stats before the first request reads them
+echo "Building missing leaderboards and daily stats..."
+python manage.py rebuild_leaderboards --missing
+python manage.py refresh_stats
+
 # Configure SITE_ID and domain
 echo "Configuring Django site domain..."
 python manage.py shell << EOF
@@ -43,6 +57,25 @@ EOF
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Start metrics from zero: /metrics sums the files of every worker, live or not
+export METRICS_DIR="${METRICS_DIR:-/tmp/barbershop-metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# Background workers; they stop with the container, and one that exits
+# is started again after a pause
+supervise() {
+    while true; do
+        "$@" || echo "$* exited with status $?, restarting"
+        sleep 5
+    done
+}
+
+echo "Starting background workers..."
+supervise python manage.py refresh_stats --loop &
+supervise python manage.py send_notifications --loop &
+supervise python manage.py sync_calendar --loop &
+
 # Start Gunicorn server
 echo "Starting Gunicorn..."
-exec gunicorn project.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 3
+exec gunicorn project.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers "$WEB_CONCURRENCY"